@@ -0,0 +1,86 @@
+"""
+Compares the CPU spent per row by the ORM read path with the one of src.queries
+"""
+import argparse
+import time
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+
+import src.queries as queries
+from src.models import Album, Song
+from src.models.__base__ import Base
+
+
+def _orm(engine, pages: int, page: int) -> int:
+    read = 0
+    with Session(engine) as db:
+        for i in range(pages):
+            songs = db.scalars(select(Song).where(Song.album_id == 1).order_by(Song.song_id).offset(
+                page * i).limit(page))
+            read += len([x.to_dict() for x in songs])
+            # A request gets a fresh session, so the identity map does not carry instances over
+            db.expunge_all()
+    return read
+
+
+def _core(engine, pages: int, page: int) -> int:
+    read = 0
+    with engine.connect() as conn:
+        for i in range(pages):
+            rows = conn.execute(queries.ALBUM_SONGS.by_page, {'album_id': 1, 'limit': page, 'offset': page * i})
+            read += len([dict(x) for x in rows.mappings()])
+    return read
+
+
+def measure(fn, engine, rows: int, page: int, repeat: int) -> float:
+    """
+    Best CPU time per row in microseconds
+    """
+    best = None
+    for _ in range(repeat):
+        started = time.process_time()
+        fn(engine, rows // page, page)
+        elapsed = time.process_time() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best / rows * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.read_path',
+        description='Compares the CPU per row of the ORM and Core read paths. Both read pages of songs of an album '
+                    'from an in-memory SQLite database, so the time is mostly spent in Python: the ORM builds and '
+                    'compiles a select, hydrates instances and calls to_dict, src.queries binds a precompiled '
+                    'statement and maps rows to dicts'
+    )
+    parser.add_argument('--rows', type=int, default=10000, help='rows read per run')
+    parser.add_argument('--page', type=int, default=100, help='rows per page')
+    parser.add_argument('--repeat', type=int, default=5, help='runs, the best one counts')
+    args = parser.parse_args()
+
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        # Songs are read through their album, which must be there and not marked for deletion
+        conn.execute(insert(Album), {'album_id': 1, 'name': 'Album', 'artist_id': 1, 'asset_id': 1})
+        conn.execute(insert(Song), [
+            {'song_id': i, 'name': f'Song {i}', 'album_id': 1, 'asset_id': i} for i in range(1, args.rows + 1)
+        ])
+
+    pages = args.rows // args.page
+    read = _orm(engine, pages, args.page), _core(engine, pages, args.page)
+    assert read == (pages * args.page,) * 2, f'Paths read {read} rows instead of {pages * args.page} each'
+
+    orm = measure(_orm, engine, args.rows, args.page, args.repeat)
+    core = measure(_core, engine, args.rows, args.page, args.repeat)
+
+    print('path\tus_per_row')
+    print(f'orm\t{orm:.2f}')
+    print(f'core\t{core:.2f}')
+    print(f'Saved {orm - core:.2f} us per row ({(1 - core / orm) * 100:.0f}%)')
+
+
+if __name__ == '__main__':
+    main()
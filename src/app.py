@@ -1,11 +1,18 @@
-from fastapi import FastAPI, HTTPException, Depends
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy import select, func
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 import src.config as config
 import src.const as const
 import src.context as context
+import src.deadlines as deadlines
+import src.passwords as passwords
+import src.purge as purge
+import src.ratelimit as ratelimit
+import src.sessions as sessions
 import src.util as util
 from src.forms import LoginForm
 from src.logger import log_user_action as log_action
@@ -19,7 +26,25 @@ from src.routers import (
 APP
 """
 
-app = FastAPI(title='1mpu1se backend', version='1.0.0b')
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    if config.session_mode() == 'signed':
+        worker = sessions.start_revocation_sync()
+    else:
+        worker = sessions.start_listener()
+    # Deletes left unfinished by a stopped worker
+    purge.start()
+    yield
+    purge.stop()
+    worker.stop()
+    passwords.shutdown()
+
+
+app = FastAPI(title='1mpu1se backend', version='1.0.0b', lifespan=lifespan)
+
+# Registered before CORS, so answers to requests past their deadline get CORS headers too
+app.middleware('http')(deadlines.middleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -35,21 +60,39 @@ HELPERS
 
 
 def generate_token(user: User) -> str:
-    redis = context.ctx.rs
+    return sessions.create(user)
+
+
+async def rehash(db: AsyncSession, user: User, password: str):
+    """
+    Replaces a password hash made with another cost factor, a failure keeps the old hash
+    """
+    try:
+        user.password = await passwords.hashpw(password)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+
 
-    limit = 100
-    while True:
-        limit -= 1
-        token = util.generate_token()
-        if not redis.exists(token):
-            break
-        if limit == 0:
-            raise HTTPException(500)
+# Set once this worker has seen a user in the database, there is always an admin from then on
+_bootstrapped = False
 
-    redis.set(token, user.user_id)
-    redis.expire(token, const.SESSION_TTL)
 
-    return token
+async def is_first_user(db: AsyncSession) -> bool:
+    """
+    Tells whether the user being registered becomes the first one. Until the first user exists,
+    registrations are serialized by a transaction-level advisory lock, so only one of them gets admin rights
+    """
+    global _bootstrapped
+    if _bootstrapped:
+        return False
+
+    await db.execute(select(func.pg_advisory_xact_lock(const.FIRST_USER_LOCK)))
+    if await db.scalar(select(select(User.user_id).limit(1).exists())):
+        _bootstrapped = True
+        return False
+
+    return True
 
 
 """
@@ -103,14 +146,21 @@ async def index():
 ```
 
 """)
-async def login(form: LoginForm, db: Session = Depends(context.get_db)):
-    user = db.scalar(select(User).where(User.username == form.username))
-    if user is None or not util.checkpw(form.password, user.password):
+async def login(form: LoginForm, request: Request, db: AsyncSession = Depends(context.get_db)):
+    ratelimit.check('login', form.username, request.client and request.client.host)
+
+    user = await db.scalar(select(User).where(User.username == form.username))
+    if user is None or not await passwords.checkpw(form.password, user.password):
         raise HTTPException(401)
 
     log_action(user.user_id, 'login')
+    token = generate_token(user)
 
-    return {'token': generate_token(user)}
+    # Taken before the rehash, whose rollback on a failure expires the user
+    if util.hash_rounds(user.password) != config.bcrypt_rounds():
+        await rehash(db, user, form.password)
+
+    return {'token': token}
 
 
 @app.post('/register',
@@ -139,21 +189,25 @@ async def login(form: LoginForm, db: Session = Depends(context.get_db)):
 ```
 
 """)
-async def register(form: LoginForm, db: Session = Depends(context.get_db)):
-    count = db.scalar(select(func.count()).select_from(User))
+async def register(form: LoginForm, request: Request, db: AsyncSession = Depends(context.get_db)):
+    ratelimit.check('register', form.username, request.client and request.client.host)
 
-    user = User(
-        username=form.username,
-        password=util.hashpw(form.password),
-        is_admin=(count == 0)
-    )
+    # Taken usernames are rejected before spending a hash, the unique constraint still guards the race
+    if await db.scalar(select(User.user_id).where(User.username == form.username)) is not None:
+        raise HTTPException(400)
+
+    # Return the connection to the pool while hashing
+    await db.close()
+
+    password = await passwords.hashpw(form.password)
 
     try:
+        user = User(username=form.username, password=password, is_admin=await is_first_user(db))
+
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        await db.commit()
     except Exception:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(400)
 
     log_action(user.user_id, 'register')
@@ -0,0 +1,74 @@
+"""
+Measures bcrypt hashing on the current machine and recommends BCRYPT_ROUNDS
+"""
+import argparse
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+
+import src.config as config
+
+MIN_ROUNDS = 4
+MAX_ROUNDS = 20
+
+
+def _hash_ms(rounds: int) -> float:
+    started = time.perf_counter()
+    bcrypt.hashpw(b'calibration-password', bcrypt.gensalt(rounds))
+    return (time.perf_counter() - started) * 1000
+
+
+def percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def measure(rounds: int, concurrency: int, samples: int) -> list[float]:
+    with ProcessPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(_hash_ms, [rounds] * samples))
+
+
+def calibrate(target_ms: float, concurrency: int, samples: int) -> tuple[int | None, list]:
+    recommended, rows = None, []
+
+    for rounds in range(MIN_ROUNDS, MAX_ROUNDS + 1):
+        times = measure(rounds, concurrency, samples)
+        p50, p99 = percentile(times, 50), percentile(times, 99)
+        rows.append((rounds, p50, p99))
+
+        if p99 > target_ms:
+            break
+        recommended = rounds
+
+    return recommended, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='python -m src.calibrate',
+        description='Recommends a bcrypt cost factor for the current machine: the highest one whose p99 hash time, '
+                    'measured with as many concurrent hashes as a worker\'s password pool runs, stays within the '
+                    'target login p99'
+    )
+    parser.add_argument('--target-ms', type=float, default=250, help='target login p99 in milliseconds')
+    parser.add_argument('--concurrency', type=int, default=max(config.password_pool_size(), 1),
+                        help='hashes running at once (defaults to PASSWORD_POOL_SIZE)')
+    parser.add_argument('--samples', type=int, default=20, help='hashes measured per cost factor')
+    args = parser.parse_args()
+
+    recommended, rows = calibrate(args.target_ms, args.concurrency, max(args.samples, args.concurrency))
+
+    print('rounds\tp50_ms\tp99_ms')
+    for rounds, p50, p99 in rows:
+        print(f'{rounds}\t{p50:.1f}\t{p99:.1f}')
+
+    if recommended is None:
+        print(f'Even {MIN_ROUNDS} rounds exceed {args.target_ms} ms, add cores or relax the target')
+    else:
+        print(f'BCRYPT_ROUNDS={recommended}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,5 @@
 import logging
-from os import environ as env
+from os import cpu_count, environ as env
 
 """
 BASE
@@ -22,6 +22,214 @@ def allowed_origins() -> list:
     return env.get('ALLOWED_ORIGINS', 'http://localhost:3000').split(';')
 
 
+def session_refresh_threshold() -> float:
+    """
+    Share of const.SESSION_TTL left on a session below which a request prolongs it (defaults to 0.5)
+    """
+    return float(
+        env.get('SESSION_REFRESH_THRESHOLD', 0.5)
+    )
+
+
+def session_mode() -> str:
+    """
+    Session token mode: 'redis' - opaque tokens checked in Redis, 'signed' - HMAC-signed tokens checked in process
+    (defaults to 'redis')
+    """
+    return (
+        env.get('SESSION_MODE', 'redis')
+    )
+
+
+def session_secret() -> str:
+    """
+    Secret signing session tokens in the 'signed' mode, must be the same for all workers (defaults to '')
+    """
+    return (
+        env.get('SESSION_SECRET', '')
+    )
+
+
+def session_signed_ttl() -> int:
+    """
+    Lifetime of a signed session token in seconds, signed tokens are not prolonged (defaults to 86400)
+    """
+    return int(
+        env.get('SESSION_SIGNED_TTL', 86400)
+    )
+
+
+def session_revocation_sync() -> float:
+    """
+    Seconds between revocation list syncs of a worker in the 'signed' mode (defaults to 5)
+    """
+    return float(
+        env.get('SESSION_REVOCATION_SYNC', 5)
+    )
+
+
+def session_max_per_user() -> int:
+    """
+    Max live sessions of a single user, the ones closest to expiry are dropped on login, 0 - no limit
+    (defaults to 100)
+    """
+    return int(
+        env.get('SESSION_MAX_PER_USER', 100)
+    )
+
+
+def session_cache_size() -> int:
+    """
+    Max sessions cached in process memory of a worker, 0 disables the cache (defaults to 10000)
+    """
+    return int(
+        env.get('SESSION_CACHE_SIZE', 10000)
+    )
+
+
+def session_cache_ttl() -> float:
+    """
+    Seconds a session stays in process memory of a worker before it is checked in Redis again (defaults to 5)
+    """
+    return float(
+        env.get('SESSION_CACHE_TTL', 5)
+    )
+
+
+"""
+PASSWORDS
+"""
+
+
+def bcrypt_rounds() -> int:
+    """
+    Bcrypt cost factor for new password hashes, hashes of another cost are replaced on login,
+    see `python -m src.calibrate` (defaults to 12)
+    """
+    return int(
+        env.get('BCRYPT_ROUNDS', 12)
+    )
+
+
+def password_pool_size() -> int:
+    """
+    Processes hashing passwords per worker, 0 hashes in the thread pool of the worker (defaults to CPU count)
+    """
+    return int(
+        env.get('PASSWORD_POOL_SIZE', cpu_count() or 1)
+    )
+
+
+def password_queue_size() -> int:
+    """
+    Password hashes allowed to wait for a free process before requests are rejected with 503 (defaults to 64)
+    """
+    return int(
+        env.get('PASSWORD_QUEUE_SIZE', 64)
+    )
+
+
+"""
+DEADLINES
+"""
+
+
+def deadline_read() -> float:
+    """
+    Seconds a catalog read may take before it is answered with 504 (defaults to 5)
+    """
+    return float(
+        env.get('DEADLINE_READ', 5)
+    )
+
+
+def deadline_search() -> float:
+    """
+    Seconds a search may take before it is answered with 504 (defaults to 5)
+    """
+    return float(
+        env.get('DEADLINE_SEARCH', 5)
+    )
+
+
+def deadline_stream() -> float:
+    """
+    Seconds an asset stream or a catalog export may take to start, the transfer itself is not limited (defaults to 10)
+    """
+    return float(
+        env.get('DEADLINE_STREAM', 10)
+    )
+
+
+def deadline_write() -> float:
+    """
+    Seconds an admin write may take before it is answered with 504 (defaults to 15)
+    """
+    return float(
+        env.get('DEADLINE_WRITE', 15)
+    )
+
+
+def deadline_import() -> float:
+    """
+    Seconds a catalog import may take before it is answered with 504 (defaults to 600)
+    """
+    return float(
+        env.get('DEADLINE_IMPORT', 600)
+    )
+
+
+def deadline_default() -> float:
+    """
+    Seconds any other request may take before it is answered with 504 (defaults to 10)
+    """
+    return float(
+        env.get('DEADLINE_DEFAULT', 10)
+    )
+
+
+"""
+AUTH LIMITS
+"""
+
+
+def auth_limit_username_rate() -> float:
+    """
+    Login and register attempts per minute allowed for a single username, 0 disables the limit (defaults to 10)
+    """
+    return float(
+        env.get('AUTH_LIMIT_USERNAME_RATE', 10)
+    )
+
+
+def auth_limit_username_burst() -> int:
+    """
+    Login and register attempts a single username may make at once (defaults to 5)
+    """
+    return int(
+        env.get('AUTH_LIMIT_USERNAME_BURST', 5)
+    )
+
+
+def auth_limit_address_rate() -> float:
+    """
+    Login and register attempts per minute allowed for a single client address, 0 disables the limit
+    (defaults to 60)
+    """
+    return float(
+        env.get('AUTH_LIMIT_ADDRESS_RATE', 60)
+    )
+
+
+def auth_limit_address_burst() -> int:
+    """
+    Login and register attempts a single client address may make at once (defaults to 20)
+    """
+    return int(
+        env.get('AUTH_LIMIT_ADDRESS_BURST', 20)
+    )
+
+
 """
 REDIS
 """
@@ -45,6 +253,15 @@ def redis_port() -> int:
     )
 
 
+def redis_timeout() -> float:
+    """
+    Seconds to connect to Redis or wait for its reply (defaults to 1)
+    """
+    return float(
+        env.get('REDIS_TIMEOUT', 1)
+    )
+
+
 """
 POSTGRES
 """
@@ -95,6 +312,90 @@ def postgres_database() -> str:
     )
 
 
+def postgres_replicas() -> list[str]:
+    """
+    Comma separated host:port of read replicas serving the user API, the primary serves it when empty
+    (defaults to '')
+    """
+    return [
+        x.strip() for x in env.get('POSTGRES_REPLICAS', '').split(',') if x.strip()
+    ]
+
+
+def postgres_pin_ttl() -> int:
+    """
+    Seconds the user API of a session reads from the primary after an admin write (defaults to 5)
+    """
+    return int(
+        env.get('POSTGRES_PIN_TTL', 5)
+    )
+
+
+def postgres_pool_size() -> int:
+    """
+    Connections a worker keeps open to each database, multiply by the workers to get the total (defaults to 20)
+    """
+    return int(
+        env.get('POSTGRES_POOL_SIZE', 20)
+    )
+
+
+def postgres_pool_overflow() -> int:
+    """
+    Connections a worker may open above the pool size under load and close once idle (defaults to 0)
+    """
+    return int(
+        env.get('POSTGRES_POOL_OVERFLOW', 0)
+    )
+
+
+def postgres_pool_timeout() -> float:
+    """
+    Seconds a request waits for a free connection before failing (defaults to 30)
+    """
+    return float(
+        env.get('POSTGRES_POOL_TIMEOUT', 30)
+    )
+
+
+def postgres_pool_recycle() -> int:
+    """
+    Seconds after which a connection is replaced on checkout, -1 - never (defaults to 1800)
+    """
+    return int(
+        env.get('POSTGRES_POOL_RECYCLE', 1800)
+    )
+
+
+def postgres_pool_pre_ping() -> bool:
+    """
+    Whether a connection is tested with a round trip on checkout (defaults to false)
+    """
+    return (
+        env.get('POSTGRES_POOL_PRE_PING', 'false').lower() in ('1', 'true', 'yes')
+    )
+
+
+def postgres_pgbouncer() -> bool:
+    """
+    Whether the database is reached through a transaction pooling proxy such as PgBouncer, which cannot keep
+    prepared statements of a connection between transactions (defaults to false)
+    """
+    return (
+        env.get('POSTGRES_PGBOUNCER', 'false').lower() in ('1', 'true', 'yes')
+    )
+
+
+def postgres_statement_timeout() -> float:
+    """
+    Seconds a statement may run unless the deadline of its request is closer, set once per connection, so it also
+    bounds the statements of the purge (defaults to 3)
+    """
+    return float(
+        env.get('POSTGRES_STATEMENT_TIMEOUT', 3)
+    )
+
+
 """
 S3
 """
@@ -136,6 +437,15 @@ def s3_secret_key() -> str:
     )
 
 
+def s3_timeout() -> float:
+    """
+    Seconds to connect to S3 or wait for the next chunk of its reply (defaults to 5)
+    """
+    return float(
+        env.get('S3_TIMEOUT', 5)
+    )
+
+
 """
 ELASTICSEARCH
 """
@@ -175,3 +485,12 @@ def elasticsearch_password() -> str:
     return (
         env.get('ELASTICSEARCH_PASSWORD', 'elastic')
     )
+
+
+def elasticsearch_timeout() -> float:
+    """
+    Seconds an Elasticsearch request may take outside of a request deadline (defaults to 5)
+    """
+    return float(
+        env.get('ELASTICSEARCH_TIMEOUT', 5)
+    )
@@ -1,5 +1,7 @@
 SESSION_TTL = 3660
+SESSION_INVALIDATION_CHANNEL = 'sessions:invalidate'
 ELEMENTS_PER_PAGE = 10
+MAX_ELEMENTS_PER_PAGE = 100
 BUCKET_NAME = 'assets'
 MAX_FILE_SIZE = 16 * 1024 * 1024
 FILE_TYPE_IMAGE = 'image/png'
@@ -13,5 +15,17 @@ SONG_NAME_LENGTH = (4, 64)
 INDEX_ARTISTS_COUNT = 5
 INDEX_ALBUMS_COUNT = 5
 INDEX_SONGS_COUNT = 10
+FEED_TTL = 3600
+ENTITY_TTL = 3600
+ENTITY_MISSING_TTL = 30
 ELASTICSEARCH_INDEX = 'main'
 ELASTICSEARCH_SEARCH_LIMIT = 10
+PURGE_BATCH_SIZE = 1000
+IMPORT_BATCH_SIZE = 500
+IMPORT_MAX_ERRORS = 1000
+EXPORT_BATCH_SIZE = 1000
+SHUFFLE_RECENT_WINDOW = 100
+SHUFFLE_OVERSAMPLING = 2
+SHUFFLE_ATTEMPTS = 4
+FIRST_USER_LOCK = 1001
+MIGRATIONS_LOCK = 1002
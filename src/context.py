@@ -1,15 +1,29 @@
+import itertools
+
 import boto3
+import botocore.config
 import elasticsearch
 import redis
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
 
 import src.config as config
+import src.pool as pool
+
+
+def _dsn(host, port) -> str:
+    return 'postgresql+asyncpg://{}:{}@{}:{}/{}'.format(
+        config.postgres_username(),
+        config.postgres_password(),
+        host,
+        port,
+        config.postgres_database()
+    )
 
 
 class Context:
     _rs: redis.Redis = None
     _sm = None
+    _replicas = None
     _s3 = None
     _es: elasticsearch.Elasticsearch = None
 
@@ -17,34 +31,49 @@ class Context:
         # Redis
         self._rs = redis.Redis(
             host=config.redis_host(),
-            port=config.redis_port()
+            port=config.redis_port(),
+            # redis-py has no per-call timeout, so every call is bounded by the client-wide one
+            socket_timeout=config.redis_timeout(),
+            socket_connect_timeout=config.redis_timeout()
         )
 
         # Database
-        self._sm = sessionmaker(
-            bind=create_engine('postgresql+psycopg2://{}:{}@{}:{}/{}'.format(
-                config.postgres_username(),
-                config.postgres_password(),
-                config.postgres_host(),
-                config.postgres_port(),
-                config.postgres_database()
-            ), pool_size=20, max_overflow=0),
-            autocommit=False,
+        self._sm = async_sessionmaker(
+            bind=pool.create_engine(_dsn(config.postgres_host(), config.postgres_port()), 'primary'),
             autoflush=False,
+            # Attributes of committed objects must stay readable, lazy loads are not possible in async code
+            expire_on_commit=False
         )
 
+        # Database replicas, every transaction on them is read only
+        self._replicas = itertools.cycle([
+            async_sessionmaker(
+                bind=pool.create_engine(_dsn(host, port or config.postgres_port()), f'replica{i}').execution_options(
+                    postgresql_readonly=True),
+                autoflush=False,
+                expire_on_commit=False
+            ) for i, (host, _, port) in enumerate(replica.partition(':') for replica in config.postgres_replicas())
+        ] or [self._sm])
+
         # S3
         self._s3 = boto3.client(
             service_name='s3',
             aws_access_key_id=config.s3_access_key(),
             aws_secret_access_key=config.s3_secret_key(),
-            endpoint_url=f'http://{config.s3_host()}:{config.s3_port()}'
+            endpoint_url=f'http://{config.s3_host()}:{config.s3_port()}',
+            # The read timeout bounds every wait for the next chunk, not the whole transfer
+            config=botocore.config.Config(
+                connect_timeout=config.s3_timeout(),
+                read_timeout=config.s3_timeout(),
+                retries={'max_attempts': 2}
+            )
         )
 
         # Elasticsearch
         self._es = elasticsearch.Elasticsearch(
             hosts=f'http://{config.elasticsearch_host()}:{config.elasticsearch_port()}',
-            basic_auth=(config.elasticsearch_username(), config.elasticsearch_password())
+            basic_auth=(config.elasticsearch_username(), config.elasticsearch_password()),
+            request_timeout=config.elasticsearch_timeout()
         )
 
     @property
@@ -52,9 +81,16 @@ class Context:
         return self._rs
 
     @property
-    def sm(self):
+    def sm(self) -> async_sessionmaker[AsyncSession]:
         return self._sm
 
+    @property
+    def read_sm(self) -> async_sessionmaker[AsyncSession]:
+        """
+        Next replica in turn, or the primary when there are no replicas
+        """
+        return next(self._replicas)
+
     @property
     def s3(self):
         return self._s3
@@ -67,9 +103,9 @@ class Context:
 ctx = Context()
 
 
-def get_db():
+async def get_db():
     db = ctx.sm()
     try:
         yield db
     finally:
-        db.close()
+        await db.close()
@@ -0,0 +1,189 @@
+import asyncio
+import time
+from contextvars import ContextVar
+from http import HTTPStatus
+
+import botocore.exceptions
+import elasticsearch
+import redis
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from sqlalchemy import event, exc
+from sqlalchemy.orm import Session
+
+import src.config as config
+import src.metrics as metrics
+
+"""
+DEADLINES
+"""
+
+
+class Deadline:
+    __slots__ = ('route', 'at', 'failure')
+
+    def __init__(self, route: str, budget: float):
+        self.route = route
+        self.at = time.monotonic() + budget
+        # Status a dependency failure calls for, set even when a handler turns the error into another one
+        self.failure = None
+
+    def remaining(self) -> float:
+        return max(self.at - time.monotonic(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.at
+
+
+_current: ContextVar[Deadline | None] = ContextVar('deadline', default=None)
+
+
+def current() -> Deadline | None:
+    return _current.get()
+
+
+def remaining(default: float) -> float:
+    """
+    Seconds left to the deadline of the current request, the default outside of a request
+    """
+    deadline = _current.get()
+    return default if deadline is None else min(deadline.remaining(), default)
+
+
+def route_class(method: str, path: str) -> str:
+    if path.startswith('/user/asset/') or path.startswith('/admin/export/'):
+        return 'stream'
+    if path.startswith('/user/search'):
+        return 'search'
+    if path.startswith('/admin/import'):
+        return 'import'
+    if path.startswith('/admin') and method != 'GET':
+        return 'write'
+    if path.startswith('/user') or path.startswith('/admin'):
+        return 'read'
+    return 'default'
+
+
+def budget(route: str) -> float:
+    return {
+        'read': config.deadline_read,
+        'search': config.deadline_search,
+        'stream': config.deadline_stream,
+        'write': config.deadline_write,
+        'import': config.deadline_import
+    }.get(route, config.deadline_default)()
+
+
+"""
+FAILURES
+"""
+
+QUERY_CANCELED = '57014'
+
+
+def classify(e: BaseException) -> int | None:
+    """
+    504 for a dependency that ran out of time, 503 for one that cannot be reached, None for other errors
+    """
+    if isinstance(e, exc.DBAPIError):
+        if getattr(e.orig, 'sqlstate', None) == QUERY_CANCELED:
+            return 504
+        if e.connection_invalidated:
+            return 503
+        e = e.orig
+
+    if isinstance(e, (
+        TimeoutError,
+        redis.TimeoutError,
+        elasticsearch.ConnectionTimeout,
+        botocore.exceptions.ConnectTimeoutError,
+        botocore.exceptions.ReadTimeoutError
+    )):
+        return 504
+
+    if isinstance(e, (
+        OSError,
+        exc.TimeoutError,
+        redis.ConnectionError,
+        elasticsearch.ConnectionError,
+        botocore.exceptions.EndpointConnectionError
+    )):
+        return 503
+
+    return None
+
+
+def fail(status: int):
+    deadline = _current.get()
+    if deadline is not None and deadline.failure is None:
+        deadline.failure = status
+
+
+def _response(status: int) -> JSONResponse:
+    return JSONResponse({'detail': HTTPStatus(status).phrase}, status_code=status)
+
+
+async def middleware(request: Request, call_next):
+    """
+    Gives the request a deadline of its route class and answers 504 once it passes. Handlers answer most errors
+    with 400, so an error response of a request whose dependency failed or whose deadline passed is replaced with
+    503 or 504
+    """
+    route = route_class(request.method, request.url.path)
+    deadline = Deadline(route, budget(route))
+    token = _current.set(deadline)
+
+    try:
+        async with asyncio.timeout(deadline.remaining()):
+            response = await call_next(request)
+    except Exception as e:
+        # The deadline passing raises TimeoutError, which is answered like any other timeout
+        status = classify(e)
+        if status is None:
+            raise
+        response = _response(status)
+    finally:
+        _current.reset(token)
+
+    if response.status_code >= 400 and response.status_code not in (503, 504):
+        if deadline.failure is not None:
+            response = _response(deadline.failure)
+        elif deadline.expired:
+            response = _response(504)
+
+    if response.status_code == 504:
+        metrics.inc(f'deadline_{route}_exceeded')
+    elif response.status_code == 503:
+        metrics.inc(f'deadline_{route}_unavailable')
+
+    return response
+
+
+"""
+POSTGRES
+"""
+
+
+@event.listens_for(Session, 'after_begin')
+def _statement_timeout(session, transaction, connection):
+    deadline = _current.get()
+    if deadline is None:
+        return
+
+    remaining = deadline.remaining()
+    # The proxy takes no startup settings, so behind it there is no default of the connection to rely on
+    if config.postgres_pgbouncer() or remaining < config.postgres_statement_timeout():
+        # Postgres cancels a statement that would outlive the request instead of running it for nobody
+        connection.exec_driver_sql(f'SET LOCAL statement_timeout = {max(int(remaining * 1000), 1)}')
+
+
+def on_database_error(context):
+    """
+    Records a failed database call, which a handler may turn into a 400
+    """
+    status = classify(context.sqlalchemy_exception or context.original_exception)
+    if status is None and context.is_disconnect:
+        status = 503
+    if status is not None:
+        fail(status)
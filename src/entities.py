@@ -0,0 +1,114 @@
+"""
+Read-through cache of artists, albums, songs and assets by id, versioned by the commits changing them
+"""
+import json
+import logging
+import time
+
+import redis
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+import src.config as config
+import src.const as const
+import src.context as context
+import src.metrics as metrics
+import src.queries as queries
+from src.models.__base__ import CATALOG_CHANGED, ENTITIES_CHANGED
+
+_logger = logging.getLogger(__name__)
+
+STATEMENTS = {
+    'artist': queries.ARTIST_BY_ID,
+    'album': queries.ALBUM_CARD_BY_ID,
+    'song': queries.SONG_BY_ID,
+    'asset': queries.ASSET_BY_ID
+}
+
+# Bumped by marks, which hide the children of a row without their versions
+CATALOG_KEY = 'entity:catalog'
+
+"""
+KEYS
+"""
+
+
+def _key(kind: str, uid: int) -> str:
+    return f'entity:{kind}:{uid}'
+
+
+def _version_key(kind: str, uid: int) -> str:
+    return f'entity:version:{kind}:{uid}'
+
+
+def _is_recent(version: bytes | None) -> bool:
+    return version is not None and time.time_ns() - int(version) < config.postgres_pin_ttl() * 1e9
+
+
+"""
+CACHE
+"""
+
+
+async def get(sm, kind: str, uid: int) -> dict | None:
+    """
+    The entity as its query returns it, None when it does not exist
+    """
+    catalog, version, cached = context.ctx.rs.mget(CATALOG_KEY, _version_key(kind, uid), _key(kind, uid))
+    stamp = (catalog or b'0') + b':' + (version or b'0')
+
+    if cached is not None:
+        stored, _, entity = cached.partition(b'\n')
+        if stored == stamp:
+            metrics.inc(f'entity_{kind}_hits')
+            return json.loads(entity)
+
+    metrics.inc(f'entity_{kind}_misses')
+    # Versions are the times of the bumps, a replica may not have a recent one yet
+    if _is_recent(catalog) or _is_recent(version):
+        sm = context.ctx.sm
+
+    async with sm() as db:
+        entity = await queries.one(db, STATEMENTS[kind], **{f'{kind}_id': uid})
+
+    # Missing ids are kept briefly, a scan of bogus ids reaches the database once per id
+    context.ctx.rs.set(_key(kind, uid), stamp + b'\n' + json.dumps(entity, ensure_ascii=False).encode(),
+                       ex=const.ENTITY_TTL if entity is not None else const.ENTITY_MISSING_TTL)
+    return entity
+
+
+def invalidate(entities: set[tuple[str, int]], catalog: bool = False):
+    version = time.time_ns()
+    pipeline = context.ctx.rs.pipeline()
+    for kind, uid in entities:
+        # Entries read before the bump expire before the version does, a missing version only fails the newer ones
+        pipeline.set(_version_key(kind, uid), version, ex=const.ENTITY_TTL)
+    if catalog:
+        pipeline.set(CATALOG_KEY, version)
+    pipeline.execute()
+
+
+"""
+EVENTS
+"""
+
+
+@event.listens_for(Session, 'after_commit')
+def _after_commit(session):
+    entities = session.info.pop(ENTITIES_CHANGED, set())
+    catalog = session.info.pop(CATALOG_CHANGED, False)
+    if not entities and not catalog:
+        return
+
+    try:
+        invalidate(entities, catalog)
+    except redis.RedisError as e:
+        metrics.inc('entity_invalidation_failed')
+        _logger.warning('Cached entities have not been invalidated: %s', e)
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _after_transaction_end(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(ENTITIES_CHANGED, None)
+        session.info.pop(CATALOG_CHANGED, None)
@@ -0,0 +1,49 @@
+"""
+Export of the catalog as NDJSON in the order of the ids, read from a server-side cursor
+"""
+import json
+import zlib
+from typing import AsyncIterator
+
+from sqlalchemy import bindparam, select
+
+import src.const as const
+import src.metrics as metrics
+import src.queries as queries
+from src.models import Album, Artist, Asset, Song
+
+
+def _after(statement, key):
+    return statement.where(key > bindparam('after')).order_by(key)
+
+
+# Marked artists and albums are gone, as they are for readers
+STATEMENTS = {
+    'artists': _after(select(*queries.ARTIST).where(~Artist.is_deleted), Artist.artist_id),
+    'albums': _after(select(*queries.ALBUM).where(~Album.is_deleted), Album.album_id),
+    'songs': _after(select(*queries.SONG).join(*queries.SONG_OF_ALBUM), Song.song_id),
+    'assets': _after(select(*queries.ASSET), Asset.asset_id)
+}
+
+
+async def batches(sm, kind: str, after: int) -> AsyncIterator[list[dict]]:
+    async with sm() as db:
+        result = await db.stream(STATEMENTS[kind], {'after': after},
+                                 execution_options={'yield_per': const.EXPORT_BATCH_SIZE})
+        async for batch in result.mappings().partitions():
+            yield [dict(x) for x in batch]
+
+
+async def ndjson(sm, kind: str, after: int = 0, compress: bool = False) -> AsyncIterator[bytes]:
+    """
+    Chunks of the export, a gzip stream when compressed
+    """
+    gzip = zlib.compressobj(wbits=zlib.MAX_WBITS | 16) if compress else None
+
+    async for batch in batches(sm, kind, after):
+        chunk = ''.join(json.dumps(x, ensure_ascii=False) + '\n' for x in batch).encode()
+        metrics.inc(f'export_{kind}_rows', len(batch))
+        yield gzip.compress(chunk) if gzip else chunk
+
+    if gzip:
+        yield gzip.flush()
@@ -0,0 +1,90 @@
+"""
+Home feed of the user, cached serialized in Redis and dropped by the commits changing the catalog
+"""
+import json
+import logging
+
+import redis
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+import src.const as const
+import src.context as context
+import src.metrics as metrics
+import src.queries as queries
+from src.models.__base__ import FEED_CHANGED
+
+_logger = logging.getLogger(__name__)
+
+FEED_KEY = 'feed:index'
+GENERATION_KEY = 'feed:generation'
+
+"""
+FEED
+"""
+
+
+async def build(sm) -> bytes:
+    artists, albums, songs = await queries.concurrently(
+        sm,
+        queries.NEWEST_ARTISTS,
+        queries.NEWEST_ALBUMS,
+        queries.NEWEST_SONGS
+    )
+
+    return json.dumps({
+        'artists': artists,
+        'albums': albums,
+        'songs': songs
+    }, ensure_ascii=False).encode()
+
+
+async def read() -> bytes:
+    """
+    The serialized feed, built and cached when the cached one is missing or of an older generation
+    """
+    generation, cached = context.ctx.rs.mget(GENERATION_KEY, FEED_KEY)
+    generation = int(generation or 0)
+
+    # A feed is stored with the generation read before building it, so one built during a commit is not served after it
+    if cached is not None:
+        stored, _, feed = cached.partition(b'\n')
+        if int(stored) == generation:
+            metrics.inc('feed_hits')
+            return feed
+
+    metrics.inc('feed_misses')
+    # A replica may not have the commit that has dropped the feed yet
+    feed = await build(context.ctx.sm)
+    # The TTL bounds how long a change made past the model events can go unnoticed
+    context.ctx.rs.set(FEED_KEY, str(generation).encode() + b'\n' + feed, ex=const.FEED_TTL)
+    return feed
+
+
+def invalidate():
+    context.ctx.rs.incr(GENERATION_KEY)
+
+
+"""
+EVENTS
+"""
+
+
+@event.listens_for(Session, 'after_commit')
+def _after_commit(session):
+    if not session.info.pop(FEED_CHANGED, False):
+        return
+
+    try:
+        invalidate()
+    except redis.RedisError as e:
+        # The write is committed already, the cached feed expires with its TTL
+        metrics.inc('feed_invalidation_failed')
+        _logger.warning('Home feed has not been invalidated: %s', e)
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _after_transaction_end(session, transaction):
+    # A rolled back transaction leaves the flag, which must not carry over to the next one
+    if transaction.parent is None:
+        session.info.pop(FEED_CHANGED, None)
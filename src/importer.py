@@ -0,0 +1,316 @@
+"""
+Bulk import of the catalog from NDJSON, in batches committed one by one
+"""
+import asyncio
+import json
+import logging
+from typing import AsyncIterator
+
+from elasticsearch import helpers
+from pydantic import ValidationError
+from sqlalchemy import bindparam, insert, select
+
+import src.const as const
+import src.context as context
+import src.metrics as metrics
+import src.purge as purge
+from src.forms import AlbumForm, ArtistForm, SongForm
+from src.models import Album, Artist, Asset, Song
+from src.models.__base__ import entities_changed, feed_changed
+
+_logger = logging.getLogger(__name__)
+
+"""
+STATEMENTS
+"""
+
+ASSETS = select(Asset.asset_id).where(
+    Asset.asset_id.in_(bindparam('ids', expanding=True)),
+    Asset.is_uploaded,
+    Asset.content_type == bindparam('content_type')
+)
+
+TAKEN_NAMES = select(Artist.name).where(Artist.name.in_(bindparam('names', expanding=True)))
+
+# Parents by id with the artist name their children are indexed with
+ARTISTS = select(Artist.artist_id, Artist.name).where(
+    Artist.artist_id.in_(bindparam('ids', expanding=True)),
+    ~Artist.is_deleted
+)
+ALBUMS = select(Album.album_id, Artist.name).join(Artist, Artist.artist_id == Album.artist_id).where(
+    Album.album_id.in_(bindparam('ids', expanding=True)),
+    ~Album.is_deleted
+)
+
+
+class Kind:
+    __slots__ = ('name', 'model', 'form', 'key', 'content_type', 'parent', 'parents')
+
+    def __init__(self, name, model, form, key, content_type, parent=None, parents=None):
+        self.name = name
+        self.model = model
+        self.form = form
+        self.key = key
+        self.content_type = content_type
+        self.parent = parent
+        self.parents = parents
+
+
+# In the order of a batch, so a record may refer to a parent of the same batch
+KINDS = {
+    'artist': Kind('artist', Artist, ArtistForm, Artist.artist_id, const.FILE_TYPE_IMAGE),
+    'album': Kind('album', Album, AlbumForm, Album.album_id, const.FILE_TYPE_IMAGE, 'artist', ARTISTS),
+    'song': Kind('song', Song, SongForm, Song.song_id, const.FILE_TYPE_AUDIO, 'album', ALBUMS)
+}
+
+"""
+RECORDS
+"""
+
+
+class Record:
+    __slots__ = ('line', 'data', 'ref', 'parent_ref', 'form', 'artist', 'rejected')
+
+    def __init__(self, line: int, data: dict, ref: str | None, parent_ref: str | None):
+        self.line = line
+        self.data = data
+        self.ref = ref
+        self.parent_ref = parent_ref
+        self.form = None
+        # Name of the artist for the search document, the record's own for an artist
+        self.artist = None
+        # Reported by the validation, a failure of its batch does not report it again
+        self.rejected = False
+
+
+class Report:
+    def __init__(self):
+        self.created = {x: 0 for x in KINDS}
+        self.failed = 0
+        self.errors = []
+        # Refs of the imported records with their ids and artist names
+        self.refs: dict[str, tuple[str, int, str]] = {}
+
+    def fail(self, line: int, error: str):
+        self.failed += 1
+        if len(self.errors) < const.IMPORT_MAX_ERRORS:
+            self.errors.append({'line': line, 'error': error})
+
+    def reject(self, record: Record, error: str):
+        record.rejected = True
+        self.fail(record.line, error)
+
+    def to_dict(self) -> dict:
+        return {
+            'created': self.created,
+            'failed': self.failed,
+            'errors': self.errors,
+            'refs': {ref: uid for ref, (_, uid, _) in self.refs.items()}
+        }
+
+
+def _parse(line: int, raw: bytes, report: Report) -> tuple[str, Record] | None:
+    try:
+        data = json.loads(raw)
+        kind = KINDS[data.pop('type')]
+    except (ValueError, KeyError, TypeError, AttributeError):
+        report.fail(line, 'Record must be a JSON object with a type of ' + ', '.join(KINDS))
+        return None
+
+    ref = data.pop('ref', None)
+    parent_ref = data.pop(f'{kind.parent}_ref', None) if kind.parent else None
+    if not all(x is None or isinstance(x, str) for x in (ref, parent_ref)):
+        report.fail(line, 'Refs must be strings')
+        return None
+
+    return kind.name, Record(line, data, ref, parent_ref)
+
+
+def _error(e: ValidationError) -> str:
+    error = e.errors()[0]
+    return '.'.join(str(x) for x in error['loc']) + ': ' + error['msg']
+
+
+async def _lines(stream: AsyncIterator[bytes]):
+    """
+    Numbered lines of the streamed body, without holding more of it than a line
+    """
+    number, rest = 0, b''
+    async for chunk in stream:
+        *lines, rest = (rest + chunk).split(b'\n')
+        for line in lines:
+            number += 1
+            yield number, line
+    if rest:
+        yield number + 1, rest
+
+
+"""
+IMPORT
+"""
+
+
+async def _validate(db, kind: Kind, records: list[Record], refs: dict, report: Report) -> list[Record]:
+    """
+    Records of the kind that can be inserted, the references of all of them checked at once
+    """
+    valid, seen = [], set()
+    for record in records:
+        if record.ref is not None and (record.ref in refs or record.ref in seen):
+            report.reject(record, f'Ref {record.ref} is already taken')
+            continue
+        seen.add(record.ref)
+
+        if record.parent_ref is not None:
+            parent = refs.get(record.parent_ref)
+            if parent is None or parent[0] != kind.parent:
+                report.reject(record, f'Unknown {kind.parent} ref {record.parent_ref}')
+                continue
+            record.data[f'{kind.parent}_id'] = parent[1]
+            record.artist = parent[2]
+
+        try:
+            record.form = kind.form.model_validate(record.data)
+        except ValidationError as e:
+            report.reject(record, _error(e))
+            continue
+
+        valid.append(record)
+
+    if not valid:
+        return valid
+
+    assets = set((await db.execute(ASSETS, {
+        'ids': list({x.form.asset_id for x in valid}),
+        'content_type': kind.content_type
+    })).scalars())
+
+    parents = {}
+    if kind.parents is not None:
+        ids = list({getattr(x.form, f'{kind.parent}_id') for x in valid if x.parent_ref is None})
+        if ids:
+            parents = dict((await db.execute(kind.parents, {'ids': ids})).all())
+
+    taken = set()
+    if kind.name == 'artist':
+        taken = set((await db.execute(TAKEN_NAMES, {'names': list({x.form.name for x in valid})})).scalars())
+
+    checked = []
+    for record in valid:
+        if record.form.asset_id not in assets:
+            report.reject(record, f'Invalid asset has been provided for the {kind.name}')
+        elif kind.name == 'artist' and record.form.name in taken:
+            report.reject(record, f'Artist name {record.form.name} is already taken')
+        elif record.parent_ref is None and kind.parents is not None and \
+                getattr(record.form, f'{kind.parent}_id') not in parents:
+            report.reject(record, f'Invalid {kind.parent} has been provided for the {kind.name}')
+        else:
+            if kind.name == 'artist':
+                record.artist = record.form.name
+                # Names repeated within the import are taken by the first record
+                taken.add(record.form.name)
+            elif record.parent_ref is None:
+                record.artist = parents[getattr(record.form, f'{kind.parent}_id')]
+            checked.append(record)
+
+    return checked
+
+
+def _document(kind: Kind, record: Record, uid: int) -> dict:
+    data = {'name': record.form.name}
+    if kind.name != 'artist':
+        data['artist'] = record.artist
+
+    return {
+        '_index': const.ELASTICSEARCH_INDEX,
+        '_id': f'{kind.name}_{uid}',
+        '_source': {'keyword': record.form.name, 'data': data}
+    }
+
+
+async def _unindex(uids: dict[str, list[int]]):
+    try:
+        for kind, ids in uids.items():
+            await asyncio.to_thread(purge.unindex, kind, ids)
+    except Exception as e:
+        metrics.inc('import_unindex_failed')
+        _logger.warning('Documents of a rolled back import batch are left indexed: %s', e)
+
+
+async def _batch(db, batch: list[tuple[str, Record]], report: Report):
+    refs = dict(report.refs)
+    created = {x: 0 for x in KINDS}
+    inserted, documents = [], []
+    uids, indexing = {}, False
+
+    try:
+        for kind in KINDS.values():
+            records = await _validate(db, kind, [x for name, x in batch if name == kind.name], refs, report)
+            if not records:
+                continue
+
+            inserted += records
+
+            # One multi-row statement, ids come back in the order of the rows
+            ids = (await db.execute(
+                insert(kind.model).returning(kind.key, sort_by_parameter_order=True),
+                [x.form.model_dump() for x in records]
+            )).scalars().all()
+
+            uids[kind.name] = ids
+            # Ids scanned before the import may be cached as missing
+            entities_changed(db, kind.name, *ids)
+
+            for record, uid in zip(records, ids):
+                if record.ref is not None:
+                    refs[record.ref] = (kind.name, uid, record.artist)
+                documents.append(_document(kind, record, uid))
+            created[kind.name] += len(records)
+
+        # The triggers have counted the new songs on the cards, which may be cached with the old counts
+        albums = {x.form.album_id for x in inserted if isinstance(x.form, SongForm)}
+        if albums:
+            entities_changed(db, 'album', *albums)
+
+        if documents:
+            # Documents go first, a failure after them rolls the batch back and deletes them
+            indexing = True
+            await asyncio.to_thread(helpers.bulk, context.ctx.es, documents)
+        if inserted:
+            feed_changed(db)
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        if indexing:
+            # Documents indexed before the failure would point at rows that are gone
+            await _unindex(uids)
+        # Records of the kinds after the failure were never inserted, they fail along
+        for _, record in batch:
+            if not record.rejected:
+                report.fail(record.line, f'Batch has failed with {type(e).__name__}')
+        return
+
+    report.refs = refs
+    for name, count in created.items():
+        report.created[name] += count
+
+
+async def run(db, stream: AsyncIterator[bytes]) -> Report:
+    report, batch = Report(), []
+
+    async for line, raw in _lines(stream):
+        if not raw.strip():
+            continue
+
+        parsed = _parse(line, raw, report)
+        if parsed is not None:
+            batch.append(parsed)
+
+        if len(batch) == const.IMPORT_BATCH_SIZE:
+            await _batch(db, batch, report)
+            batch = []
+
+    if batch:
+        await _batch(db, batch, report)
+
+    return report
@@ -0,0 +1,85 @@
+import bisect
+import threading
+from typing import Callable
+
+"""
+METRICS
+"""
+
+_lock = threading.Lock()
+_counters: dict[str, int] = {}
+_histograms: dict[str, 'Histogram'] = {}
+_gauges: dict[str, Callable[[], float]] = {}
+
+# Upper bounds for histograms measured in milliseconds
+DEFAULT_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def to_dict(self) -> dict:
+        buckets = {str(b): c for b, c in zip(self.buckets, self.counts)}
+        buckets['+Inf'] = self.counts[-1]
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'max': self.max,
+            'buckets': buckets
+        }
+
+
+def inc(name: str, value: int = 1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def counter(name: str) -> int:
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def observe(name: str, value: float, buckets: tuple = DEFAULT_BUCKETS):
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram(buckets)
+        histogram.observe(value)
+
+
+def gauge(name: str, fn: Callable[[], float]):
+    """
+    Registers a callable evaluated on every snapshot
+    """
+    with _lock:
+        _gauges[name] = fn
+
+
+def snapshot() -> dict:
+    with _lock:
+        counters = dict(_counters)
+        histograms = {k: v.to_dict() for k, v in _histograms.items()}
+        gauges = dict(_gauges)
+
+    return {
+        'counters': counters,
+        'gauges': {k: fn() for k, fn in gauges.items()},
+        'histograms': histograms
+    }
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
@@ -0,0 +1,179 @@
+"""
+Applies the schema migrations and checks the live database against the models
+"""
+import argparse
+import asyncio
+import sys
+
+import asyncpg
+
+import src.config as config
+import src.const as const
+import src.migrations as migrations
+from src.models.__base__ import Base
+import src.models  # noqa: F401, registers the tables of the models
+
+"""
+DATABASE
+"""
+
+
+async def connect() -> asyncpg.Connection:
+    return await asyncpg.connect(
+        host=config.postgres_host(),
+        port=config.postgres_port(),
+        user=config.postgres_username(),
+        password=config.postgres_password(),
+        database=config.postgres_database()
+    )
+
+
+async def applied(conn) -> set[int]:
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name VARCHAR NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """)
+    return {x['version'] for x in await conn.fetch('SELECT version FROM schema_migrations')}
+
+
+def pending(all_migrations: list, versions: set[int]) -> list:
+    return [x for x in all_migrations if x.version not in versions]
+
+
+"""
+UPGRADE
+"""
+
+
+async def _drop_invalid_indexes(conn):
+    # A failed concurrent build leaves an invalid index behind, which IF NOT EXISTS would then skip
+    for row in await conn.fetch("""
+        SELECT c.relname AS name FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE NOT i.indisvalid AND n.nspname = current_schema()
+    """):
+        await conn.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{row["name"]}"')
+
+
+async def upgrade(conn) -> list:
+    """
+    Applies pending migrations in order and returns them
+    """
+    await conn.execute('SELECT pg_advisory_lock($1)', const.MIGRATIONS_LOCK)
+    try:
+        todo = pending(migrations.load(), await applied(conn))
+        if any(not x.transactional for x in todo):
+            await _drop_invalid_indexes(conn)
+
+        for migration in todo:
+            if migration.transactional:
+                async with conn.transaction():
+                    for statement in migration.statements:
+                        await conn.execute(statement)
+                    await _record(conn, migration)
+            else:
+                for statement in migration.statements:
+                    await conn.execute(statement)
+                await _record(conn, migration)
+
+        return todo
+    finally:
+        await conn.execute('SELECT pg_advisory_unlock($1)', const.MIGRATIONS_LOCK)
+
+
+async def _record(conn, migration):
+    await conn.execute('INSERT INTO schema_migrations (version, name) VALUES ($1, $2)',
+                       migration.version, migration.name)
+
+
+"""
+CHECK
+"""
+
+
+async def schema(conn) -> dict[str, tuple[set, set]]:
+    """
+    Columns and indexes of every table of the live database
+    """
+    tables = {}
+
+    for row in await conn.fetch("""
+        SELECT table_name, column_name FROM information_schema.columns WHERE table_schema = current_schema()
+    """):
+        tables.setdefault(row['table_name'], (set(), set()))[0].add(row['column_name'])
+
+    for row in await conn.fetch("""
+        SELECT tablename, indexname FROM pg_indexes WHERE schemaname = current_schema()
+    """):
+        tables.setdefault(row['tablename'], (set(), set()))[1].add(row['indexname'])
+
+    return tables
+
+
+def compare(metadata, live: dict[str, tuple[set, set]]) -> list[str]:
+    """
+    Differences of the live schema from the models, an empty list when it matches
+    """
+    problems = []
+
+    for table in metadata.sorted_tables:
+        if table.name not in live:
+            problems.append(f'table {table.name} is missing')
+            continue
+
+        columns, indexes = live[table.name]
+        for column in table.columns:
+            if column.name not in columns:
+                problems.append(f'column {table.name}.{column.name} is missing')
+        for index in table.indexes:
+            if index.name not in indexes:
+                problems.append(f'index {index.name} on {table.name} is missing')
+
+    return problems
+
+
+async def check(conn) -> list[str]:
+    problems = [f'migration {x.version} {x.name} is pending' for x in pending(migrations.load(), await applied(conn))]
+    return problems + compare(Base.metadata, await schema(conn))
+
+
+"""
+MAIN
+"""
+
+
+async def run(command: str) -> int:
+    conn = await connect()
+    try:
+        if command == 'upgrade':
+            for migration in await upgrade(conn):
+                print(f'Applied {migration.version} {migration.name}')
+            return 0
+
+        problems = await check(conn)
+        for problem in problems:
+            print(problem)
+        if not problems:
+            print('Schema matches the models')
+        return 1 if problems else 0
+    finally:
+        await conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manages the database schema')
+    parser.add_argument('command', choices=['upgrade', 'check'],
+                        help='apply pending migrations under an advisory lock, so instances deploying at once apply '
+                             'each exactly once, or compare the database with the models and exit non-zero when '
+                             'anything is pending or missing')
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(run(args.command)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+"""
+Versioned schema migrations, applied in order by `python -m src.migrate upgrade`
+"""
+import importlib
+import pkgutil
+
+
+class Migration:
+    def __init__(self, version: int, name: str, statements: list[str], transactional: bool = True):
+        self.version = version
+        self.name = name
+        self.statements = statements
+        # CREATE INDEX CONCURRENTLY cannot run in a transaction, such statements run one by one and must be safe to
+        # run again after a failure
+        self.transactional = transactional
+
+
+def load() -> list[Migration]:
+    migrations = []
+
+    # Modules named v<version>_<name>.py with a list of SQL STATEMENTS
+    for module in pkgutil.iter_modules(__path__):
+        if not module.name.startswith('v'):
+            continue
+        version, name = module.name[1:].split('_', 1)
+        m = importlib.import_module(f'{__name__}.{module.name}')
+        migrations.append(Migration(int(version), name, m.STATEMENTS, getattr(m, 'TRANSACTIONAL', True)))
+
+    migrations.sort(key=lambda x: x.version)
+    if len({x.version for x in migrations}) != len(migrations):
+        raise RuntimeError('Migration versions must be unique')
+
+    return migrations
@@ -0,0 +1,70 @@
+"""
+Tables of the models, created when missing so an existing database is adopted as is, plus the maintained counts
+"""
+
+STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        user_id SERIAL PRIMARY KEY,
+        username VARCHAR NOT NULL UNIQUE,
+        password BYTEA NOT NULL,
+        is_admin BOOLEAN NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS assets (
+        asset_id SERIAL PRIMARY KEY,
+        content_type VARCHAR NOT NULL,
+        is_uploaded BOOLEAN NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS artists (
+        artist_id SERIAL PRIMARY KEY,
+        name VARCHAR NOT NULL UNIQUE,
+        biography VARCHAR NOT NULL,
+        asset_id INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS albums (
+        album_id SERIAL PRIMARY KEY,
+        name VARCHAR NOT NULL,
+        artist_id INTEGER NOT NULL,
+        asset_id INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS songs (
+        song_id SERIAL PRIMARY KEY,
+        name VARCHAR NOT NULL,
+        album_id INTEGER NOT NULL,
+        asset_id INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS counters (
+        name VARCHAR PRIMARY KEY,
+        value INTEGER NOT NULL
+    )
+    """,
+
+    # A constant default does not rewrite the table
+    'ALTER TABLE artists ADD COLUMN IF NOT EXISTS albums_count INTEGER NOT NULL DEFAULT 0',
+    'ALTER TABLE albums ADD COLUMN IF NOT EXISTS songs_count INTEGER NOT NULL DEFAULT 0',
+
+    """
+    UPDATE artists SET albums_count = (SELECT count(*) FROM albums WHERE albums.artist_id = artists.artist_id)
+    """,
+    """
+    UPDATE albums SET songs_count = (SELECT count(*) FROM songs WHERE songs.album_id = albums.album_id)
+    """,
+    """
+    INSERT INTO counters (name, value)
+    SELECT 'users', count(*) FROM users
+    UNION ALL SELECT 'artists', count(*) FROM artists
+    UNION ALL SELECT 'albums', count(*) FROM albums
+    UNION ALL SELECT 'songs', count(*) FROM songs
+    ON CONFLICT (name) DO UPDATE SET value = excluded.value
+    """
+]
@@ -0,0 +1,15 @@
+"""
+Indexes for the list queries and the asset references
+"""
+
+# Built concurrently, so writes to the tables are not blocked
+TRANSACTIONAL = False
+
+STATEMENTS = [
+    # Albums of an artist, newest first for users and oldest first for admins, which is the same index scanned back
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_albums_artist_id_album_id ON albums (artist_id, album_id DESC)',
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_songs_album_id_song_id ON songs (album_id, song_id)',
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_artists_asset_id ON artists (asset_id)',
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_albums_asset_id ON albums (asset_id)',
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_songs_asset_id ON songs (asset_id)'
+]
@@ -0,0 +1,27 @@
+"""
+Foreign keys on the references, so the database rejects a row whose parent is missing
+"""
+
+TRANSACTIONAL = False
+
+
+def _add(table: str, name: str, column: str, parent: str) -> str:
+    # ADD CONSTRAINT has no IF NOT EXISTS
+    return f"""
+    DO $$ BEGIN
+        ALTER TABLE {table} ADD CONSTRAINT {name} FOREIGN KEY ({column}) REFERENCES {parent} ({column}) NOT VALID;
+    EXCEPTION WHEN duplicate_object THEN NULL;
+    END $$
+    """
+
+
+_KEYS = [
+    ('artists', 'fk_artists_asset_id', 'asset_id', 'assets'),
+    ('albums', 'fk_albums_artist_id', 'artist_id', 'artists'),
+    ('albums', 'fk_albums_asset_id', 'asset_id', 'assets'),
+    ('songs', 'fk_songs_album_id', 'album_id', 'albums'),
+    ('songs', 'fk_songs_asset_id', 'asset_id', 'assets')
+]
+
+# NOT VALID only checks new rows and holds its lock briefly, the validation then does not block writes
+STATEMENTS = [_add(*x) for x in _KEYS] + [f'ALTER TABLE {x[0]} VALIDATE CONSTRAINT {x[1]}' for x in _KEYS]
@@ -0,0 +1,78 @@
+"""
+Triggers keeping the counters and the child counts
+"""
+
+STATEMENTS = [
+    """
+    CREATE OR REPLACE FUNCTION count_rows() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO counters (name, value) VALUES (TG_TABLE_NAME, 1)
+            ON CONFLICT (name) DO UPDATE SET value = counters.value + 1;
+        ELSE
+            UPDATE counters SET value = value - 1 WHERE name = TG_TABLE_NAME;
+        END IF;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION count_albums() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'UPDATE' AND NEW.artist_id IS NOT DISTINCT FROM OLD.artist_id THEN
+            RETURN NULL;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            UPDATE artists SET albums_count = albums_count + 1 WHERE artist_id = NEW.artist_id;
+        END IF;
+        IF TG_OP IN ('DELETE', 'UPDATE') THEN
+            UPDATE artists SET albums_count = albums_count - 1 WHERE artist_id = OLD.artist_id;
+        END IF;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION count_songs() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'UPDATE' AND NEW.album_id IS NOT DISTINCT FROM OLD.album_id THEN
+            RETURN NULL;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            UPDATE albums SET songs_count = songs_count + 1 WHERE album_id = NEW.album_id;
+        END IF;
+        IF TG_OP IN ('DELETE', 'UPDATE') THEN
+            UPDATE albums SET songs_count = songs_count - 1 WHERE album_id = OLD.album_id;
+        END IF;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql
+    """,
+] + [
+    statement
+    for table in ('users', 'artists', 'albums', 'songs')
+    for statement in (
+        f'DROP TRIGGER IF EXISTS {table}_count_rows ON {table}',
+        f'CREATE TRIGGER {table}_count_rows AFTER INSERT OR DELETE ON {table} FOR EACH ROW EXECUTE FUNCTION count_rows()'
+    )
+] + [
+    'DROP TRIGGER IF EXISTS albums_count_albums ON albums',
+    'CREATE TRIGGER albums_count_albums AFTER INSERT OR DELETE OR UPDATE OF artist_id ON albums '
+    'FOR EACH ROW EXECUTE FUNCTION count_albums()',
+    'DROP TRIGGER IF EXISTS songs_count_songs ON songs',
+    'CREATE TRIGGER songs_count_songs AFTER INSERT OR DELETE OR UPDATE OF album_id ON songs '
+    'FOR EACH ROW EXECUTE FUNCTION count_songs()',
+
+    # Backfilled in the same transaction, instances still counting in the model hooks are replaced with this release
+    """
+    UPDATE artists SET albums_count = (SELECT count(*) FROM albums WHERE albums.artist_id = artists.artist_id)
+    """,
+    """
+    UPDATE albums SET songs_count = (SELECT count(*) FROM songs WHERE songs.album_id = albums.album_id)
+    """,
+    """
+    INSERT INTO counters (name, value)
+    SELECT 'users', count(*) FROM users
+    UNION ALL SELECT 'artists', count(*) FROM artists
+    UNION ALL SELECT 'albums', count(*) FROM albums
+    UNION ALL SELECT 'songs', count(*) FROM songs
+    ON CONFLICT (name) DO UPDATE SET value = excluded.value
+    """
+]
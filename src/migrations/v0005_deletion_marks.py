@@ -0,0 +1,53 @@
+"""
+Deletion marks on artists and albums, removed with their children by a background purge
+"""
+
+STATEMENTS = [
+    'ALTER TABLE artists ADD COLUMN IF NOT EXISTS is_deleted boolean NOT NULL DEFAULT false',
+    'ALTER TABLE albums ADD COLUMN IF NOT EXISTS is_deleted boolean NOT NULL DEFAULT false',
+    # Marked rows leave the counters and the child counts at once and are skipped when the purge removes them
+    """
+    CREATE OR REPLACE FUNCTION count_marked_rows() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'UPDATE' AND NEW.is_deleted = OLD.is_deleted THEN
+            RETURN NULL;
+        END IF;
+        IF TG_OP IN ('DELETE', 'UPDATE') AND NOT OLD.is_deleted THEN
+            UPDATE counters SET value = value - 1 WHERE name = TG_TABLE_NAME;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') AND NOT NEW.is_deleted THEN
+            INSERT INTO counters (name, value) VALUES (TG_TABLE_NAME, 1)
+            ON CONFLICT (name) DO UPDATE SET value = counters.value + 1;
+        END IF;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION count_albums() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'UPDATE' AND NEW.artist_id IS NOT DISTINCT FROM OLD.artist_id
+                AND NEW.is_deleted = OLD.is_deleted THEN
+            RETURN NULL;
+        END IF;
+        IF TG_OP IN ('DELETE', 'UPDATE') AND NOT OLD.is_deleted THEN
+            UPDATE artists SET albums_count = albums_count - 1 WHERE artist_id = OLD.artist_id;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') AND NOT NEW.is_deleted THEN
+            UPDATE artists SET albums_count = albums_count + 1 WHERE artist_id = NEW.artist_id;
+        END IF;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql
+    """,
+] + [
+    statement
+    for table in ('artists', 'albums')
+    for statement in (
+        f'DROP TRIGGER IF EXISTS {table}_count_rows ON {table}',
+        f'CREATE TRIGGER {table}_count_rows AFTER INSERT OR DELETE OR UPDATE OF is_deleted ON {table} '
+        'FOR EACH ROW EXECUTE FUNCTION count_marked_rows()'
+    )
+] + [
+    'DROP TRIGGER IF EXISTS albums_count_albums ON albums',
+    'CREATE TRIGGER albums_count_albums AFTER INSERT OR DELETE OR UPDATE OF artist_id, is_deleted ON albums '
+    'FOR EACH ROW EXECUTE FUNCTION count_albums()'
+]
@@ -0,0 +1,10 @@
+"""
+Partial indexes over the marked artists and albums, so the purge finds them without scanning the tables
+"""
+
+TRANSACTIONAL = False
+
+STATEMENTS = [
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_artists_is_deleted ON artists (artist_id) WHERE is_deleted',
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_albums_is_deleted ON albums (album_id) WHERE is_deleted'
+]
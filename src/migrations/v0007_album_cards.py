@@ -0,0 +1,25 @@
+"""
+Album cards, the albums joined with their artist names and song counts
+"""
+
+STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS album_cards (
+        album_id INTEGER PRIMARY KEY,
+        name VARCHAR NOT NULL,
+        artist_id INTEGER NOT NULL,
+        artist_name VARCHAR NOT NULL,
+        asset_id INTEGER NOT NULL,
+        songs_count INTEGER NOT NULL
+    )
+    """,
+    # The table is new, so its index is built in the same transaction as the backfill
+    'CREATE INDEX IF NOT EXISTS ix_album_cards_artist_id_album_id ON album_cards (artist_id, album_id DESC)',
+    """
+    INSERT INTO album_cards (album_id, name, artist_id, artist_name, asset_id, songs_count)
+    SELECT albums.album_id, albums.name, albums.artist_id, artists.name, albums.asset_id, albums.songs_count
+    FROM albums JOIN artists ON artists.artist_id = albums.artist_id
+    WHERE NOT albums.is_deleted AND NOT artists.is_deleted
+    ON CONFLICT (album_id) DO NOTHING
+    """
+]
@@ -0,0 +1,72 @@
+"""
+Triggers keeping the album cards along with the albums and their song counts
+"""
+
+STATEMENTS = [
+    """
+    CREATE OR REPLACE FUNCTION write_album_card() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            DELETE FROM album_cards WHERE album_id = OLD.album_id;
+            RETURN NULL;
+        END IF;
+        IF NOT NEW.is_deleted THEN
+            INSERT INTO album_cards (album_id, name, artist_id, artist_name, asset_id, songs_count)
+            SELECT NEW.album_id, NEW.name, NEW.artist_id, artists.name, NEW.asset_id, NEW.songs_count
+            FROM artists WHERE artists.artist_id = NEW.artist_id AND NOT artists.is_deleted
+            ON CONFLICT (album_id) DO UPDATE SET
+                name = excluded.name,
+                artist_id = excluded.artist_id,
+                artist_name = excluded.artist_name,
+                asset_id = excluded.asset_id,
+                songs_count = excluded.songs_count;
+            IF FOUND THEN
+                RETURN NULL;
+            END IF;
+        END IF;
+        -- A marked album, or one of a marked artist, has no card
+        DELETE FROM album_cards WHERE album_id = NEW.album_id;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION count_songs() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'UPDATE' AND NEW.album_id IS NOT DISTINCT FROM OLD.album_id THEN
+            RETURN NULL;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            UPDATE albums SET songs_count = songs_count + 1 WHERE album_id = NEW.album_id;
+            UPDATE album_cards SET songs_count = songs_count + 1 WHERE album_id = NEW.album_id;
+        END IF;
+        IF TG_OP IN ('DELETE', 'UPDATE') THEN
+            UPDATE albums SET songs_count = songs_count - 1 WHERE album_id = OLD.album_id;
+            UPDATE album_cards SET songs_count = songs_count - 1 WHERE album_id = OLD.album_id;
+        END IF;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql
+    """,
+    # The song counts are written by count_songs, an album trigger on them would count every song twice
+    'DROP TRIGGER IF EXISTS albums_write_album_card ON albums',
+    'CREATE TRIGGER albums_write_album_card AFTER INSERT OR DELETE OR UPDATE OF name, artist_id, asset_id, is_deleted '
+    'ON albums FOR EACH ROW EXECUTE FUNCTION write_album_card()',
+    # Cards written by the model hooks of an older release since the backfill are brought up to date
+    """
+    INSERT INTO album_cards (album_id, name, artist_id, artist_name, asset_id, songs_count)
+    SELECT albums.album_id, albums.name, albums.artist_id, artists.name, albums.asset_id, albums.songs_count
+    FROM albums JOIN artists ON artists.artist_id = albums.artist_id
+    WHERE NOT albums.is_deleted AND NOT artists.is_deleted
+    ON CONFLICT (album_id) DO UPDATE SET
+        name = excluded.name,
+        artist_id = excluded.artist_id,
+        artist_name = excluded.artist_name,
+        asset_id = excluded.asset_id,
+        songs_count = excluded.songs_count
+    """,
+    """
+    DELETE FROM album_cards WHERE album_id NOT IN (
+        SELECT albums.album_id FROM albums JOIN artists ON artists.artist_id = albums.artist_id
+        WHERE NOT albums.is_deleted AND NOT artists.is_deleted
+    )
+    """
+]
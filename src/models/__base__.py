@@ -1,5 +1,31 @@
-from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.orm import DeclarativeBase, attributes
 
 
 class Base(DeclarativeBase):
     pass
+
+
+# Session info keys of changes to the cached reads of the catalog, which are dropped once the session commits
+FEED_CHANGED = 'feed_changed'
+ENTITIES_CHANGED = 'entities_changed'
+# A change hiding rows the cached entities do not know of, such as the songs of a marked album
+CATALOG_CHANGED = 'catalog_changed'
+
+
+def changed(target, *keys) -> bool:
+    """
+    Whether any of the attributes is set on a new object or differs from the loaded value
+    """
+    return any(attributes.get_history(target, key).has_changes() for key in keys)
+
+
+def feed_changed(session):
+    session.info[FEED_CHANGED] = True
+
+
+def entities_changed(session, kind: str, *uids: int):
+    session.info.setdefault(ENTITIES_CHANGED, set()).update((kind, x) for x in uids)
+
+
+def catalog_changed(session):
+    session.info[CATALOG_CHANGED] = True
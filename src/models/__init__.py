@@ -1,5 +1,7 @@
 from src.models.album import Album
+from src.models.album_card import AlbumCard
 from src.models.artist import Artist
 from src.models.asset import Asset
+from src.models.counter import Counter
 from src.models.song import Song
 from src.models.user import User
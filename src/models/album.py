@@ -1,20 +1,27 @@
-from sqlalchemy import event
-from sqlalchemy.orm import Mapped, mapped_column, relationship, attributes
+from sqlalchemy import ForeignKey, Index, desc, event, select, text
+from sqlalchemy.orm import Mapped, mapped_column, object_session, relationship
 
 import src.const as const
 import src.context as context
-from src.models.__base__ import Base
+from src.models.__base__ import Base, changed, entities_changed, feed_changed
 from src.models.artist import Artist
-from src.models.asset import Asset
+from src.models.asset import usable
 
 
 class Album(Base):
     __tablename__ = 'albums'
+    __table_args__ = (
+        Index('ix_albums_artist_id_album_id', 'artist_id', desc('album_id')),
+        Index('ix_albums_is_deleted', 'album_id', postgresql_where=text('is_deleted')),
+    )
 
     album_id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str]
-    artist_id: Mapped[int]
-    asset_id: Mapped[int]
+    artist_id: Mapped[int] = mapped_column(ForeignKey('artists.artist_id', name='fk_albums_artist_id'))
+    asset_id: Mapped[int] = mapped_column(ForeignKey('assets.asset_id', name='fk_albums_asset_id'), index=True)
+    songs_count: Mapped[int] = mapped_column(default=0, server_default='0')
+    # Marked by a delete, the purge removes the album with its songs later
+    is_deleted: Mapped[bool] = mapped_column(default=False, server_default='false')
 
     cover = relationship(
         'Asset',
@@ -53,33 +60,52 @@ def name_set(target, value, oldvalue, initiator):
 @event.listens_for(Album, 'before_insert')
 @event.listens_for(Album, 'before_update')
 def before_change(mapper, connection, target):
-    db = attributes.instance_state(target).session
+    if not changed(target, 'asset_id', 'artist_id'):
+        return
+
+    # One round trip checks both references and fetches the artist name for the search index
+    is_usable, artist = connection.execute(select(
+        usable(target.asset_id, const.FILE_TYPE_IMAGE),
+        select(Artist.name).where(Artist.artist_id == target.artist_id, ~Artist.is_deleted).scalar_subquery()
+    )).one()
 
-    asset = db.get(Asset, target.asset_id)
-    if asset is None or not asset.is_uploaded or asset.content_type != const.FILE_TYPE_IMAGE:
+    if not is_usable:
         raise ValueError('Invalid asset has been provided for the album')
 
-    artist = db.get(Artist, target.artist_id)
     if artist is None:
         raise ValueError('Invalid artist has been provided for the album')
 
+    target._artist_name = artist
+
 
 @event.listens_for(Album, 'after_insert')
 @event.listens_for(Album, 'after_update')
 def after_change(mapper, connection, target):
-    db = attributes.instance_state(target).session
-    artist = db.get(Artist, target.artist_id)
-    context.ctx.es.index(
-        index=const.ELASTICSEARCH_INDEX,
-        id='album_' + str(target.album_id),
-        document={
-            'keyword': target.name,
-            'data': {
-                'name': target.name,
-                'artist': artist.name
-            }
+    document = {
+        'keyword': target.name,
+        'data': {
+            'name': target.name
         }
-    )
+    }
+
+    artist = vars(target).pop('_artist_name', None)
+    if artist is None:
+        # The artist has not changed, the indexed document keeps its name
+        context.ctx.es.update(index=const.ELASTICSEARCH_INDEX, id='album_' + str(target.album_id), doc=document,
+                              doc_as_upsert=True)
+        return
+
+    document['data']['artist'] = artist
+    context.ctx.es.index(index=const.ELASTICSEARCH_INDEX, id='album_' + str(target.album_id), document=document)
+
+
+@event.listens_for(Album, 'after_insert')
+@event.listens_for(Album, 'after_update')
+@event.listens_for(Album, 'before_delete')
+def touch_caches(mapper, connection, target):
+    session = object_session(target)
+    feed_changed(session)
+    entities_changed(session, 'album', target.album_id)
 
 
 @event.listens_for(Album, 'before_delete')
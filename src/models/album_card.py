@@ -0,0 +1,22 @@
+from sqlalchemy import Index, desc
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.models.__base__ import Base
+
+
+class AlbumCard(Base):
+    """
+    Album as clients list it, with the name of its artist and its song count, so a card is read with one lookup.
+    Written from the album, artist and song events, it is a copy and the albums stay the source of truth
+    """
+    __tablename__ = 'album_cards'
+    __table_args__ = (
+        Index('ix_album_cards_artist_id_album_id', 'artist_id', desc('album_id')),
+    )
+
+    album_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    name: Mapped[str]
+    artist_id: Mapped[int]
+    artist_name: Mapped[str]
+    asset_id: Mapped[int]
+    songs_count: Mapped[int] = mapped_column(default=0)
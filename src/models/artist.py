@@ -1,19 +1,26 @@
-from sqlalchemy import event
-from sqlalchemy.orm import Mapped, mapped_column, relationship, attributes
+from sqlalchemy import ForeignKey, Index, event, select, text, update
+from sqlalchemy.orm import Mapped, mapped_column, object_session, relationship
 
 import src.const as const
 import src.context as context
-from src.models.__base__ import Base
-from src.models.asset import Asset
+from src.models.__base__ import Base, changed, entities_changed, feed_changed
+from src.models.album_card import AlbumCard
+from src.models.asset import usable
 
 
 class Artist(Base):
     __tablename__ = 'artists'
+    __table_args__ = (
+        Index('ix_artists_is_deleted', 'artist_id', postgresql_where=text('is_deleted')),
+    )
 
     artist_id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(unique=True)
     biography: Mapped[str]
-    asset_id: Mapped[int]
+    asset_id: Mapped[int] = mapped_column(ForeignKey('assets.asset_id', name='fk_artists_asset_id'), index=True)
+    albums_count: Mapped[int] = mapped_column(default=0, server_default='0')
+    # Marked by a delete, the purge removes the artist with its albums later
+    is_deleted: Mapped[bool] = mapped_column(default=False, server_default='false')
 
     cover = relationship(
         'Asset',
@@ -53,9 +60,10 @@ def biograpy_set(target, value, oldvalue, initiator):
 @event.listens_for(Artist, 'before_insert')
 @event.listens_for(Artist, 'before_update')
 def before_change(mapper, connection, target):
-    db = attributes.instance_state(target).session
-    asset = db.get(Asset, target.asset_id)
-    if asset is None or not asset.is_uploaded or asset.content_type != const.FILE_TYPE_IMAGE:
+    if not changed(target, 'asset_id'):
+        return
+
+    if not connection.scalar(select(usable(target.asset_id, const.FILE_TYPE_IMAGE))):
         raise ValueError('Invalid asset has been provided for the artist')
 
 
@@ -74,6 +82,26 @@ def after_change(mapper, connection, target):
     )
 
 
+@event.listens_for(Artist, 'after_update')
+def after_rename(mapper, connection, target):
+    if changed(target, 'name'):
+        albums = connection.execute(
+            update(AlbumCard).where(AlbumCard.artist_id == target.artist_id).values(artist_name=target.name)
+            .returning(AlbumCard.album_id)
+        ).scalars().all()
+        # Cached cards of the albums carry the old name
+        entities_changed(object_session(target), 'album', *albums)
+
+
+@event.listens_for(Artist, 'after_insert')
+@event.listens_for(Artist, 'after_update')
+@event.listens_for(Artist, 'before_delete')
+def touch_caches(mapper, connection, target):
+    session = object_session(target)
+    feed_changed(session)
+    entities_changed(session, 'artist', target.artist_id)
+
+
 @event.listens_for(Artist, 'before_delete')
 def before_delete(mapper, connection, target):
     context.ctx.es.delete(
@@ -1,7 +1,7 @@
-from sqlalchemy import event
-from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import event, select
+from sqlalchemy.orm import Mapped, mapped_column, object_session
 
-from src.models.__base__ import Base
+from src.models.__base__ import Base, entities_changed
 
 
 class Asset(Base):
@@ -19,6 +19,23 @@ class Asset(Base):
         }
 
 
+@event.listens_for(Asset, 'after_insert')
+@event.listens_for(Asset, 'after_update')
+def touch_caches(mapper, connection, target):
+    entities_changed(object_session(target), 'asset', target.asset_id)
+
+
 @event.listens_for(Asset, 'before_delete')
 def before_delete(mapper, connection, target):
     raise RuntimeError('Assets cannot be deleted')
+
+
+def usable(asset_id: int, content_type: str):
+    """
+    Clause telling whether the asset is uploaded and has the content type
+    """
+    return select(Asset.asset_id).where(
+        Asset.asset_id == asset_id,
+        Asset.is_uploaded,
+        Asset.content_type == content_type
+    ).exists()
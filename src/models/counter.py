@@ -0,0 +1,13 @@
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.models.__base__ import Base
+
+
+class Counter(Base):
+    """
+    Row count of a table, named after it and kept by a database trigger so totals are read in O(1)
+    """
+    __tablename__ = 'counters'
+
+    name: Mapped[str] = mapped_column(primary_key=True)
+    value: Mapped[int] = mapped_column(default=0)
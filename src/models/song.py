@@ -1,21 +1,24 @@
-from sqlalchemy import event
-from sqlalchemy.orm import Mapped, mapped_column, relationship, attributes
+from sqlalchemy import ForeignKey, Index, event, select
+from sqlalchemy.orm import Mapped, attributes, mapped_column, object_session, relationship
 
 import src.const as const
 import src.context as context
-from src.models.__base__ import Base
+from src.models.__base__ import Base, changed, entities_changed, feed_changed
 from src.models.album import Album
 from src.models.artist import Artist
-from src.models.asset import Asset
+from src.models.asset import usable
 
 
 class Song(Base):
     __tablename__ = 'songs'
+    __table_args__ = (
+        Index('ix_songs_album_id_song_id', 'album_id', 'song_id'),
+    )
 
     song_id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str]
-    album_id: Mapped[int]
-    asset_id: Mapped[int]
+    album_id: Mapped[int] = mapped_column(ForeignKey('albums.album_id', name='fk_songs_album_id'))
+    asset_id: Mapped[int] = mapped_column(ForeignKey('assets.asset_id', name='fk_songs_asset_id'), index=True)
 
     album = relationship(
         'Album',
@@ -47,34 +50,54 @@ def name_set(target, value, oldvalue, initiator):
 @event.listens_for(Song, 'before_insert')
 @event.listens_for(Song, 'before_update')
 def before_change(mapper, connection, target):
-    db = attributes.instance_state(target).session
+    if not changed(target, 'asset_id', 'album_id'):
+        return
+
+    is_usable, artist = connection.execute(select(
+        usable(target.asset_id, const.FILE_TYPE_AUDIO),
+        select(Artist.name).join(Album, Album.artist_id == Artist.artist_id).where(
+            Album.album_id == target.album_id, ~Album.is_deleted).scalar_subquery()
+    )).one()
 
-    asset = db.get(Asset, target.asset_id)
-    if asset is None or not asset.is_uploaded or asset.content_type != const.FILE_TYPE_AUDIO:
+    if not is_usable:
         raise ValueError('Invalid asset has been provided for the song')
 
-    album = db.get(Album, target.album_id)
-    if album is None:
+    if artist is None:
         raise ValueError('Invalid album has been provided for the song')
 
+    target._artist_name = artist
+
 
 @event.listens_for(Song, 'after_insert')
 @event.listens_for(Song, 'after_update')
 def after_change(mapper, connection, target):
-    db = attributes.instance_state(target).session
-    album = db.get(Album, target.album_id)
-    artist = db.get(Artist, album.artist_id)
-    context.ctx.es.index(
-        index=const.ELASTICSEARCH_INDEX,
-        id='song_' + str(target.song_id),
-        document={
-            'keyword': target.name,
-            'data': {
-                'name': target.name,
-                'artist': artist.name
-            }
+    document = {
+        'keyword': target.name,
+        'data': {
+            'name': target.name
         }
-    )
+    }
+
+    artist = vars(target).pop('_artist_name', None)
+    if artist is None:
+        # The album has not changed, the indexed document keeps the artist name
+        context.ctx.es.update(index=const.ELASTICSEARCH_INDEX, id='song_' + str(target.song_id), doc=document,
+                              doc_as_upsert=True)
+        return
+
+    document['data']['artist'] = artist
+    context.ctx.es.index(index=const.ELASTICSEARCH_INDEX, id='song_' + str(target.song_id), document=document)
+
+
+@event.listens_for(Song, 'after_insert')
+@event.listens_for(Song, 'after_update')
+@event.listens_for(Song, 'before_delete')
+def touch_caches(mapper, connection, target):
+    session = object_session(target)
+    feed_changed(session)
+    entities_changed(session, 'song', target.song_id)
+    # Cards of the albums count their songs
+    entities_changed(session, 'album', target.album_id, *attributes.get_history(target, 'album_id').deleted)
 
 
 @event.listens_for(Song, 'before_delete')
@@ -0,0 +1,89 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import HTTPException
+
+import src.config as config
+import src.metrics as metrics
+import src.util as util
+
+"""
+POOL
+"""
+
+_executor: ProcessPoolExecutor | None = None
+
+# Hashes submitted by this worker and not finished yet, running ones included
+_pending = 0
+
+
+def _pool() -> ProcessPoolExecutor | None:
+    global _executor
+    if config.password_pool_size() <= 0:
+        return None
+    if _executor is None:
+        # The worker runs threads by the first hash, which a forked child would inherit with their locks held
+        _executor = ProcessPoolExecutor(max_workers=config.password_pool_size(),
+                                        mp_context=multiprocessing.get_context('forkserver'))
+    return _executor
+
+
+def _timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def _queue_depth() -> int:
+    return max(0, _pending - config.password_pool_size())
+
+
+metrics.gauge('password_pool_pending', lambda: _pending)
+metrics.gauge('password_pool_queue_depth', _queue_depth)
+
+
+async def _run(fn, *args):
+    """
+    Runs bcrypt off the event loop, rejecting with 503 once the wait queue is full
+    """
+    global _pending
+
+    if _pending >= max(config.password_pool_size(), 1) + config.password_queue_size():
+        metrics.inc('password_pool_rejected')
+        raise HTTPException(503, headers={'Retry-After': '1'})
+
+    _pending += 1
+    started = time.perf_counter()
+    try:
+        # Pool size 0 runs hashing in the default thread pool instead of separate processes
+        result, elapsed = await asyncio.get_running_loop().run_in_executor(_pool(), _timed, fn, *args)
+    finally:
+        _pending -= 1
+
+    metrics.observe('password_hash_ms', elapsed * 1000)
+    metrics.observe('password_wait_ms', (time.perf_counter() - started - elapsed) * 1000)
+
+    return result
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+"""
+PASSWORDS
+"""
+
+
+async def hashpw(password: str) -> bytes:
+    # Pool processes keep the settings they were started with, so the cost is passed along
+    return await _run(util.hashpw, password, config.bcrypt_rounds())
+
+
+async def checkpw(password: str, hashed_password: bytes) -> bool:
+    return await _run(util.checkpw, password, hashed_password)
@@ -0,0 +1,92 @@
+import time
+import uuid
+
+from sqlalchemy import event, exc
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+import src.config as config
+import src.deadlines as deadlines
+import src.metrics as metrics
+
+"""
+POOL
+"""
+
+# Upper bounds for connection ages in seconds
+AGE_BUCKETS = (1, 10, 60, 300, 900, 1800, 3600, 7200, 86400)
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """
+    Queue pool counting the callers waiting for a connection and timing their wait
+    """
+    name = 'primary'
+    waiting = 0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        self.waiting += 1
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            deadlines.fail(503)
+            raise
+        finally:
+            self.waiting -= 1
+            metrics.observe(f'db_pool_{self.name}_wait_ms', (time.perf_counter() - started) * 1000)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.name = self.name
+        return pool
+
+
+def _connect_args() -> dict:
+    if not config.postgres_pgbouncer():
+        return {'server_settings': {'statement_timeout': str(int(config.postgres_statement_timeout() * 1000))}}
+
+    # A transaction pooling proxy hands each transaction to any server connection, prepared statements of the
+    # client connection may not be there, so they are not cached and get names unique across all clients
+    return {
+        'statement_cache_size': 0,
+        'prepared_statement_cache_size': 0,
+        'prepared_statement_name_func': lambda: f'__asyncpg_{uuid.uuid4()}__'
+    }
+
+
+def create_engine(dsn: str, name: str) -> AsyncEngine:
+    """
+    Engine with the pool settings of the config, its pool reported by the metrics under the name
+    """
+    engine = create_async_engine(
+        dsn,
+        poolclass=InstrumentedPool,
+        pool_size=config.postgres_pool_size(),
+        max_overflow=config.postgres_pool_overflow(),
+        pool_timeout=config.postgres_pool_timeout(),
+        pool_recycle=config.postgres_pool_recycle(),
+        pool_pre_ping=config.postgres_pool_pre_ping(),
+        connect_args=_connect_args()
+    )
+    engine.pool.name = name
+
+    @event.listens_for(engine.sync_engine, 'connect')
+    def on_connect(dbapi_connection, record):
+        record.info['connected_at'] = time.monotonic()
+
+    @event.listens_for(engine.sync_engine, 'checkout')
+    def on_checkout(dbapi_connection, record, proxy):
+        age = time.monotonic() - record.info.get('connected_at', time.monotonic())
+        metrics.observe(f'db_pool_{name}_connection_age_s', age, AGE_BUCKETS)
+
+    # Handlers answer most database errors with 400, the deadline keeps what they are caused by
+    event.listen(engine.sync_engine, 'handle_error', deadlines.on_database_error)
+
+    # The pool is looked up on every snapshot, it is replaced when the engine is disposed
+    metrics.gauge(f'db_pool_{name}_checked_out', lambda: engine.pool.checkedout())
+    metrics.gauge(f'db_pool_{name}_idle', lambda: engine.pool.checkedin())
+    metrics.gauge(f'db_pool_{name}_overflow', lambda: max(engine.pool.overflow(), 0))
+    metrics.gauge(f'db_pool_{name}_waiting', lambda: engine.pool.waiting)
+
+    return engine
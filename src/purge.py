@@ -0,0 +1,149 @@
+"""
+Deletes of artists and albums, marked by a request and removed with their children in the background
+"""
+import asyncio
+import contextvars
+import logging
+
+from sqlalchemy import bindparam, delete, select, update
+
+import src.const as const
+import src.context as context
+import src.metrics as metrics
+from src.models import Album, Artist, Song
+from src.models.__base__ import catalog_changed, feed_changed
+
+_logger = logging.getLogger(__name__)
+
+"""
+MARKS
+"""
+
+
+async def mark_artist(db, artist_id: int):
+    # Albums are marked along, so none of them is served while the purge works through them
+    await db.execute(update(Artist).where(Artist.artist_id == artist_id).values(is_deleted=True))
+    await db.execute(update(Album).where(Album.artist_id == artist_id).values(is_deleted=True))
+    feed_changed(db)
+    catalog_changed(db)
+
+
+async def mark_album(db, album_id: int):
+    await db.execute(update(Album).where(Album.album_id == album_id).values(is_deleted=True))
+    feed_changed(db)
+    catalog_changed(db)
+
+
+"""
+STATEMENTS
+"""
+
+# Albums added to an artist while it was being marked
+MARK_ORPHANS = update(Album).where(
+    ~Album.is_deleted,
+    Album.artist_id.in_(select(Artist.artist_id).where(Artist.is_deleted))
+).values(is_deleted=True)
+
+# Rows locked by a purge of another worker are skipped, that purge removes them
+SONGS = delete(Song).where(Song.song_id.in_(
+    select(Song.song_id).join(Album, Album.album_id == Song.album_id).where(Album.is_deleted)
+    .limit(bindparam('limit')).with_for_update(of=Song, skip_locked=True)
+)).returning(Song.song_id)
+
+ALBUMS = delete(Album).where(Album.album_id.in_(
+    select(Album.album_id).where(Album.is_deleted, ~select(Song.song_id).where(Song.album_id == Album.album_id).exists())
+    .limit(bindparam('limit')).with_for_update(skip_locked=True)
+)).returning(Album.album_id)
+
+ARTISTS = delete(Artist).where(Artist.artist_id.in_(
+    select(Artist.artist_id).where(Artist.is_deleted,
+                                   ~select(Album.album_id).where(Album.artist_id == Artist.artist_id).exists())
+    .limit(bindparam('limit')).with_for_update(skip_locked=True)
+)).returning(Artist.artist_id)
+
+"""
+PURGE
+"""
+
+
+def unindex(kind: str, ids: list[int]):
+    """
+    Deletes the search documents of the rows of the kind
+    """
+    context.ctx.es.delete_by_query(
+        index=const.ELASTICSEARCH_INDEX,
+        query={'ids': {'values': [f'{kind}_{x}' for x in ids]}},
+        conflicts='proceed',
+        ignore_unavailable=True
+    )
+
+
+async def _batch(statement, kind: str) -> int:
+    """
+    Deletes one batch of rows and their search documents, returns how many rows were deleted
+    """
+    async with context.ctx.sm() as db:
+        ids = (await db.execute(statement, {'limit': const.PURGE_BATCH_SIZE})).scalars().all()
+        if ids:
+            # Documents go first, a failure keeps the rows marked for the next purge
+            await asyncio.to_thread(unindex, kind, ids)
+        await db.commit()
+
+    metrics.inc(f'purge_{kind}s_deleted', len(ids))
+    return len(ids)
+
+
+async def purge():
+    """
+    Removes all marked artists and albums, children first, since the foreign keys hold parents with children
+    """
+    try:
+        async with context.ctx.sm() as db:
+            await db.execute(MARK_ORPHANS)
+            feed_changed(db)
+            catalog_changed(db)
+            await db.commit()
+
+        for statement, kind in ((SONGS, 'song'), (ALBUMS, 'album'), (ARTISTS, 'artist')):
+            while await _batch(statement, kind) == const.PURGE_BATCH_SIZE:
+                pass
+    except Exception as e:
+        metrics.inc('purge_failed')
+        _logger.warning('Purge failed, marked rows are left for the next one: %s', e)
+
+
+"""
+WORKER
+"""
+
+_task: asyncio.Task | None = None
+
+# Set when a delete asks for a purge while one is running, whose scans may be past the new marks
+_again = False
+
+
+async def _run():
+    global _again
+    _again = True
+    while _again:
+        _again = False
+        await purge()
+
+
+def start() -> asyncio.Task:
+    """
+    Runs the purge in the background of the worker, or once more after the running one
+    """
+    global _task, _again
+    if _task is not None and not _task.done():
+        _again = True
+        return _task
+
+    # A fresh context, the deadline of the request asking for the purge must not limit it
+    _task = asyncio.get_running_loop().create_task(_run(), context=contextvars.Context())
+    return _task
+
+
+def stop():
+    if _task is not None:
+        _task.cancel()
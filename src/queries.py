@@ -0,0 +1,129 @@
+"""
+Read side of the catalog, statements compiled once at import with rows mapped straight to dicts
+"""
+import asyncio
+import base64
+
+from fastapi import HTTPException
+from sqlalchemy import bindparam, select
+
+import src.const as const
+from src.models import (
+    Album,
+    AlbumCard,
+    Artist,
+    Asset,
+    Counter,
+    Song,
+    User
+)
+
+"""
+CURSORS
+"""
+
+
+def encode_cursor(key: int) -> str:
+    return base64.urlsafe_b64encode(str(key).encode()).rstrip(b'=').decode()
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        return int(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except Exception:
+        raise HTTPException(400)
+
+
+"""
+EXECUTION
+"""
+
+
+async def one(db, statement, **params) -> dict | None:
+    row = (await db.execute(statement, params)).mappings().first()
+    return None if row is None else dict(row)
+
+
+async def scalar(db, statement, **params):
+    return (await db.execute(statement, params)).scalar()
+
+
+async def concurrently(sm, *statements) -> list[list[dict]]:
+    """
+    Runs independent statements at once, each in its own session of the maker, since a session runs one at a time
+    """
+
+    async def run(statement):
+        async with sm() as db:
+            return [dict(x) for x in (await db.execute(statement)).mappings()]
+
+    return await asyncio.gather(*(run(x) for x in statements))
+
+
+class Listing:
+    """
+    Statements paging a select by its unique key, either by page number or after the cursor of the previous page.
+    A cursor seeks by the key, so it costs the same at any depth
+    """
+    __slots__ = ('key', 'by_page', 'by_cursor')
+
+    def __init__(self, statement, key, descending: bool = False):
+        statement = statement.order_by(key.desc() if descending else key).limit(bindparam('limit'))
+
+        self.key = key.key
+        self.by_page = statement.offset(bindparam('offset'))
+        self.by_cursor = statement.where(key < bindparam('cursor') if descending else key > bindparam('cursor'))
+
+    async def page(self, db, page: int, limit: int, after: str | None = None, **params) -> tuple[list, str | None]:
+        """
+        Rows of the page and the cursor of the next one, when there is one
+        """
+        if after is None:
+            statement, params = self.by_page, {**params, 'offset': limit * (page - 1)}
+        else:
+            statement, params = self.by_cursor, {**params, 'cursor': decode_cursor(after)}
+
+        # One extra row tells whether a next page exists
+        rows = (await db.execute(statement, {**params, 'limit': limit + 1})).mappings().all()
+        items = [dict(x) for x in rows[:limit]]
+
+        return items, encode_cursor(items[-1][self.key]) if len(rows) > limit else None
+
+
+"""
+STATEMENTS
+"""
+
+USER = (User.user_id, User.username, User.is_admin)
+ARTIST = (Artist.artist_id, Artist.name, Artist.biography, Artist.asset_id)
+ALBUM = (Album.album_id, Album.name, Album.artist_id, Album.asset_id)
+SONG = (Song.song_id, Song.name, Song.album_id, Song.asset_id)
+ASSET = (Asset.asset_id, Asset.content_type, Asset.is_uploaded)
+ALBUM_CARD = (AlbumCard.album_id, AlbumCard.name, AlbumCard.artist_id, AlbumCard.asset_id, AlbumCard.artist_name,
+              AlbumCard.songs_count)
+
+# Marked artists and albums are gone for readers, songs are gone with their album
+SONG_OF_ALBUM = (Album, (Album.album_id == Song.album_id) & ~Album.is_deleted)
+
+ARTIST_BY_ID = select(*ARTIST).where(Artist.artist_id == bindparam('artist_id'), ~Artist.is_deleted)
+# Cards of marked albums are deleted with the mark
+ALBUM_CARD_BY_ID = select(*ALBUM_CARD).where(AlbumCard.album_id == bindparam('album_id'))
+SONG_BY_ID = select(*SONG).join(*SONG_OF_ALBUM).where(Song.song_id == bindparam('song_id'))
+ASSET_BY_ID = select(*ASSET).where(Asset.asset_id == bindparam('asset_id'))
+
+COUNTER = select(Counter.value).where(Counter.name == bindparam('name'))
+ALBUMS_COUNT = select(Artist.albums_count).where(Artist.artist_id == bindparam('artist_id'), ~Artist.is_deleted)
+SONGS_COUNT = select(Album.songs_count).where(Album.album_id == bindparam('album_id'), ~Album.is_deleted)
+
+NEWEST_ARTISTS = select(*ARTIST).where(~Artist.is_deleted).order_by(Artist.artist_id.desc()).limit(
+    const.INDEX_ARTISTS_COUNT)
+NEWEST_ALBUMS = select(*ALBUM_CARD).order_by(AlbumCard.album_id.desc()).limit(const.INDEX_ALBUMS_COUNT)
+NEWEST_SONGS = select(*SONG).join(*SONG_OF_ALBUM).order_by(Song.song_id.desc()).limit(const.INDEX_SONGS_COUNT)
+
+USERS = Listing(select(*USER), User.user_id)
+ARTISTS = Listing(select(*ARTIST).where(~Artist.is_deleted), Artist.artist_id)
+ARTIST_ALBUMS = Listing(select(*ALBUM).where(Album.artist_id == bindparam('artist_id'), ~Album.is_deleted),
+                        Album.album_id)
+ARTIST_ALBUMS_NEWEST = Listing(select(*ALBUM_CARD).where(AlbumCard.artist_id == bindparam('artist_id')),
+                               AlbumCard.album_id, descending=True)
+ALBUM_SONGS = Listing(select(*SONG).join(*SONG_OF_ALBUM).where(Song.album_id == bindparam('album_id')), Song.song_id)
@@ -0,0 +1,71 @@
+import math
+
+from fastapi import HTTPException
+
+import src.config as config
+import src.context as context
+import src.metrics as metrics
+
+"""
+SCRIPTS
+"""
+
+# KEYS: buckets; ARGV: rate (tokens per second) and burst for every bucket
+# Takes a token from every bucket only if all of them have one, so a rejected attempt costs nothing.
+# Returns 0 when allowed, otherwise milliseconds until the attempt can succeed
+_TAKE = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+local tokens = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 2 - 1])
+    local burst = tonumber(ARGV[i * 2])
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local left = tonumber(bucket[1]) or burst
+    local ts = tonumber(bucket[2]) or now
+    left = math.min(burst, left + (now - ts) / 1000 * rate)
+    if left < 1 then
+        wait = math.max(wait, math.ceil((1 - left) / rate * 1000))
+    end
+    tokens[i] = left
+end
+if wait > 0 then
+    return wait
+end
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 2 - 1])
+    local burst = tonumber(ARGV[i * 2])
+    redis.call('HSET', key, 'tokens', tostring(tokens[i] - 1), 'ts', tostring(now))
+    redis.call('PEXPIRE', key, math.ceil(burst / rate * 1000))
+end
+return 0
+"""
+
+"""
+LIMITS
+"""
+
+
+def check(scope: str, username: str, address: str | None):
+    """
+    Admits an attempt of the scope (e.g. 'login') or rejects it with 429 before any expensive work
+    """
+    keys, args = [], []
+
+    for kind, value, rate, burst in (
+        ('user', username, config.auth_limit_username_rate(), config.auth_limit_username_burst()),
+        ('addr', address, config.auth_limit_address_rate(), config.auth_limit_address_burst())
+    ):
+        if value is None or rate <= 0:
+            continue
+        keys.append(f'ratelimit:{scope}:{kind}:{value}')
+        args += [rate / 60, max(burst, 1)]
+
+    if not keys:
+        return
+
+    wait = context.ctx.rs.register_script(_TAKE)(keys=keys, args=args)
+    if wait:
+        metrics.inc(f'ratelimit_{scope}_rejected')
+        raise HTTPException(429, headers={'Retry-After': str(math.ceil(wait / 1000))})
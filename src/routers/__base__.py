@@ -1,12 +1,20 @@
 from fastapi import HTTPException
 
 
-def assert_exists(db, cls, uid):
+async def assert_exists(db, cls, uid):
     try:
-        o = db.get(cls, uid)
+        o = await db.get(cls, uid)
     except Exception:
         raise HTTPException(404)
 
+    # Marked for deletion is as good as deleted
+    if o is None or getattr(o, 'is_deleted', False):
+        raise HTTPException(404)
+
+    return o
+
+
+def assert_found(o):
     if o is None:
         raise HTTPException(404)
 
@@ -1,14 +1,19 @@
-from typing import Annotated
+from typing import Annotated, Literal
 
 from botocore.exceptions import ClientError
-from fastapi import APIRouter, HTTPException, Query, File, UploadFile, Depends
-from sqlalchemy import func
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Query, File, UploadFile, Depends, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
 import src.const as const
 import src.context as context
-import src.util as util
+import src.exporter as exporter
+import src.importer as importer
+import src.metrics as metrics
+import src.passwords as passwords
+import src.purge as purge
+import src.queries as queries
+import src.sessions as sessions
 from src.forms import (
     AlbumForm,
     ArtistForm,
@@ -25,6 +30,7 @@ from src.models import (
     Album,
 )
 from src.routers.__base__ import assert_exists
+from src.sessions import Claims
 
 """
 ROUTER
@@ -37,21 +43,19 @@ HELPERS
 """
 
 
-def assert_is_admin(db: Session, token: str) -> User:
-    redis = context.ctx.rs
-
-    user_id = redis.get(token)
-    if user_id is None:
+def assert_is_admin(token: str) -> Claims:
+    claims = sessions.read(token)
+    if claims is None or not claims.is_admin:
         raise HTTPException(404)
 
-    user = db.get(User, int(user_id))
-    if user is None or not user.is_admin:
-        raise HTTPException(404)
+    return claims
 
-    redis.set(token, user.user_id)
-    redis.expire(token, const.SESSION_TTL)
 
-    return user
+async def commit(db: AsyncSession, token: str):
+    await db.commit()
+
+    # The admin reads the catalog through replicas, which may not have the write yet
+    sessions.pin(token)
 
 
 """
@@ -69,6 +73,8 @@ USERS
 Параметры запроса:
 - token - токен сессии
 - page - номер страницы
+- limit - записей на странице, от 1 до 100 (по умолчанию 10)
+- after - курсор из поля next предыдущего ответа, заменяет page и не замедляется на дальних страницах
 
 ---
 
@@ -78,6 +84,7 @@ USERS
   "total": <всего_записей>,
   "page": <текущая_страница>,
   "per_page": <записей_на_страницу>,
+  "next": "<курсор_следующей_страницы>" или null,
   "items": [
     <записи>
   ]
@@ -87,24 +94,25 @@ USERS
             """)
 async def users_list(
     token: Annotated[str, Query(title='Токен сессии')],
-    page: Annotated[int, Query(title='Номер страницы', min=1)] = 1,
-    db: Session = Depends(context.get_db)
+    page: Annotated[int, Query(title='Номер страницы', ge=1)] = 1,
+    limit: Annotated[int, Query(title='Записей на странице', ge=1, le=const.MAX_ELEMENTS_PER_PAGE)] = const.ELEMENTS_PER_PAGE,
+    after: Annotated[str | None, Query(title='Курсор следующей страницы')] = None,
+    db: AsyncSession = Depends(context.get_db)
 ):
-    assert_is_admin(db, token)
+    assert_is_admin(token)
 
     try:
-        total = db.scalar(select(func.count()).select_from(User))
-        users = db.scalars(
-            select(User).offset(const.ELEMENTS_PER_PAGE * (page - 1)).limit(const.ELEMENTS_PER_PAGE).order_by(
-                User.user_id))
+        total = await queries.scalar(db, queries.COUNTER, name=User.__tablename__) or 0
+        users, cursor = await queries.USERS.page(db, page, limit, after)
     except Exception:
         raise HTTPException(400)
 
     return {
         'total': total,
         'page': page,
-        'per_page': const.ELEMENTS_PER_PAGE,
-        'items': [x.to_dict() for x in users]
+        'per_page': limit,
+        'next': cursor,
+        'items': users
     }
 
 
@@ -146,18 +154,19 @@ async def users_list(
 async def users_create(
     token: Annotated[str, Query(title='Токен сессии')],
     body: UserCreateForm,
-    db: Session = Depends(context.get_db)
+    db: AsyncSession = Depends(context.get_db)
 ):
-    me = assert_is_admin(db, token)
+    me = assert_is_admin(token)
+
+    password = await passwords.hashpw(body.password)
 
     try:
-        user = User(username=body.username, password=util.hashpw(body.password), is_admin=body.is_admin)
+        user = User(username=body.username, password=password, is_admin=body.is_admin)
 
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        await commit(db, token)
     except Exception:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(400)
 
     log_action(me.user_id, 'user_create', {
@@ -197,12 +206,12 @@ async def users_create(
 async def users_read(
     user_id: int,
     token: Annotated[str, Query(title='Токен сессии')],
-    db: Session = Depends(context.get_db)
+    db: AsyncSession = Depends(context.get_db)
 ):
-    assert_is_admin(db, token)
+    assert_is_admin(token)
 
     return {
-        'user': assert_exists(db, User, user_id).to_dict()
+        'user': (await assert_exists(db, User, user_id)).to_dict()
     }
 
 
@@ -247,27 +256,32 @@ async def users_update(
     user_id: int,
     token: Annotated[str, Query(title='Токен сессии')],
     body: UserUpdateForm,
-    db: Session = Depends(context.get_db)
+    db: AsyncSession = Depends(context.get_db)
 ):
-    me = assert_is_admin(db, token)
-    user = assert_exists(db, User, user_id)
+    me = assert_is_admin(token)
+    user = await assert_exists(db, User, user_id)
 
     if me.user_id == user.user_id and body.is_admin == False:
         raise HTTPException(400)
 
+    password = None
+    if body.password is not None:
+        password = await passwords.hashpw(body.password)
+
     try:
         user.username = body.username
         user.is_admin = body.is_admin
 
-        if body.password is not None:
-            user.password = util.hashpw(body.password)
+        if password is not None:
+            user.password = password
 
-        db.commit()
-        db.refresh(user)
+        await commit(db, token)
     except Exception:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(400)
 
+    sessions.rewrite_user(user)
+
     log_action(me.user_id, 'user_update', {
         'user': str(user.to_dict())
     })
@@ -306,21 +320,23 @@ async def users_update(
 async def users_delete(
     user_id: int,
     token: Annotated[str, Query(title='Токен сессии')],
-    db: Session = Depends(context.get_db)
+    db: AsyncSession = Depends(context.get_db)
 ):
-    me = assert_is_admin(db, token)
-    user = assert_exists(db, User, user_id)
+    me = assert_is_admin(token)
+    user = await assert_exists(db, User, user_id)
 
     if me.user_id == user.user_id:
         raise HTTPException(400)
 
     try:
-        db.delete(user)
-        db.commit()
+        await db.delete(user)
+        await commit(db, token)
     except Exception:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(400)
 
+    sessions.revoke_user(user.user_id)
+
     log_action(me.user_id, 'users_delete', {
         'user': str(user.to_dict())
     })
@@ -345,6 +361,8 @@ ARTISTS
 Параметры запроса:
 - token - токен сессии
 - page - номер страницы
+- limit - записей на странице, от 1 до 100 (по умолчанию 10)
+- after - курсор из поля next предыдущего ответа, заменяет page и не замедляется на дальних страницах
 
 ---
 
@@ -354,6 +372,7 @@ ARTISTS
   "total": <всего_записей>,
   "page": <текущая_страница>,
   "per_page": <записей_на_страницу>,
+  "next": "<курсор_следующей_страницы>" или null,
   "items": [
     <записи>
   ]
@@ -363,24 +382,25 @@ ARTISTS
             """)
 async def artists_list(
     token: Annotated[str, Query(title='Токен сессии')],
-    page: Annotated[int, Query(title='Номер страницы', min=1)] = 1,
-    db: Session = Depends(context.get_db)
+    page: Annotated[int, Query(title='Номер страницы', ge=1)] = 1,
+    limit: Annotated[int, Query(title='Записей на странице', ge=1, le=const.MAX_ELEMENTS_PER_PAGE)] = const.ELEMENTS_PER_PAGE,
+    after: Annotated[str | None, Query(title='Курсор следующей страницы')] = None,
+    db: AsyncSession = Depends(context.get_db)
 ):
-    assert_is_admin(db, token)
+    assert_is_admin(token)
 
     try:
-        total = db.scalar(select(func.count()).select_from(Artist))
-        artists = db.scalars(
-            select(Artist).offset(const.ELEMENTS_PER_PAGE * (page - 1)).limit(const.ELEMENTS_PER_PAGE).order_by(
-                Artist.artist_id))
+        total = await queries.scalar(db, queries.COUNTER, name=Artist.__tablename__) or 0
+        artists, cursor = await queries.ARTISTS.page(db, page, limit, after)
     except Exception:
         raise HTTPException(400)
 
     return {
         'total': total,
         'page': page,
-        'per_page': const.ELEMENTS_PER_PAGE,
-        'items': [x.to_dict() for x in artists]
+        'per_page': limit,
+        'next': cursor,
+        'items': artists
     }
 
 
@@ -423,18 +443,17 @@ async def artists_list(
 async def artists_create(
     token: Annotated[str, Query(title='Токен сессии')],
     body: ArtistForm,
-    db: Session = Depends(context.get_db)
+    db: AsyncSession = Depends(context.get_db)
 ):
-    me = assert_is_admin(db, token)
+    me = assert_is_admin(token)
 
     try:
         artist = Artist(name=body.name, biography=body.biography, asset_id=body.asset_id)
 
         db.add(artist)
-        db.commit()
-        db.refresh(artist)
+        await commit(db, token)
     except Exception:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(400)
 
     log_action(me.user_id, 'artist_create', {
@@ -475,12 +494,12 @@ async def artists_create(
 async def artists_read(
     artist_id: int,
     token: Annotated[str, Query(title='Токен сессии')],
-    db: Session = Depends(context.get_db)
+    db: AsyncSession = Depends(context.get_db)
 ):
-    assert_is_admin(db, token)
+    assert_is_admin(token)
 
     return {
-        'artist': assert_exists(db, Artist, artist_id).to_dict()
+        'artist': (await assert_exists(db, Artist, artist_id)).to_dict()
     }
 
 
@@ -523,21 +542,20 @@ async def artists_update(
     artist_id: int,
     token: Annotated[str, Query(title='Токен сессии')],
     body: ArtistForm,
-    db: Session = Depends(context.get_db)
+    db: AsyncSession = Depends(context.get_db)
 ):
-    me = assert_is_admin(db, token)
+    me = assert_is_admin(token)
 
-    artist = assert_exists(db, Artist, artist_id)
+    artist = await assert_exists(db, Artist, artist_id)
 
     try:
         artist.name = body.name
         artist.biography = body.biography
         artist.asset_id = body.asset_id
 
-        db.commit()
-        db.refresh(artist)
+        await commit(db, token)
     except Exception:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(400)
 
     log_action(me.user_id, 'artist_update', {
@@ -553,6 +571,7 @@ async def artists_update(
                name='Удаление',
                description="""
 Удаление исполнителя.
+Исполнитель сразу скрывается, а его альбомы и песни удаляются в фоне.
 
 ---
 
@@ -578,19 +597,21 @@ async def artists_update(
 async def artists_delete(
     artist_id: int,
     token: Annotated[str, Query(title='Токен сессии')],
-    db: Session = Depends(context.get_db)
+    db: AsyncSession = Depends(context.get_db)
 ):
-    me = assert_is_admin(db, token)
+    me = assert_is_admin(token)
 
-    artist = assert_exists(db, Artist, artist_id)
+    artist = await assert_exists(db, Artist, artist_id)
 
     try:
-        db.delete(artist)
-        db.commit()
+        await purge.mark_artist(db, artist_id)
+        await commit(db, token)
     except Exception:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(400)
 
+    purge.start()
+
     log_action(me.user_id, 'artist_delete', {
         'artist': str(artist.to_dict())
     })
@@ -611,6 +632,8 @@ async def artists_delete(
 - artist_id - ID исполнителя
 - token - токен сессии
 - page - номер страницы
+- limit - записей на странице, от 1 до 100 (по умолчанию 10)
+- after - курсор из поля next предыдущего ответа, заменяет page и не замедляется на дальних страницах
 
 ---
 
@@ -620,6 +643,7 @@ async def artists_delete(
   "total": <всего_записей>,
   "page": <текущая_страница>,
   "per_page": <записей_на_страницу>,
+  "next": "<курсор_следующей_страницы>" или null,
   "items": [
     <записи>
   ]
@@ -631,25 +655,25 @@ async def artists_delete(
 async def artists_albums(
     artist_id: int,
     token: Annotated[str, Query(title='Токен сессии')],
-    page: Annotated[int, Query(title='Номер страницы', min=1)] = 1,
-    db: Session = Depends(context.get_db)
+    page: Annotated[int, Query(title='Номер страницы', ge=1)] = 1,
+    limit: Annotated[int, Query(title='Записей на странице', ge=1, le=const.MAX_ELEMENTS_PER_PAGE)] = const.ELEMENTS_PER_PAGE,
+    after: Annotated[str | None, Query(title='Курсор следующей страницы')] = None,
+    db: AsyncSession = Depends(context.get_db)
 ):
-    assert_is_admin(db, token)
+    assert_is_admin(token)
 
     try:
-        total = db.scalar(select(func.count()).select_from(Album).where(Album.artist_id == artist_id))
-        albums = db.scalars(
-            select(Album).where(Album.artist_id == artist_id).offset(const.ELEMENTS_PER_PAGE * (page - 1)).limit(
-                const.ELEMENTS_PER_PAGE).order_by(
-                Album.album_id))
+        total = await queries.scalar(db, queries.ALBUMS_COUNT, artist_id=artist_id) or 0
+        albums, cursor = await queries.ARTIST_ALBUMS.page(db, page, limit, after, artist_id=artist_id)
     except Exception:
         raise HTTPException(400)
 
     return {
         'total': total,
         'page': page,
-        'per_page': const.ELEMENTS_PER_PAGE,
-        'items': [x.to_dict() for x in albums]
+        'per_page': limit,
+        'next': cursor,
+        'items': albums
     }
 
 
@@ -695,18 +719,17 @@ ALBUMS
 async def albums_create(
     token: Annotated[str, Query(title='Токен сессии')],
     body: AlbumForm,
-    db: Session = Depends(context.get_db)
+    db: AsyncSession = Depends(context.get_db)
 ):
-    me = assert_is_admin(db, token)
+    me = assert_is_admin(token)
 
     try:
         album = Album(name=body.name, artist_id=body.artist_id, asset_id=body.asset_id)
 
         db.add(album)
-        db.commit()
-        db.refresh(album)
+        await commit(db, token)
     except Exception:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(400)
 
     log_action(me.user_id, 'album_create', {
@@ -747,12 +770,12 @@ async def albums_create(
 async def albums_read(
     album_id: int,
     token: Annotated[str, Query(title='Токен сессии')],
-    db: Session = Depends(context.get_db)
+    db: AsyncSession = Depends(context.get_db)
 ):
-    assert_is_admin(db, token)
+    assert_is_admin(token)
 
     return {
-        'album': assert_exists(db, Album, album_id).to_dict()
+        'album': (await assert_exists(db, Album, album_id)).to_dict()
     }
 
 
@@ -795,21 +818,20 @@ async def albums_update(
     album_id: int,
     token: Annotated[str, Query(title='Токен сессии')],
     body: AlbumForm,
-    db: Session = Depends(context.get_db)
+    db: AsyncSession = Depends(context.get_db)
 ):
-    me = assert_is_admin(db, token)
+    me = assert_is_admin(token)
 
-    album = assert_exists(db, Album, album_id)
+    album = await assert_exists(db, Album, album_id)
 
     try:
         album.name = body.name
         album.artist_id = body.artist_id
         album.asset_id = body.asset_id
 
-        db.commit()
-        db.refresh(album)
+        await commit(db, token)
     except Exception:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(400)
 
     log_action(me.user_id, 'album_update', {
@@ -825,6 +847,7 @@ async def albums_update(
                name='Удаление',
                description="""
 Удаление альбома.
+Альбом сразу скрывается, а его песни удаляются в фоне.
 
 ---
 
@@ -850,19 +873,21 @@ async def albums_update(
 async def albums_delete(
     album_id: int,
     token: Annotated[str, Query(title='Токен сессии')],
-    db: Session = Depends(context.get_db)
+    db: AsyncSession = Depends(context.get_db)
 ):
-    me = assert_is_admin(db, token)
+    me = assert_is_admin(token)
 
-    album = assert_exists(db, Album, album_id)
+    album = await assert_exists(db, Album, album_id)
 
     try:
-        db.delete(album)
-        db.commit()
+        await purge.mark_album(db, album_id)
+        await commit(db, token)
     except Exception:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(400)
 
+    purge.start()
+
     log_action(me.user_id, 'album_delete', {
         'album': str(album.to_dict())
     })
@@ -883,6 +908,8 @@ async def albums_delete(
 - album_id - ID альбома
 - token - токен сессии
 - page - номер страницы
+- limit - записей на странице, от 1 до 100 (по умолчанию 10)
+- after - курсор из поля next предыдущего ответа, заменяет page и не замедляется на дальних страницах
 
 ---
 
@@ -892,6 +919,7 @@ async def albums_delete(
   "total": <всего_записей>,
   "page": <текущая_страница>,
   "per_page": <записей_на_страницу>,
+  "next": "<курсор_следующей_страницы>" или null,
   "items": [
     <записи>
   ]
@@ -903,25 +931,25 @@ async def albums_delete(
 async def albums_songs(
     album_id: int,
     token: Annotated[str, Query(title='Токен сессии')],
-    page: Annotated[int, Query(title='Номер страницы', min=1)] = 1,
-    db: Session = Depends(context.get_db)
+    page: Annotated[int, Query(title='Номер страницы', ge=1)] = 1,
+    limit: Annotated[int, Query(title='Записей на странице', ge=1, le=const.MAX_ELEMENTS_PER_PAGE)] = const.ELEMENTS_PER_PAGE,
+    after: Annotated[str | None, Query(title='Курсор следующей страницы')] = None,
+    db: AsyncSession = Depends(context.get_db)
 ):
-    assert_is_admin(db, token)
+    assert_is_admin(token)
 
     try:
-        total = db.scalar(select(func.count()).select_from(Song).where(Song.album_id == album_id))
-        songs = db.scalars(
-            select(Song).where(Song.album_id == album_id).offset(const.ELEMENTS_PER_PAGE * (page - 1)).limit(
-                const.ELEMENTS_PER_PAGE).order_by(
-                Song.song_id))
+        total = await queries.scalar(db, queries.SONGS_COUNT, album_id=album_id) or 0
+        songs, cursor = await queries.ALBUM_SONGS.page(db, page, limit, after, album_id=album_id)
     except Exception:
         raise HTTPException(400)
 
     return {
         'total': total,
         'page': page,
-        'per_page': const.ELEMENTS_PER_PAGE,
-        'items': [x.to_dict() for x in songs]
+        'per_page': limit,
+        'next': cursor,
+        'items': songs
     }
 
 
@@ -967,18 +995,17 @@ SONGS
 async def songs_create(
     token: Annotated[str, Query(title='Токен сессии')],
     body: SongForm,
-    db: Session = Depends(context.get_db)
+    db: AsyncSession = Depends(context.get_db)
 ):
-    me = assert_is_admin(db, token)
+    me = assert_is_admin(token)
 
     try:
         song = Song(name=body.name, album_id=body.album_id, asset_id=body.asset_id)
 
         db.add(song)
-        db.commit()
-        db.refresh(song)
+        await commit(db, token)
     except Exception:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(400)
 
     log_action(me.user_id, 'song_create', {
@@ -1019,12 +1046,12 @@ async def songs_create(
 async def songs_read(
     song_id: int,
     token: Annotated[str, Query(title='Токен сессии')],
-    db: Session = Depends(context.get_db)
+    db: AsyncSession = Depends(context.get_db)
 ):
-    assert_is_admin(db, token)
+    assert_is_admin(token)
 
     return {
-        'song': assert_exists(db, Song, song_id).to_dict()
+        'song': (await assert_exists(db, Song, song_id)).to_dict()
     }
 
 
@@ -1067,21 +1094,20 @@ async def songs_update(
     song_id: int,
     token: Annotated[str, Query(title='Токен сессии')],
     body: SongForm,
-    db: Session = Depends(context.get_db)
+    db: AsyncSession = Depends(context.get_db)
 ):
-    me = assert_is_admin(db, token)
+    me = assert_is_admin(token)
 
-    song = assert_exists(db, Song, song_id)
+    song = await assert_exists(db, Song, song_id)
 
     try:
         song.name = body.name
         song.album_id = body.album_id
         song.asset_id = body.asset_id
 
-        db.commit()
-        db.refresh(song)
+        await commit(db, token)
     except Exception:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(400)
 
     log_action(me.user_id, 'song_update', {
@@ -1122,17 +1148,17 @@ async def songs_update(
 async def songs_delete(
     song_id: int,
     token: Annotated[str, Query(title='Токен сессии')],
-    db: Session = Depends(context.get_db)
+    db: AsyncSession = Depends(context.get_db)
 ):
-    me = assert_is_admin(db, token)
+    me = assert_is_admin(token)
 
-    song = assert_exists(db, Song, song_id)
+    song = await assert_exists(db, Song, song_id)
 
     try:
-        db.delete(song)
-        db.commit()
+        await db.delete(song)
+        await commit(db, token)
     except Exception:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(400)
 
     log_action(me.user_id, 'song_delete', {
@@ -1180,9 +1206,9 @@ async def upload(
     token: Annotated[str, Query(title='Токен сессии')],
     ensure_type: Annotated[str, Query(title='Тип файла для проверки')],
     file: Annotated[UploadFile, File(title='Файл')],
-    db: Session = Depends(context.get_db)
+    db: AsyncSession = Depends(context.get_db)
 ):
-    assert_is_admin(db, token)
+    assert_is_admin(token)
 
     # Check size and content type
     if file.size > const.MAX_FILE_SIZE or file.content_type != ensure_type:
@@ -1195,10 +1221,9 @@ async def upload(
 
     try:
         db.add(asset)
-        db.commit()
-        db.refresh(asset)
+        await commit(db, token)
     except Exception:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(500)
 
     try:
@@ -1212,12 +1237,227 @@ async def upload(
     asset.is_uploaded = True
 
     try:
-        db.commit()
-        db.refresh(asset)
+        await commit(db, token)
     except Exception:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(500)
 
     return {
         'asset': asset.to_dict()
     }
+
+
+"""
+IMPORT
+"""
+
+
+@router.post('/import',
+             name='Импорт',
+             description="""
+Массовый импорт каталога.
+
+---
+
+Параметры запроса:
+- token - токен сессии
+
+Тело запроса - NDJSON, по одной записи исполнителя, альбома или композиции на строку:
+```
+{"type": "artist", "ref": "<ссылка>", "name": "<имя>", "biography": "<биография>", "asset_id": <id_вложения_обложки>}
+{"type": "album", "ref": "<ссылка>", "name": "<название>", "artist_ref": "<ссылка_исполнителя>", "asset_id": <id_вложения_обложки>}
+{"type": "song", "name": "<название>", "album_id": <id_альбома>, "asset_id": <id_вложения_аудио>}
+```
+
+Родитель указывается через ID (artist_id, album_id) или через ссылку (artist_ref, album_ref) на запись,
+импортированную выше. Ссылка (ref) необязательна.
+
+Записи обрабатываются пачками, каждая пачка фиксируется отдельно.
+Ошибочная запись пропускается и попадает в список ошибок с номером строки, остальные импортируются.
+
+---
+
+Успешный ответ:
+```
+{
+  "created": {
+    "artist": <создано_исполнителей>,
+    "album": <создано_альбомов>,
+    "song": <создано_композиций>
+  },
+  "failed": <число_ошибочных_записей>,
+  "errors": [
+    {
+      "line": <номер_строки>,
+      "error": "<описание_ошибки>"
+    },
+    ...
+  ],
+  "refs": {
+    "<ссылка>": <id_созданной_записи>,
+    ...
+  }
+}
+```
+
+            """)
+async def catalog_import(
+    token: Annotated[str, Query(title='Токен сессии')],
+    request: Request,
+    db: AsyncSession = Depends(context.get_db)
+):
+    me = assert_is_admin(token)
+
+    report = await importer.run(db, request.stream())
+
+    # The admin reads the catalog through replicas, which may not have the import yet
+    sessions.pin(token)
+
+    log_action(me.user_id, 'catalog_import', {
+        'created': str(report.created),
+        'failed': report.failed
+    })
+
+    return report.to_dict()
+
+
+"""
+EXPORT
+"""
+
+
+@router.get('/export/{kind}',
+            name='Экспорт',
+            description="""
+Выгрузка каталога в NDJSON, по одной записи на строку в порядке возрастания ID.
+
+---
+
+Параметры запроса:
+- kind - что выгружать: artists, albums, songs или assets
+- token - токен сессии
+- after - ID, после которого начинать выгрузку (по умолчанию с начала)
+- compress - сжать выгрузку gzip (по умолчанию false)
+
+Прерванную выгрузку можно продолжить, передав в after ID последней полученной записи.
+
+---
+
+Успешный ответ - поток записей в том же виде, что и объекты списков:
+```
+{"artist_id": <id_исполнителя>, "name": "<имя>", "biography": "<биография>", "asset_id": <id_вложения_обложки>}
+...
+```
+
+            """)
+async def catalog_export(
+    kind: Literal['artists', 'albums', 'songs', 'assets'],
+    token: Annotated[str, Query(title='Токен сессии')],
+    after: Annotated[int, Query(title='ID, после которого начинать выгрузку', ge=0)] = 0,
+    compress: Annotated[bool, Query(title='Сжать выгрузку gzip')] = False
+):
+    me = assert_is_admin(token)
+
+    log_action(me.user_id, 'catalog_export', {
+        'kind': kind,
+        'after': after
+    })
+
+    # A long read of the whole table goes to a replica when there is one
+    content = exporter.ndjson(context.ctx.read_sm, kind, after, compress)
+
+    if compress:
+        return StreamingResponse(content, media_type='application/gzip',
+                                 headers={'Content-Disposition': f'attachment; filename="{kind}.ndjson.gz"'})
+
+    return StreamingResponse(content, media_type='application/x-ndjson')
+
+
+"""
+SESSIONS
+"""
+
+
+@router.get('/sessions',
+            name='Сессии',
+            description="""
+Статистика сессий: количество пользователей с активными сессиями, количество сессий,
+размер списка отзыва и приблизительный объем занимаемой памяти Redis в байтах.
+Объем памяти оценивается по выборке.
+
+---
+
+Параметры запроса:
+- token - токен сессии
+
+---
+
+Успешный ответ:
+```
+{
+  "users": <пользователей_с_сессиями>,
+  "sessions": <всего_сессий>,
+  "revoked": <записей_в_списке_отзыва>,
+  "memory": {
+    "sessions": <байт_на_сессии>,
+    "indexes": <байт_на_индексы_пользователей>,
+    "total": <всего_байт>
+  }
+}
+```
+
+            """)
+async def sessions_stats(
+    token: Annotated[str, Query(title='Токен сессии')]
+):
+    assert_is_admin(token)
+
+    return sessions.stats()
+
+
+"""
+METRICS
+"""
+
+
+@router.get('/metrics',
+            name='Метрики',
+            description="""
+Метрики текущего процесса сервера (каждый воркер отдает свои).
+
+---
+
+Параметры запроса:
+- token - токен сессии
+
+---
+
+Успешный ответ:
+```
+{
+  "counters": {
+    "<имя>": <значение>
+  },
+  "gauges": {
+    "<имя>": <значение>
+  },
+  "histograms": {
+    "<имя>": {
+      "count": <количество_наблюдений>,
+      "sum": <сумма>,
+      "max": <максимум>,
+      "buckets": {
+        "<верхняя_граница>": <количество>
+      }
+    }
+  }
+}
+```
+
+            """)
+async def metrics_read(
+    token: Annotated[str, Query(title='Токен сессии')]
+):
+    assert_is_admin(token)
+
+    return metrics.snapshot()
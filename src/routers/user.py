@@ -1,22 +1,21 @@
 from typing import Annotated
 
 from fastapi import APIRouter, HTTPException, Query, Header, Depends
-from fastapi.responses import StreamingResponse
-from sqlalchemy import func
-from sqlalchemy import select, desc
-from sqlalchemy.orm import Session
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
+import src.config as config
 import src.const as const
 import src.context as context
+import src.deadlines as deadlines
+import src.entities as entities
+import src.feed as feed
+import src.queries as queries
+import src.sessions as sessions
+import src.shuffle as shuffle
 from src.logger import log_user_action as log_action
-from src.models import (
-    Asset,
-    User,
-    Album,
-    Artist,
-    Song
-)
-from src.routers.__base__ import assert_exists
+from src.routers.__base__ import assert_found
+from src.sessions import Claims
 
 """
 ROUTER
@@ -29,21 +28,27 @@ HELPERS
 """
 
 
-def assert_is_user(db: Session, token: str) -> User:
-    redis = context.ctx.rs
-
-    user_id = redis.get(token)
-    if user_id is None:
+def assert_is_user(token: str) -> Claims:
+    claims = sessions.read(token)
+    if claims is None:
         raise HTTPException(401)
 
-    user = db.get(User, int(user_id))
-    if user is None:
-        raise HTTPException(401)
+    return claims
 
-    redis.set(token, user.user_id)
-    redis.expire(token, const.SESSION_TTL)
 
-    return user
+def read_sm(token: str):
+    """
+    Replica for the catalog reads, or the primary for a session that has just written
+    """
+    return context.ctx.sm if sessions.is_pinned(token) else context.ctx.read_sm
+
+
+async def get_read_db(token: Annotated[str, Query(title='Токен сессии')]):
+    db = read_sm(token)()
+    try:
+        yield db
+    finally:
+        await db.close()
 
 
 """
@@ -80,7 +85,9 @@ ENDPOINTS
       "album_id": <id_альбома>,
       "name": "<имя>",
       "artist_id": <id_исполнителя>,
-      "asset_id": <id_вложения_обложки>
+      "asset_id": <id_вложения_обложки>,
+      "artist_name": "<имя_исполнителя>",
+      "songs_count": <число_песен>
     }
   ],
   "songs": [
@@ -96,20 +103,12 @@ ENDPOINTS
 
             """)
 async def index(
-    token: Annotated[str, Query(title='Токен сессии')],
-    db: Session = Depends(context.get_db)
+    token: Annotated[str, Query(title='Токен сессии')]
 ):
-    assert_is_user(db, token)
+    assert_is_user(token)
 
-    artists = db.scalars(select(Artist).order_by(desc(Artist.artist_id)).limit(const.INDEX_ARTISTS_COUNT))
-    albums = db.scalars(select(Album).order_by(desc(Album.album_id)).limit(const.INDEX_ALBUMS_COUNT))
-    songs = db.scalars(select(Song).order_by(desc(Song.song_id)).limit(const.INDEX_SONGS_COUNT))
-
-    return {
-        'artists': [x.to_dict() for x in artists],
-        'albums': [x.to_dict() for x in albums],
-        'songs': [x.to_dict() for x in songs]
-    }
+    # Served as cached, the feed is serialized once per change of the catalog
+    return Response(content=await feed.read(), media_type='application/json')
 
 
 @router.get('/me',
@@ -137,10 +136,9 @@ async def index(
 
             """)
 async def get_me(
-    token: Annotated[str, Query(title='Токен сессии')],
-    db: Session = Depends(context.get_db)
+    token: Annotated[str, Query(title='Токен сессии')]
 ):
-    me = assert_is_user(db, token)
+    me = assert_is_user(token)
     return {
         'user': me.to_dict()
     }
@@ -174,13 +172,12 @@ async def get_me(
             """)
 async def artist(
     artist_id: int,
-    token: Annotated[str, Query(title='Токен сессии')],
-    db: Session = Depends(context.get_db)
+    token: Annotated[str, Query(title='Токен сессии')]
 ):
-    assert_is_user(db, token)
+    assert_is_user(token)
 
     return {
-        'artist': assert_exists(db, Artist, artist_id).to_dict(),
+        'artist': assert_found(await entities.get(read_sm(token), 'artist', artist_id)),
     }
 
 
@@ -195,6 +192,8 @@ async def artist(
 - artist_id - ID исполнителя
 - token - токен сессии
 - page - номер страницы
+- limit - записей на странице, от 1 до 100 (по умолчанию 10)
+- after - курсор из поля next предыдущего ответа, заменяет page и не замедляется на дальних страницах
 
 ---
 
@@ -204,6 +203,7 @@ async def artist(
   "total": <всего_записей>,
   "page": <текущая_страница>,
   "per_page": <записей_на_страницу>,
+  "next": "<курсор_следующей_страницы>" или null,
   "items": [
     <записи>
   ]
@@ -214,23 +214,25 @@ async def artist(
 async def artist_albums(
     artist_id: int,
     token: Annotated[str, Query(title='Токен сессии')],
-    page: Annotated[int, Query(title='Номер страницы', min=1)] = 1,
-    db: Session = Depends(context.get_db)
+    page: Annotated[int, Query(title='Номер страницы', ge=1)] = 1,
+    limit: Annotated[int, Query(title='Записей на странице', ge=1, le=const.MAX_ELEMENTS_PER_PAGE)] = const.ELEMENTS_PER_PAGE,
+    after: Annotated[str | None, Query(title='Курсор следующей страницы')] = None,
+    db: AsyncSession = Depends(get_read_db)
 ):
-    assert_is_user(db, token)
+    assert_is_user(token)
 
     try:
-        total = db.scalar(select(func.count()).select_from(Album).where(Album.artist_id == artist_id))
-        albums = db.scalars(select(Album).where(Album.artist_id == artist_id).order_by(desc(Album.album_id)).offset(
-            const.ELEMENTS_PER_PAGE * (page - 1)).limit(const.ELEMENTS_PER_PAGE))
+        total = await queries.scalar(db, queries.ALBUMS_COUNT, artist_id=artist_id) or 0
+        albums, cursor = await queries.ARTIST_ALBUMS_NEWEST.page(db, page, limit, after, artist_id=artist_id)
     except Exception:
         raise HTTPException(400)
 
     return {
         'total': total,
         'page': page,
-        'per_page': const.ELEMENTS_PER_PAGE,
-        'items': [x.to_dict() for x in albums]
+        'per_page': limit,
+        'next': cursor,
+        'items': albums
     }
 
 
@@ -254,7 +256,9 @@ async def artist_albums(
     "album_id": <id_альбома>,
     "name": "<название>",
     "artist_id": <id_исполнителя>,
-    "asset_id": <id_вложения_обложки>
+    "asset_id": <id_вложения_обложки>,
+    "artist_name": "<имя_исполнителя>",
+    "songs_count": <число_песен>
   }
 }
 ```
@@ -262,13 +266,12 @@ async def artist_albums(
             """)
 async def album(
     album_id: int,
-    token: Annotated[str, Query(title='Токен сессии')],
-    db: Session = Depends(context.get_db)
+    token: Annotated[str, Query(title='Токен сессии')]
 ):
-    assert_is_user(db, token)
+    assert_is_user(token)
 
     return {
-        'album': assert_exists(db, Album, album_id).to_dict(),
+        'album': assert_found(await entities.get(read_sm(token), 'album', album_id)),
     }
 
 
@@ -283,6 +286,8 @@ async def album(
 - album_id - ID альбома
 - token - токен сессии
 - page - номер страницы
+- limit - записей на странице, от 1 до 100 (по умолчанию 10)
+- after - курсор из поля next предыдущего ответа, заменяет page и не замедляется на дальних страницах
 
 ---
 
@@ -292,6 +297,7 @@ async def album(
   "total": <всего_записей>,
   "page": <текущая_страница>,
   "per_page": <записей_на_страницу>,
+  "next": "<курсор_следующей_страницы>" или null,
   "items": [
     <записи>
   ]
@@ -302,23 +308,25 @@ async def album(
 async def album_songs(
     album_id: int,
     token: Annotated[str, Query(title='Токен сессии')],
-    page: Annotated[int, Query(title='Номер страницы', min=1)] = 1,
-    db: Session = Depends(context.get_db)
+    page: Annotated[int, Query(title='Номер страницы', ge=1)] = 1,
+    limit: Annotated[int, Query(title='Записей на странице', ge=1, le=const.MAX_ELEMENTS_PER_PAGE)] = const.ELEMENTS_PER_PAGE,
+    after: Annotated[str | None, Query(title='Курсор следующей страницы')] = None,
+    db: AsyncSession = Depends(get_read_db)
 ):
-    assert_is_user(db, token)
+    assert_is_user(token)
 
     try:
-        total = db.scalar(select(func.count()).select_from(Song).where(Song.album_id == album_id))
-        songs = db.scalars(select(Song).where(Song.album_id == album_id).order_by(Song.song_id).offset(
-            const.ELEMENTS_PER_PAGE * (page - 1)).limit(const.ELEMENTS_PER_PAGE))
+        total = await queries.scalar(db, queries.SONGS_COUNT, album_id=album_id) or 0
+        songs, cursor = await queries.ALBUM_SONGS.page(db, page, limit, after, album_id=album_id)
     except Exception:
         raise HTTPException(400)
 
     return {
         'total': total,
         'page': page,
-        'per_page': const.ELEMENTS_PER_PAGE,
-        'items': [x.to_dict() for x in songs]
+        'per_page': limit,
+        'next': cursor,
+        'items': songs
     }
 
 
@@ -350,13 +358,12 @@ async def album_songs(
 """)
 async def song(
     song_id: int,
-    token: Annotated[str, Query(title='Токен сессии')],
-    db: Session = Depends(context.get_db)
+    token: Annotated[str, Query(title='Токен сессии')]
 ):
-    assert_is_user(db, token)
+    assert_is_user(token)
 
     return {
-        'song': assert_exists(db, Song, song_id).to_dict(),
+        'song': assert_found(await entities.get(read_sm(token), 'song', song_id)),
     }
 
 
@@ -379,20 +386,19 @@ async def song(
 async def asset(
     asset_id: int,
     token: Annotated[str, Query(title='Токен сессии')],
-    _range: str | None = Header(None, alias='range'),
-    db: Session = Depends(context.get_db)
+    _range: str | None = Header(None, alias='range')
 ):
-    assert_is_user(db, token)
+    assert_is_user(token)
 
-    _asset = db.get(Asset, asset_id)
-    if _asset is None or not _asset.is_uploaded:
+    _asset = await entities.get(read_sm(token), 'asset', asset_id)
+    if _asset is None or not _asset['is_uploaded']:
         raise HTTPException(404)
 
     s3 = context.ctx.s3
 
     file_size = s3.head_object(
         Bucket=const.BUCKET_NAME,
-        Key=str(_asset.asset_id)
+        Key=str(asset_id)
     )['ContentLength']
 
     resp_code = 200
@@ -425,7 +431,7 @@ async def asset(
 
     obj = s3.get_object(
         Bucket=const.BUCKET_NAME,
-        Key=str(_asset.asset_id),
+        Key=str(asset_id),
         Range=f'bytes={start}-{end}'
     )
 
@@ -437,6 +443,59 @@ async def asset(
     )
 
 
+@router.get('/songs/random',
+            name='Случайные песни',
+            description="""
+Случайные песни для перемешивания и радио, из всего каталога, альбома или исполнителя.
+Песни, недавно выданные этой сессии, не повторяются, пока есть другие.
+
+---
+
+Параметры запроса:
+- token - токен сессии
+- limit - число песен, от 1 до 100 (по умолчанию 10)
+- artist_id - ID исполнителя, из песен которого выбирать (необязательно)
+- album_id - ID альбома, из песен которого выбирать (необязательно)
+
+Одновременно можно указать только artist_id или album_id.
+
+---
+
+Успешный ответ:
+```
+{
+  "songs": [
+    {
+      "song_id": <id_песни>,
+      "name": "<имя>",
+      "album_id": <id_альбома>,
+      "asset_id": <id_вложения_аудио>
+    }
+  ]
+}
+```
+
+            """)
+async def random_songs(
+    token: Annotated[str, Query(title='Токен сессии')],
+    limit: Annotated[int, Query(title='Число песен', ge=1, le=const.MAX_ELEMENTS_PER_PAGE)] = const.ELEMENTS_PER_PAGE,
+    artist_id: Annotated[int | None, Query(title='ID исполнителя')] = None,
+    album_id: Annotated[int | None, Query(title='ID альбома')] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    assert_is_user(token)
+
+    if artist_id is not None and album_id is not None:
+        raise HTTPException(400)
+
+    songs = await shuffle.sample(db, limit, shuffle.recent(token), artist_id=artist_id, album_id=album_id)
+    shuffle.remember(token, [x['song_id'] for x in songs])
+
+    return {
+        'songs': songs
+    }
+
+
 @router.get('/search',
             name='Поиск',
             description="""
@@ -491,19 +550,21 @@ async def asset(
             """)
 async def search(
     token: Annotated[str, Query(title='Токен сессии')],
-    q: Annotated[str, Query(title='Запрос')],
-    db: Session = Depends(context.get_db)
+    q: Annotated[str, Query(title='Запрос')]
 ):
-    assert_is_user(db, token)
+    assert_is_user(token)
 
-    es = context.ctx.es
+    # The client blocks the event loop, so the deadline must bound every call it makes
+    es = context.ctx.es.options(request_timeout=deadlines.remaining(config.elasticsearch_timeout()))
     results = []
 
     if es.indices.exists(index=const.ELASTICSEARCH_INDEX):
-        response = context.ctx.es.search(
+        response = es.search(
             index=const.ELASTICSEARCH_INDEX,
             body={
                 'size': const.ELASTICSEARCH_SEARCH_LIMIT,
+                # Shards answer with what they have found by then instead of running past the deadline
+                'timeout': f'{int(deadlines.remaining(config.elasticsearch_timeout()) * 1000)}ms',
                 'query': {
                     'wildcard': {
                         'keyword': '*' + q + '*',
@@ -537,11 +598,10 @@ async def search(
 
                """)
 async def logout(
-    token: Annotated[str, Query(title='Токен сессии')],
-    db: Session = Depends(context.get_db)
+    token: Annotated[str, Query(title='Токен сессии')]
 ):
-    me = assert_is_user(db, token)
+    me = assert_is_user(token)
 
-    context.ctx.rs.delete(token)
+    sessions.delete(token, me)
 
     log_action(me.user_id, 'logout')
@@ -0,0 +1,614 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException
+
+import src.config as config
+import src.const as const
+import src.context as context
+import src.metrics as metrics
+import src.util as util
+
+_logger = logging.getLogger(__name__)
+
+"""
+CLAIMS
+"""
+
+
+class Claims:
+    """
+    Everything routers need to know about the session owner, stored inside the session record
+    """
+    __slots__ = ('user_id', 'username', 'is_admin', 'version')
+
+    def __init__(self, user_id: int, username: str, is_admin: bool, version: int = 0):
+        self.user_id = user_id
+        self.username = username
+        self.is_admin = is_admin
+        self.version = version
+
+    @classmethod
+    def of(cls, user, version: int = 0) -> 'Claims':
+        return cls(user.user_id, user.username, user.is_admin, version)
+
+    @classmethod
+    def loads(cls, raw) -> 'Claims':
+        data = json.loads(raw)
+        return cls(data['user_id'], data['username'], data['is_admin'], data['version'])
+
+    def dumps(self) -> str:
+        return json.dumps({
+            'user_id': self.user_id,
+            'username': self.username,
+            'is_admin': self.is_admin,
+            'version': self.version
+        })
+
+    def to_dict(self) -> dict:
+        return {
+            'user_id': self.user_id,
+            'username': self.username,
+            'is_admin': self.is_admin
+        }
+
+
+"""
+KEYS
+"""
+
+
+# Every session key lives under one prefix, so sessions can be told apart from the rest of the keyspace
+_PREFIX = 'session:'
+_SESSION_PREFIX = _PREFIX + 'token:'
+_INDEX_PREFIX = _PREFIX + 'user:'
+_VERSION_PREFIX = _PREFIX + 'version:'
+_REVOKED_KEY = _PREFIX + 'revoked'
+_PIN_PREFIX = _PREFIX + 'pin:'
+
+
+def _session_key(token: str) -> str:
+    return _SESSION_PREFIX + token
+
+
+def _index_key(user_id) -> str:
+    return f'{_INDEX_PREFIX}{user_id}'
+
+
+def _version_key(user_id: int) -> str:
+    return f'{_VERSION_PREFIX}{user_id}'
+
+
+def _pin_key(token: str) -> str:
+    return _PIN_PREFIX + token
+
+
+def _decode(values) -> list[str]:
+    return [x.decode('utf-8') if isinstance(x, bytes) else x for x in values]
+
+
+"""
+CACHE
+"""
+
+
+class _Cache:
+    """
+    Bounded LRU of validated sessions kept for a few seconds in front of Redis
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[float, Claims]] = OrderedDict()
+        self._generation = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, token: str) -> Claims | None:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return entry[1]
+
+    def put(self, token: str, claims: Claims, generation: int):
+        size = config.session_cache_size()
+        if size <= 0:
+            return
+
+        with self._lock:
+            # An invalidation arrived while the record was being read from Redis, it may be stale
+            if generation != self._generation:
+                return
+            self._entries[token] = (time.monotonic() + config.session_cache_ttl(), claims)
+            self._entries.move_to_end(token)
+            while len(self._entries) > size:
+                self._entries.popitem(last=False)
+
+    def drop(self, tokens):
+        with self._lock:
+            self._generation += 1
+            for token in tokens:
+                self._entries.pop(token, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+_cache = _Cache()
+
+
+def _hit_rate() -> float:
+    hits = metrics.counter('session_cache_hits')
+    total = hits + metrics.counter('session_cache_misses')
+    return hits / total if total else 0.0
+
+
+metrics.gauge('session_cache_size', lambda: len(_cache))
+metrics.gauge('session_cache_hit_rate', _hit_rate)
+
+
+def _invalidate(tokens, pipe=None):
+    """
+    Drops sessions from the local cache and tells other workers to do the same,
+    the message is queued on the pipeline when one is given
+    """
+    tokens = _decode(tokens)
+    if not tokens:
+        return
+
+    _cache.drop(tokens)
+    (pipe or context.ctx.rs).publish(const.SESSION_INVALIDATION_CHANNEL, json.dumps({
+        'tokens': tokens,
+        'sent_at': time.time()
+    }))
+
+
+def _on_invalidation(message):
+    data = json.loads(message['data'])
+    _cache.drop(data['tokens'])
+
+    metrics.inc('session_cache_invalidations')
+    metrics.observe('session_cache_invalidation_lag_ms', (time.time() - data['sent_at']) * 1000)
+
+
+def _on_listener_error(e, pubsub, thread):
+    # Invalidations published while disconnected are lost, so nothing cached so far can be trusted
+    _logger.warning('Session invalidation listener failed: %s', e)
+    _cache.clear()
+    time.sleep(1)
+
+
+def start_listener():
+    """
+    Subscribes the worker to session invalidations, returns the thread to stop on shutdown
+    """
+    pubsub = context.ctx.rs.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(**{const.SESSION_INVALIDATION_CHANNEL: _on_invalidation})
+    return pubsub.run_in_thread(sleep_time=1, daemon=True, exception_handler=_on_listener_error)
+
+
+"""
+SCRIPTS
+"""
+
+# KEYS: session, user version, user index; ARGV: claims, ttl, token, session prefix, sessions per user limit
+# Stamps the current user version into the claims and stores the session only if the token is free.
+# Forgets expired tokens of the user and evicts the ones closest to expiry over the limit,
+# returns the evicted tokens or nil when the token is taken
+_CREATE = """
+local claims = cjson.decode(ARGV[1])
+claims['version'] = tonumber(redis.call('GET', KEYS[2]) or '0')
+if not redis.call('SET', KEYS[1], cjson.encode(claims), 'NX', 'EX', ARGV[2]) then
+    return false
+end
+local live = {}
+for _, token in ipairs(redis.call('SMEMBERS', KEYS[3])) do
+    local ttl = redis.call('TTL', ARGV[4] .. token)
+    if ttl < 0 then
+        redis.call('SREM', KEYS[3], token)
+    else
+        table.insert(live, {token, ttl})
+    end
+end
+local evicted = {}
+local limit = tonumber(ARGV[5])
+if limit > 0 and #live >= limit then
+    table.sort(live, function(a, b) return a[2] < b[2] end)
+    for i = 1, #live - limit + 1 do
+        redis.call('DEL', ARGV[4] .. live[i][1])
+        redis.call('SREM', KEYS[3], live[i][1])
+        table.insert(evicted, live[i][1])
+    end
+end
+redis.call('SADD', KEYS[3], ARGV[3])
+redis.call('EXPIRE', KEYS[3], ARGV[2])
+return evicted
+"""
+
+# KEYS: session; ARGV: threshold, ttl, index prefix
+# Returns the session record, prolonging it only once its remaining lifetime drops below the threshold.
+# The user index is prolonged along, so it always outlives the sessions it lists
+_READ = """
+local record = redis.call('GET', KEYS[1])
+if record and redis.call('TTL', KEYS[1]) < tonumber(ARGV[1]) then
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+    local ok, claims = pcall(cjson.decode, record)
+    if ok and type(claims) == 'table' and claims['user_id'] then
+        redis.call('EXPIRE', ARGV[3] .. claims['user_id'], ARGV[2])
+    end
+end
+return record
+"""
+
+# KEYS: user version, user index; ARGV: claims, session prefix
+# Bumps the user version and replaces claims in every live session of the user without prolonging it,
+# returns the new version and the tokens of the user
+_REWRITE = """
+local version = redis.call('INCR', KEYS[1])
+local claims = cjson.decode(ARGV[1])
+claims['version'] = version
+local record = cjson.encode(claims)
+local tokens = redis.call('SMEMBERS', KEYS[2])
+for _, token in ipairs(tokens) do
+    if not redis.call('SET', ARGV[2] .. token, record, 'XX', 'KEEPTTL') then
+        redis.call('SREM', KEYS[2], token)
+    end
+end
+return {version, tokens}
+"""
+
+# KEYS: user version, user index; ARGV: session prefix
+# Bumps the user version and drops every session of the user, returns the new version and the dropped tokens
+_REVOKE = """
+local version = redis.call('INCR', KEYS[1])
+local tokens = redis.call('SMEMBERS', KEYS[2])
+for _, token in ipairs(tokens) do
+    redis.call('DEL', ARGV[1] .. token)
+end
+redis.call('DEL', KEYS[2])
+return {version, tokens}
+"""
+
+"""
+SIGNED TOKENS
+"""
+
+
+def _is_signed() -> bool:
+    return config.session_mode() == 'signed'
+
+
+def _secret() -> str:
+    secret = config.session_secret()
+    if not secret:
+        raise RuntimeError('SESSION_SECRET must be set for signed sessions')
+    return secret
+
+
+class _Revocations:
+    """
+    Local copy of the revocation list, members are 't:<token_id>' for a single token
+    and 'u:<user_id>:<version>' for every token of the user issued before the version
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tokens: set[str] = set()
+        self._versions: dict[int, int] = {}
+        self._local: list[tuple[float, str]] = []
+
+    def __len__(self) -> int:
+        return len(self._tokens) + len(self._versions)
+
+    def is_revoked(self, token_id: str, user_id: int, version: int) -> bool:
+        return token_id in self._tokens or version < self._versions.get(user_id, 0)
+
+    def add(self, member: str):
+        with self._lock:
+            self._local.append((time.time(), member))
+            self._apply(self._tokens, self._versions, member)
+
+    def replace(self, members, started_at: float):
+        tokens, versions = set(), {}
+        for member in members:
+            self._apply(tokens, versions, member.decode('utf-8') if isinstance(member, bytes) else member)
+
+        with self._lock:
+            # Local revocations made while the sync was in flight may be missing from its result
+            self._local = [x for x in self._local if x[0] >= started_at]
+            for _, member in self._local:
+                self._apply(tokens, versions, member)
+            self._tokens, self._versions = tokens, versions
+
+    @staticmethod
+    def _apply(tokens: set, versions: dict, member: str):
+        kind, _, rest = member.partition(':')
+        if kind == 't':
+            tokens.add(rest)
+        elif kind == 'u':
+            user_id, version = map(int, rest.split(':'))
+            versions[user_id] = max(versions.get(user_id, 0), version)
+
+
+_revocations = _Revocations()
+
+metrics.gauge('session_revocation_list_size', lambda: len(_revocations))
+
+
+def _revoke(member: str, expires_at: float):
+    """
+    Records a revocation, it only has to outlive the tokens it applies to
+    """
+    context.ctx.rs.zadd(_REVOKED_KEY, {member: expires_at})
+    _revocations.add(member)
+
+
+def _sync_revocations():
+    started_at = time.time()
+
+    pipe = context.ctx.rs.pipeline(transaction=False)
+    pipe.zremrangebyscore(_REVOKED_KEY, '-inf', started_at)
+    pipe.zrange(_REVOKED_KEY, 0, -1)
+    _, members = pipe.execute()
+
+    _revocations.replace(members, started_at)
+    metrics.inc('session_revocation_syncs')
+
+
+class _Periodic(threading.Thread):
+    def __init__(self, fn, interval: float):
+        super().__init__(daemon=True)
+        self._fn = fn
+        self._interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self._interval):
+            try:
+                self._fn()
+            except Exception as e:
+                _logger.warning('Session revocation sync failed: %s', e)
+
+    def stop(self):
+        self._stopped.set()
+
+
+def start_revocation_sync():
+    """
+    Loads the revocation list and keeps it in sync, returns the thread to stop on shutdown
+    """
+    _secret()
+    _sync_revocations()
+
+    thread = _Periodic(_sync_revocations, config.session_revocation_sync())
+    thread.start()
+    return thread
+
+
+def _create_signed(user) -> str:
+    version = int(context.ctx.rs.get(_version_key(user.user_id)) or 0)
+
+    return util.sign({
+        'uid': user.user_id,
+        'usr': user.username,
+        'adm': user.is_admin,
+        'ver': version,
+        'exp': int(time.time()) + config.session_signed_ttl(),
+        'jti': util.generate_token()
+    }, _secret())
+
+
+def _read_signed(token: str) -> dict | None:
+    payload = util.unsign(token, _secret())
+    if payload is None or payload['exp'] < time.time():
+        return None
+
+    if _revocations.is_revoked(payload['jti'], payload['uid'], payload['ver']):
+        return None
+
+    return payload
+
+
+"""
+SESSIONS
+"""
+
+
+def create(user) -> str:
+    if _is_signed():
+        return _create_signed(user)
+
+    redis = context.ctx.rs
+    script = redis.register_script(_CREATE)
+    claims = Claims.of(user).dumps()
+
+    for _ in range(100):
+        token = util.generate_token()
+        evicted = script(keys=[_session_key(token), _version_key(user.user_id), _index_key(user.user_id)],
+                         args=[claims, const.SESSION_TTL, token, _SESSION_PREFIX, config.session_max_per_user()])
+        if evicted is not None:
+            _invalidate(evicted)
+            return token
+
+    raise HTTPException(500)
+
+
+def read(token: str) -> Claims | None:
+    if _is_signed():
+        payload = _read_signed(token)
+        if payload is None:
+            return None
+        return Claims(payload['uid'], payload['usr'], payload['adm'], payload['ver'])
+
+    claims = _cache.get(token)
+    if claims is not None:
+        metrics.inc('session_cache_hits')
+        return claims
+    metrics.inc('session_cache_misses')
+
+    redis = context.ctx.rs
+    generation = _cache.generation
+
+    raw = redis.register_script(_READ)(
+        keys=[_session_key(token)],
+        args=[int(const.SESSION_TTL * config.session_refresh_threshold()), const.SESSION_TTL, _INDEX_PREFIX]
+    )
+    if raw is None:
+        return None
+
+    try:
+        claims = Claims.loads(raw)
+    except (ValueError, KeyError, TypeError):
+        redis.delete(_session_key(token))
+        return None
+
+    _cache.put(token, claims, generation)
+
+    return claims
+
+
+def delete(token: str, claims: Claims):
+    if _is_signed():
+        payload = _read_signed(token)
+        if payload is not None:
+            _revoke('t:' + payload['jti'], payload['exp'])
+        return
+
+    pipe = context.ctx.rs.pipeline(transaction=False)
+    pipe.delete(_session_key(token))
+    pipe.srem(_index_key(claims.user_id), token)
+    _invalidate([token], pipe)
+    pipe.execute()
+
+
+def rewrite_user(user):
+    """
+    Replaces claims in every live session of the user, e.g. after an admin changed the user
+    """
+    redis = context.ctx.rs
+
+    if _is_signed():
+        # Signed tokens cannot be rewritten, the user has to log in again
+        version = redis.incr(_version_key(user.user_id))
+        _revoke(f'u:{user.user_id}:{version}', time.time() + config.session_signed_ttl())
+        return
+
+    _, tokens = redis.register_script(_REWRITE)(
+        keys=[_version_key(user.user_id), _index_key(user.user_id)],
+        args=[Claims.of(user).dumps(), _SESSION_PREFIX]
+    )
+
+    _invalidate(tokens)
+
+
+def revoke_user(user_id: int):
+    """
+    Drops every live session of the user
+    """
+    redis = context.ctx.rs
+
+    if _is_signed():
+        version = redis.incr(_version_key(user_id))
+        _revoke(f'u:{user_id}:{version}', time.time() + config.session_signed_ttl())
+        return
+
+    _, tokens = redis.register_script(_REVOKE)(
+        keys=[_version_key(user_id), _index_key(user_id)],
+        args=[_SESSION_PREFIX]
+    )
+
+    _invalidate(tokens)
+
+
+"""
+PINS
+"""
+
+
+def pin(token: str):
+    """
+    Makes the session read from the primary for a while, so it sees its own writes despite replica lag
+    """
+    if config.postgres_replicas():
+        context.ctx.rs.set(_pin_key(token), 1, ex=config.postgres_pin_ttl())
+
+
+def is_pinned(token: str) -> bool:
+    return bool(config.postgres_replicas()) and bool(context.ctx.rs.exists(_pin_key(token)))
+
+
+"""
+STATS
+"""
+
+
+def stats(sample: int = 100) -> dict:
+    """
+    Counts live sessions by walking the user indexes and extrapolates their memory from a sample
+    """
+    redis = context.ctx.rs
+
+    users, sessions, tokens, indexes = 0, 0, [], []
+    batch = []
+
+    def flush():
+        nonlocal users, sessions
+        # The sampled users are chosen before queuing, the results come back in the order of the commands
+        sampled = batch[:max(sample - len(indexes), 0)]
+        pipe = redis.pipeline(transaction=False)
+        for key in batch:
+            pipe.scard(key)
+        for key in sampled:
+            pipe.srandmember(key)
+        results = pipe.execute()
+        users += len(batch)
+        sessions += sum(results[:len(batch)])
+        indexes.extend(sampled)
+        tokens.extend(results[len(batch):])
+        batch.clear()
+
+    for key in redis.scan_iter(match=_index_key('*'), count=1000):
+        batch.append(key)
+        if len(batch) == 1000:
+            flush()
+    if batch:
+        flush()
+
+    pipe = redis.pipeline(transaction=False)
+    for key in indexes:
+        pipe.memory_usage(key)
+    for token in _decode(x for x in tokens if x is not None):
+        pipe.memory_usage(_session_key(token))
+    pipe.zcard(_REVOKED_KEY)
+    *usage, revoked = pipe.execute()
+
+    index_usage = [x for x in usage[:len(indexes)] if x is not None]
+    session_usage = [x for x in usage[len(indexes):] if x is not None]
+    index_memory = int(sum(index_usage) / len(index_usage) * users) if index_usage else 0
+    session_memory = int(sum(session_usage) / len(session_usage) * sessions) if session_usage else 0
+
+    return {
+        'users': users,
+        'sessions': sessions,
+        'revoked': revoked,
+        'memory': {
+            'sessions': session_memory,
+            'indexes': index_memory,
+            'total': session_memory + index_memory
+        }
+    }
@@ -0,0 +1,118 @@
+"""
+Random songs, sampled over the id space for the whole catalog and shuffled whole for an album or an artist
+"""
+import random
+
+from sqlalchemy import Integer, all_, bindparam, func, select, true
+from sqlalchemy.dialects.postgresql import ARRAY
+
+import src.const as const
+import src.context as context
+import src.queries as queries
+from src.models import Album, Song
+
+"""
+STATEMENTS
+"""
+
+MAX_SONG_ID = select(func.max(Song.song_id))
+
+_starts = func.unnest(bindparam('starts', type_=ARRAY(Integer))).table_valued('start').render_derived(name='starts')
+_following = select(*queries.SONG).join(*queries.SONG_OF_ALBUM).where(
+    Song.song_id >= _starts.c.start
+).order_by(Song.song_id).limit(1).lateral('song')
+
+# The first live song at or after each of the ids
+SONGS_AFTER = select(*_following.c).select_from(_starts).join(_following, true())
+
+_not_recent = Song.song_id != all_(bindparam('recent', type_=ARRAY(Integer)))
+
+ALBUM_SONGS = select(*queries.SONG).join(*queries.SONG_OF_ALBUM).where(
+    Song.album_id == bindparam('album_id'), _not_recent
+).order_by(func.random()).limit(bindparam('limit'))
+
+ARTIST_SONGS = select(*queries.SONG).join(*queries.SONG_OF_ALBUM).where(
+    Album.artist_id == bindparam('artist_id'), _not_recent
+).order_by(func.random()).limit(bindparam('limit'))
+
+"""
+RECENT
+"""
+
+
+def _recent_key(token: str) -> str:
+    return f'shuffle:recent:{token}'
+
+
+def recent(token: str) -> list[int]:
+    return [int(x) for x in context.ctx.rs.lrange(_recent_key(token), 0, const.SHUFFLE_RECENT_WINDOW - 1)]
+
+
+def remember(token: str, song_ids: list[int]):
+    """
+    Adds the served songs to the window of the session, which keeps the latest ones and expires with the session
+    """
+    if not song_ids:
+        return
+
+    key = _recent_key(token)
+    pipeline = context.ctx.rs.pipeline()
+    pipeline.lpush(key, *song_ids)
+    pipeline.ltrim(key, 0, const.SHUFFLE_RECENT_WINDOW - 1)
+    pipeline.expire(key, const.SESSION_TTL)
+    pipeline.execute()
+
+
+"""
+SAMPLING
+"""
+
+
+def _fill(songs: list[dict], more: list[dict], limit: int) -> list[dict]:
+    seen = {x['song_id'] for x in songs}
+    for song in more:
+        if len(songs) == limit:
+            break
+        if song['song_id'] not in seen:
+            seen.add(song['song_id'])
+            songs.append(song)
+    return songs
+
+
+async def _sample(db, limit: int, excluded: list[int]) -> list[dict]:
+    highest = await queries.scalar(db, MAX_SONG_ID)
+    if highest is None:
+        return []
+
+    recent = set(excluded)
+    songs, drawn = [], []
+    # Starts in one gap land on the same song, so draws go on until the sample is full or the attempts run out
+    for _ in range(const.SHUFFLE_ATTEMPTS):
+        starts = [random.randint(1, highest) for _ in range((limit - len(songs)) * const.SHUFFLE_OVERSAMPLING)]
+        more = [dict(x) for x in (await db.execute(SONGS_AFTER, {'starts': starts})).mappings()]
+        drawn += more
+        if len(_fill(songs, [x for x in more if x['song_id'] not in recent], limit)) == limit:
+            break
+
+    return _fill(songs, drawn, limit)
+
+
+async def _scoped(db, statement, limit: int, excluded: list[int], **params) -> list[dict]:
+    async def draw(recent):
+        return [dict(x) for x in (await db.execute(statement, {**params, 'limit': limit, 'recent': recent}))
+                .mappings()]
+
+    songs = await draw(excluded)
+    if len(songs) < limit and excluded:
+        # A scope smaller than the window repeats its songs rather than running dry
+        songs = _fill(songs, await draw([]), limit)
+    return songs
+
+
+async def sample(db, limit: int, excluded: list[int], artist_id: int | None = None,
+                 album_id: int | None = None) -> list[dict]:
+    if album_id is not None:
+        return await _scoped(db, ALBUM_SONGS, limit, excluded, album_id=album_id)
+    if artist_id is not None:
+        return await _scoped(db, ARTIST_SONGS, limit, excluded, artist_id=artist_id)
+    return await _sample(db, limit, excluded)
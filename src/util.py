@@ -1,10 +1,23 @@
+import base64
+import hashlib
+import hmac
+import json
 import secrets
 
 import bcrypt
 
+import src.config as config
 
-def hashpw(password: str) -> bytes:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+
+def hashpw(password: str, rounds: int | None = None) -> bytes:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds or config.bcrypt_rounds()))
+
+
+def hash_rounds(hashed_password: bytes) -> int:
+    """
+    Cost factor a bcrypt hash was made with ('$2b$<rounds>$...')
+    """
+    return int(hashed_password.split(b'$')[2])
 
 
 def checkpw(password: str, hashed_password: bytes) -> bool:
@@ -13,3 +26,33 @@ def checkpw(password: str, hashed_password: bytes) -> bool:
 
 def generate_token() -> str:
     return secrets.token_hex(16)
+
+
+def _b64encode(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b'=')
+
+
+def _b64decode(data: bytes) -> bytes:
+    return base64.urlsafe_b64decode(data + b'=' * (-len(data) % 4))
+
+
+def sign(payload: dict, secret: str) -> str:
+    body = _b64encode(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+    signature = _b64encode(hmac.new(secret.encode('utf-8'), body, hashlib.sha256).digest())
+    return (body + b'.' + signature).decode('ascii')
+
+
+def unsign(token: str, secret: str) -> dict | None:
+    try:
+        body, signature = token.encode('ascii').split(b'.')
+    except (UnicodeEncodeError, ValueError):
+        return None
+
+    expected = _b64encode(hmac.new(secret.encode('utf-8'), body, hashlib.sha256).digest())
+    if not hmac.compare_digest(signature, expected):
+        return None
+
+    try:
+        return json.loads(_b64decode(body))
+    except ValueError:
+        return None
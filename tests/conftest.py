@@ -1,23 +1,92 @@
 import pytest
+import redis
 from fastapi.testclient import TestClient
 from src.app import app
-from src import context, util
+from src import context, ratelimit, sessions, util
 
 
 # ------------------ Fake Classes ------------------
 
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        # Команды копятся и выполняются разом в execute, как в настоящем pipeline
+        method = getattr(self.redis, name)
+        return lambda *args, **kwargs: self.commands.append((method, args, kwargs))
+
+    def execute(self):
+        if self.redis.fail:
+            raise redis.ConnectionError('redis is down')
+        return [method(*args, **kwargs) for method, args, kwargs in self.commands]
+
+
 class FakeRedis:
     def __init__(self):
         self.storage = {}
+        self.ttl = {}
+        # Недоступный Redis: записи падают с ошибкой соединения
+        self.fail = False
 
     def exists(self, key):
         return key in self.storage
 
-    def set(self, key, value):
-        self.storage[key] = value
+    def get(self, key):
+        return self.storage.get(key)
+
+    def mget(self, *keys):
+        return [self.storage.get(x) for x in keys]
+
+    def set(self, key, value, ex=None):
+        # Числа Redis хранит строками
+        self.storage[key] = str(value).encode() if isinstance(value, int) else value
+        self.ttl[key] = ex
+
+    def incr(self, key):
+        if self.fail:
+            raise redis.ConnectionError('redis is down')
+        self.storage[key] = str(int(self.storage.get(key, 0)) + 1).encode()
 
     def expire(self, key, ttl):
-        pass
+        self.ttl[key] = ttl
+
+    def lpush(self, key, *values):
+        self.storage[key] = [str(x).encode() for x in reversed(values)] + self.storage.get(key, [])
+
+    def ltrim(self, key, start, end):
+        self.storage[key] = self.storage[key][start:end + 1]
+
+    def lrange(self, key, start, end):
+        return self.storage.get(key, [])[start:end + 1]
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def sadd(self, key, *values):
+        self.storage.setdefault(key, set()).update(values)
+
+    def register_script(self, script):
+        # Сессии создаются и читаются Lua-скриптами, эмулируем их по смыслу
+        def create(keys, args):
+            if keys[0] in self.storage:
+                return None
+            self.storage[keys[0]] = args[0]
+            self.sadd(keys[2], args[2])
+            return []
+
+        def read(keys, args):
+            return self.storage.get(keys[0])
+
+        def take(keys, args):
+            return 0
+
+        return {
+            sessions._CREATE: create,
+            sessions._READ: read,
+            ratelimit._TAKE: take
+        }[script]
 
 
 class FakeUser:
@@ -28,54 +97,129 @@ class FakeUser:
         self.is_admin = is_admin
 
 
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def mappings(self):
+        return self
+
+    def scalars(self):
+        return FakeResult([x[0] if isinstance(x, tuple) else x for x in self.rows])
+
+    def scalar(self):
+        return self.scalars().first()
+
+    def first(self):
+        return self.rows[0] if self.rows else None
+
+    def all(self):
+        return self.rows
+
+    def __iter__(self):
+        return iter(self.rows)
+
+
 class FakeDB:
     def __init__(self):
         self.users = {}
+        # Строки по запросу или по имени таблицы вставки, либо функция от параметров запроса, которая их возвращает
+        self.results = {}
+        self.executed = []
+        self.commits = 0
+        self.rollbacks = 0
+        # Недоступная база: коммит падает
+        self.fail_commit = False
+        self.info = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
 
-    def scalar(self, query):
+    async def scalar(self, query):
         # query будет искать по username
         # для простоты возвращаем единственного пользователя
         if self.users:
             return next(iter(self.users.values()))
         return None
 
+    async def execute(self, query, params=None):
+        self.executed.append((query, params))
+        rows = self.results.get(query, self.results.get(getattr(getattr(query, 'table', None), 'name', None), []))
+        return FakeResult(rows(params) if callable(rows) else rows)
+
     def add(self, obj):
         self.users[obj.username] = obj
 
-    def commit(self):
-        pass
+    async def commit(self):
+        if self.fail_commit:
+            raise RuntimeError('commit failed')
+        self.commits += 1
 
-    def rollback(self):
-        pass
+    async def rollback(self):
+        self.rollbacks += 1
 
-    def refresh(self, obj):
+    async def refresh(self, obj):
         obj.user_id = 1
 
-    def close(self):
+    async def close(self):
         pass
 
 
+class FakeES:
+    def __init__(self):
+        self.deleted = []
+        # Недоступный Elasticsearch
+        self.fail = False
+
+    def delete_by_query(self, index, query, **kwargs):
+        if self.fail:
+            raise ConnectionError('es is down')
+        self.deleted.append(query['ids']['values'])
+
+
 # ------------------ Fake Context ------------------
 
 class FakeContext:
     def __init__(self):
         self.rs = FakeRedis()
         self.db = FakeDB()
+        self.es = FakeES()
+        # Реплика отвечает теми же данными, но запросы к ней видны отдельно
+        self.replica = FakeDB()
+        self.replica.users, self.replica.results = self.db.users, self.db.results
 
     def sm(self):
         return self.db
 
+    def read_sm(self):
+        return self.replica
+
 
 # ------------------ Pytest Fixture ------------------
 
+@pytest.fixture(autouse=True)
+def clear_session_cache():
+    # Кэш сессий живет в памяти процесса и не должен переживать тест
+    sessions._cache.clear()
+
+
+@pytest.fixture
+def ctx(monkeypatch):
+    fake = FakeContext()
+    monkeypatch.setattr(context, 'ctx', fake)
+    return fake
+
+
 @pytest.fixture
 def client(monkeypatch):
-    fake_db = FakeDB()
     fake_ctx = FakeContext()
 
     # Подмена context.get_db и context.ctx
     def fake_get_db():
-        yield fake_db
+        yield fake_ctx.db
 
     monkeypatch.setattr(context, 'get_db', fake_get_db)
     monkeypatch.setattr(context, 'ctx', fake_ctx)
@@ -67,23 +67,19 @@ def test_name_set_validation():
     album.name = "Valid Name"
     assert album.name == "Valid Name"
 
-def test_after_insert_calls_es(fake_db, fake_artist, fake_album):
-    fake_db.artists[fake_artist.artist_id] = fake_artist
-    fake_album.artist_id = fake_artist.artist_id
-
+def test_after_insert_calls_es(fake_artist, fake_album):
     fake_es = MagicMock()
 
     with patch('src.context.ctx') as mock_ctx:
         mock_ctx.es = fake_es
 
-        from src.models.album import after_change
-        from sqlalchemy.orm import attributes
+        from src.models.album import before_change, after_change
 
-        # Патчим state.session на fake_db
-        state = MagicMock()
-        state.session = fake_db
-        with patch('sqlalchemy.orm.attributes.instance_state', return_value=state):
-            after_change(None, None, fake_album)
+        # Проверка ссылок возвращает имя исполнителя для индекса
+        connection = MagicMock()
+        connection.execute.return_value.one.return_value = (True, fake_artist.name)
+        before_change(None, connection, fake_album)
+        after_change(None, connection, fake_album)
 
         fake_es.index.assert_called_once_with(
             index=const.ELASTICSEARCH_INDEX,
@@ -91,6 +87,15 @@ def test_after_insert_calls_es(fake_db, fake_artist, fake_album):
             document={'keyword': fake_album.name, 'data': {'name': fake_album.name, 'artist': fake_artist.name}}
         )
 
+def test_before_insert_invalid_artist(fake_album):
+    from src.models.album import before_change
+
+    connection = MagicMock()
+    connection.execute.return_value.one.return_value = (True, None)
+
+    with pytest.raises(ValueError):
+        before_change(None, connection, fake_album)
+
 def test_before_delete_calls_es(fake_album):
     fake_es = MagicMock()
     with patch('src.context.ctx') as mock_ctx:
@@ -103,3 +108,14 @@ def test_before_delete_calls_es(fake_album):
             index=const.ELASTICSEARCH_INDEX,
             id='album_' + str(fake_album.album_id)
         )
+
+
+def test_after_change_leaves_card_to_trigger(fake_album):
+    '''Карточку альбома пишет триггер, хук не тратит на нее запрос'''
+    from src.models.album import after_change
+
+    with patch('src.context.ctx'):
+        connection = MagicMock()
+        after_change(None, connection, fake_album)
+
+    connection.execute.assert_not_called()
@@ -68,15 +68,30 @@ def test_biography_validation():
     artist.biography = "Valid biography"
     assert artist.biography == "Valid biography"
 
-def test_before_insert_and_update(fake_db, fake_artist, fake_asset):
-    fake_db.assets[fake_asset.asset_id] = fake_asset
+def test_before_insert_and_update(fake_artist):
     from src.models.artist import before_change
+
+    connection = MagicMock()
+    connection.scalar.return_value = True
+    before_change(None, connection, fake_artist)  # Не должно падать
+
+    connection.scalar.return_value = False
+    with pytest.raises(ValueError):
+        before_change(None, connection, fake_artist)
+
+def test_before_update_skips_unchanged_asset(fake_artist):
+    """Без смены обложки обновление не обращается к базе"""
     from sqlalchemy.orm import attributes
+    from src.models.artist import before_change
 
-    state = MagicMock()
-    state.session = fake_db
-    with patch('sqlalchemy.orm.attributes.instance_state', return_value=state):
-        before_change(None, None, fake_artist)  # Не должно падать
+    artist = Artist()
+    attributes.set_committed_value(artist, 'asset_id', 1)
+    artist.name = "Renamed Artist"
+
+    connection = MagicMock()
+    before_change(None, connection, artist)
+
+    connection.scalar.assert_not_called()
 
 def test_after_insert_calls_es(fake_artist):
     fake_es = MagicMock()
@@ -104,3 +119,33 @@ def test_before_delete_calls_es(fake_artist):
             index=const.ELASTICSEARCH_INDEX,
             id='artist_' + str(fake_artist.artist_id)
         )
+
+def test_after_rename_updates_cards(fake_artist):
+    '''Новое имя исполнителя переносится в карточки его альбомов, закешированные карточки сбрасываются'''
+    from sqlalchemy.orm import Session
+    from src.models.artist import after_rename
+    from src.models.__base__ import ENTITIES_CHANGED
+
+    session = Session()
+    session.add(fake_artist)
+    connection = MagicMock()
+    connection.execute.return_value.scalars.return_value.all.return_value = [3, 4]
+    after_rename(None, connection, fake_artist)
+
+    statement = connection.execute.call_args.args[0]
+    assert str(statement).startswith('UPDATE album_cards SET artist_name')
+    assert statement.compile().params['artist_name'] == fake_artist.name
+    assert session.info[ENTITIES_CHANGED] == {('album', 3), ('album', 4)}
+
+def test_touch_caches_flags_session(fake_artist):
+    '''Изменение исполнителя помечает сессию, чтобы после коммита сбросить ленту и кеш исполнителя'''
+    from sqlalchemy.orm import Session
+    from src.models.artist import touch_caches
+    from src.models.__base__ import ENTITIES_CHANGED, FEED_CHANGED
+
+    session = Session()
+    session.add(fake_artist)
+    touch_caches(None, None, fake_artist)
+
+    assert session.info[FEED_CHANGED] is True
+    assert session.info[ENTITIES_CHANGED] == {('artist', 1)}
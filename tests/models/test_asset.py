@@ -68,15 +68,30 @@ def test_biography_validation():
     artist.biography = "Valid biography"
     assert artist.biography == "Valid biography"
 
-def test_before_insert_and_update(fake_db, fake_artist, fake_asset):
-    fake_db.assets[fake_asset.asset_id] = fake_asset
+def test_before_insert_and_update(fake_artist):
     from src.models.artist import before_change
+
+    connection = MagicMock()
+    connection.scalar.return_value = True
+    before_change(None, connection, fake_artist)  # Не должно падать
+
+    connection.scalar.return_value = False
+    with pytest.raises(ValueError):
+        before_change(None, connection, fake_artist)
+
+def test_before_update_skips_unchanged_asset(fake_artist):
+    """Без смены обложки обновление не обращается к базе"""
     from sqlalchemy.orm import attributes
+    from src.models.artist import before_change
+
+    artist = Artist()
+    attributes.set_committed_value(artist, 'asset_id', 1)
+    artist.name = "Renamed Artist"
+
+    connection = MagicMock()
+    before_change(None, connection, artist)
 
-    state = MagicMock()
-    state.session = fake_db
-    with patch('sqlalchemy.orm.attributes.instance_state', return_value=state):
-        before_change(None, None, fake_artist)  # Не должно падать
+    connection.scalar.assert_not_called()
 
 def test_after_insert_calls_es(fake_artist):
     fake_es = MagicMock()
@@ -76,25 +76,36 @@ def test_name_set_validation():
     song.name = "Valid Name"
     assert song.name == "Valid Name"
 
-def test_before_insert_update(fake_song, fake_db, fake_album, fake_artist):
-    state = MagicMock()
-    state.session = fake_db
-    with patch('sqlalchemy.orm.attributes.instance_state', return_value=state):
-        before_change(None, None, fake_song)
+def test_before_insert_update(fake_song):
+    """Обе ссылки проверяются одним запросом, имя исполнителя запоминается для индекса"""
+    connection = MagicMock()
+    connection.execute.return_value.one.return_value = (True, "Test Artist")
 
-def test_after_insert_update_calls_es(fake_song, fake_db, fake_album, fake_artist):
-    state = MagicMock()
-    state.session = fake_db
+    before_change(None, connection, fake_song)
 
+    assert connection.execute.call_count == 1
+    assert fake_song._artist_name == "Test Artist"
+
+def test_before_insert_update_invalid(fake_song):
+    connection = MagicMock()
+
+    connection.execute.return_value.one.return_value = (False, "Test Artist")
+    with pytest.raises(ValueError):
+        before_change(None, connection, fake_song)
+
+    connection.execute.return_value.one.return_value = (True, None)
+    with pytest.raises(ValueError):
+        before_change(None, connection, fake_song)
+
+def test_after_insert_update_calls_es(fake_song, fake_artist):
     fake_es = MagicMock()
     fake_ctx = MagicMock()
     fake_ctx.es = fake_es
+    fake_song._artist_name = fake_artist.name
 
     with patch('src.context.ctx', fake_ctx):
         from src.models.song import after_change
-        from sqlalchemy.orm import attributes
-        with patch('sqlalchemy.orm.attributes.instance_state', return_value=state):
-            after_change(None, None, fake_song)
+        after_change(None, None, fake_song)
 
     fake_es.index.assert_called_once_with(
         index=const.ELASTICSEARCH_INDEX,
@@ -102,6 +113,32 @@ def test_after_insert_update_calls_es(fake_song, fake_db, fake_album, fake_artis
         document={'keyword': fake_song.name, 'data': {'name': fake_song.name, 'artist': fake_artist.name}}
     )
 
+def test_update_keeps_album_skips_lookup():
+    """Переименование песни не проверяет ссылки и частично обновляет документ индекса"""
+    from sqlalchemy.orm import attributes
+    from src.models.song import after_change
+
+    song = Song()
+    attributes.set_committed_value(song, 'song_id', 1)
+    attributes.set_committed_value(song, 'album_id', 1)
+    attributes.set_committed_value(song, 'asset_id', 1)
+    song.name = "Renamed Song"
+
+    connection = MagicMock()
+    fake_ctx = MagicMock()
+    with patch('src.context.ctx', fake_ctx):
+        before_change(None, connection, song)
+        after_change(None, connection, song)
+
+    connection.execute.assert_not_called()
+    fake_ctx.es.index.assert_not_called()
+    fake_ctx.es.update.assert_called_once_with(
+        index=const.ELASTICSEARCH_INDEX,
+        id='song_1',
+        doc={'keyword': "Renamed Song", 'data': {'name': "Renamed Song"}},
+        doc_as_upsert=True
+    )
+
 def test_before_delete_calls_es(fake_song):
     fake_es = MagicMock()
     fake_ctx = MagicMock()
@@ -114,4 +151,22 @@ def test_before_delete_calls_es(fake_song):
     fake_es.delete.assert_called_once_with(
         index=const.ELASTICSEARCH_INDEX,
         id='song_' + str(fake_song.song_id)
-    )
\ No newline at end of file
+    )
+
+
+def test_touch_caches_flags_both_albums():
+    '''Перенос песни сбрасывает кеш песни и карточек старого и нового альбома'''
+    from sqlalchemy.orm import Session, attributes
+    from src.models.song import touch_caches
+    from src.models.__base__ import ENTITIES_CHANGED
+
+    song = Song()
+    attributes.set_committed_value(song, 'song_id', 1)
+    attributes.set_committed_value(song, 'album_id', 1)
+    session = Session()
+    session.add(song)
+    song.album_id = 2
+
+    touch_caches(None, None, song)
+
+    assert session.info[ENTITIES_CHANGED] == {('song', 1), ('album', 2), ('album', 1)}
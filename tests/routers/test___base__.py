@@ -1,6 +1,8 @@
+import asyncio
+
 import pytest
 from fastapi import HTTPException
-from src.routers.__base__ import assert_exists
+from src.routers.__base__ import assert_exists, assert_found
 
 
 # ------------------ Fake DB ------------------
@@ -9,7 +11,7 @@ class FakeDB:
         self.data = data or {}
         self.raise_exc = raise_exc
 
-    def get(self, cls, uid):
+    async def get(self, cls, uid):
         if self.raise_exc:
             raise ValueError("Some error")
         return self.data.get(uid)
@@ -18,19 +20,37 @@ class FakeDB:
 # ------------------ Tests ------------------
 def test_assert_exists_returns_object():
     db = FakeDB(data={1: {"id": 1, "name": "test"}})
-    result = assert_exists(db, dict, 1)
+    result = asyncio.run(assert_exists(db, dict, 1))
     assert result == {"id": 1, "name": "test"}
 
 
 def test_assert_exists_none_raises_404():
     db = FakeDB(data={})
     with pytest.raises(HTTPException) as excinfo:
-        assert_exists(db, dict, 1)
+        asyncio.run(assert_exists(db, dict, 1))
+    assert excinfo.value.status_code == 404
+
+
+def test_assert_exists_marked_raises_404():
+    class Marked:
+        is_deleted = True
+
+    db = FakeDB(data={1: Marked()})
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(assert_exists(db, Marked, 1))
     assert excinfo.value.status_code == 404
 
 
 def test_assert_exists_exception_raises_404():
     db = FakeDB(raise_exc=True)
     with pytest.raises(HTTPException) as excinfo:
-        assert_exists(db, dict, 1)
+        asyncio.run(assert_exists(db, dict, 1))
+    assert excinfo.value.status_code == 404
+
+
+def test_assert_found():
+    assert assert_found({"id": 1}) == {"id": 1}
+
+    with pytest.raises(HTTPException) as excinfo:
+        assert_found(None)
     assert excinfo.value.status_code == 404
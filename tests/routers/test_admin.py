@@ -2,6 +2,7 @@ import pytest
 from fastapi.testclient import TestClient
 from src.routers import admin
 from src import context, util
+from src.sessions import Claims
 
 # ------------------ Fake Classes ------------------
 
@@ -14,6 +15,12 @@ class FakeRedis:
         self.storage[key] = value
     def expire(self, key, ttl):
         pass
+    def register_script(self, script):
+        return lambda keys, args: self.get(keys[0])
+    def exists(self, key):
+        return key in self.storage
+    def sadd(self, key, *values):
+        self.storage.setdefault(key, set()).update(values)
 
 class FakeUser:
     def __init__(self, user_id=1, username='admin', password='hash', is_admin=True):
@@ -24,33 +31,45 @@ class FakeUser:
     def to_dict(self):
         return {"user_id": self.user_id, "username": self.username, "is_admin": self.is_admin}
 
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+    def mappings(self):
+        return self
+    def all(self):
+        return self.rows
+    def scalar(self):
+        return len(self.rows)
+
 class FakeDB:
     def __init__(self):
         self.users = {1: FakeUser()}
-    def get(self, cls, uid):
+    async def execute(self, query, params=None):
+        return FakeResult([x.to_dict() for x in self.users.values()])
+    async def get(self, cls, uid):
         return self.users.get(uid)
     def add(self, obj):
         self.users[obj.user_id] = obj
-    def commit(self):
+    async def commit(self):
         pass
-    def rollback(self):
+    async def rollback(self):
         pass
-    def refresh(self, obj):
+    async def refresh(self, obj):
         pass
-    def delete(self, obj):
+    async def delete(self, obj):
         self.users.pop(obj.user_id, None)
-    def scalar(self, query):
+    async def scalar(self, query):
         return len(self.users)
-    def scalars(self, query):
+    async def scalars(self, query):
         return list(self.users.values())
-    def close(self):
+    async def close(self):
         pass
 
 
 class FakeContext:
     def __init__(self):
         self.rs = FakeRedis()
-        self.rs.storage['token'] = 1  # admin user
+        self.rs.storage['session:token:token'] = Claims(1, 'admin', True).dumps()  # admin user
         self.s3 = type('FakeS3', (), {
             'head_bucket': lambda self, Bucket: None,
             'create_bucket': lambda self, Bucket: None,
@@ -61,6 +80,8 @@ class FakeContext:
     def sm(self):
         return self.db
 
+    read_sm = sm
+
 # ------------------ Fixture ------------------
 
 @pytest.fixture
@@ -72,8 +93,9 @@ def client(monkeypatch):
     monkeypatch.setattr(context, 'get_db', lambda: iter([fake_db]))
     monkeypatch.setattr(context, 'ctx', fake_ctx)
 
-    # Подменяем util
-    monkeypatch.setattr(util, 'hashpw', lambda p: f'hash-{p}')
+    # Подменяем util, подмененные функции не передать в процессы пула
+    monkeypatch.setenv('PASSWORD_POOL_SIZE', '0')
+    monkeypatch.setattr(util, 'hashpw', lambda p, rounds=None: f'hash-{p}')
     monkeypatch.setattr(util, 'checkpw', lambda p, h: h == f'hash-{p}')
     monkeypatch.setattr(util, 'generate_token', lambda: 'token')
 
@@ -93,6 +115,18 @@ def test_users_list(client):
     assert 'items' in data
     assert len(data['items']) >= 1
 
+def test_users_list_limit(client):
+    assert client.get("/admin/users?token=token&limit=0").status_code == 422
+    assert client.get("/admin/users?token=token&limit=101").status_code == 422
+
+    resp = client.get("/admin/users?token=token&limit=50")
+    assert resp.status_code == 200
+    assert resp.json()['per_page'] == 50
+    assert resp.json()['next'] is None
+
+def test_users_list_bad_cursor(client):
+    assert client.get("/admin/users?token=token&after=!").status_code == 400
+
 def test_users_create(client):
     resp = client.post("/admin/users?token=token", json={
         "username": "newuser",
@@ -102,3 +136,27 @@ def test_users_create(client):
     assert resp.status_code == 200
     user = resp.json()['user']
     assert user['username'] == 'newuser'
+
+def test_users_read(client):
+    resp = client.get("/admin/users/1?token=token")
+    assert resp.status_code == 200
+    assert resp.json()['user']['user_id'] == 1
+
+def test_metrics(client):
+    resp = client.get("/admin/metrics?token=token")
+    assert resp.status_code == 200
+    data = resp.json()
+    assert 'session_cache_size' in data['gauges']
+    assert 'session_cache_hit_rate' in data['gauges']
+
+def test_sessions_stats(client, monkeypatch):
+    from src import sessions
+    monkeypatch.setattr(sessions, 'stats', lambda: {'users': 1, 'sessions': 1})
+
+    resp = client.get("/admin/sessions?token=token")
+    assert resp.status_code == 200
+    assert resp.json()['sessions'] == 1
+
+def test_export_unknown_kind(client):
+    # Пользователи с хэшами паролей не выгружаются
+    assert client.get("/admin/export/users?token=token").status_code == 422
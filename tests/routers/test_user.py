@@ -1,3 +1,5 @@
+import json
+
 import pytest
 from fastapi.testclient import TestClient
 from unittest.mock import MagicMock, patch
@@ -5,6 +7,7 @@ from unittest.mock import MagicMock, patch
 from src import context, util
 from src.app import app
 from src.models import User
+from src.sessions import Claims
 
 # ------------------- Fake classes -------------------
 
@@ -17,33 +20,74 @@ class FakeUser:
     def to_dict(self):
         return {"user_id": self.user_id, "username": self.username, "is_admin": self.is_admin}
 
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+    def mappings(self):
+        return self
+    def all(self):
+        return self.rows
+    def first(self):
+        return self.rows[0] if self.rows else None
+    def scalar(self):
+        return 0
+    def __iter__(self):
+        return iter(self.rows)
+
 class FakeDB:
-    def get(self, cls, uid):
+    async def execute(self, query, params=None):
+        # Одиночные записи есть, списки пусты
+        return FakeResult([FakeUser().to_dict()] if params else [])
+    async def get(self, cls, uid):
         return FakeUser()
-    def scalars(self, query):
+    async def scalars(self, query):
         return []
-    def scalar(self, query):
+    async def scalar(self, query):
         return 0
-    def close(self):
+    async def close(self):
+        pass
+    async def __aenter__(self):
+        return self
+    async def __aexit__(self, *args):
         pass
 
 class FakeRedis:
     def __init__(self):
         self.storage = {}
+        self.deleted = []
     def get(self, token):
-        return 1
-    def set(self, token, uid):
+        return Claims(1, "TestUser", False).dumps()
+    def set(self, token, uid, ex=None):
         self.storage[token] = uid
+    def mget(self, *keys):
+        return [self.storage.get(x) for x in keys]
     def expire(self, token, ttl):
         pass
+    def register_script(self, script):
+        return lambda keys, args: self.get(keys[0])
     def delete(self, token):
         self.storage.pop(token, None)
+        self.deleted.append(token)
+    def srem(self, key, *values):
+        self.storage.get(key, set()).difference_update(values)
+    def publish(self, channel, message):
+        pass
+    def pipeline(self, transaction=True):
+        return self
+    def execute(self):
+        return []
 
 class FakeES:
     def __init__(self):
         self.indices = MagicMock()
         self.indices.exists.return_value = False
+        self.options_kwargs = None
+        self.search_kwargs = None
+    def options(self, **kwargs):
+        self.options_kwargs = kwargs
+        return self
     def search(self, **kwargs):
+        self.search_kwargs = kwargs
         return {"hits": {"hits": []}}
 
 class FakeContext:
@@ -56,6 +100,8 @@ class FakeContext:
     def sm(self):
         return self.db
 
+    read_sm = sm
+
 # ------------------- Fixture -------------------
 
 @pytest.fixture
@@ -84,8 +130,63 @@ def test_index_empty(client):
     assert response.status_code == 200
     assert response.json() == {"artists": [], "albums": [], "songs": []}
 
+def test_song(client):
+    response = client.get("/user/song/1?token=fake_token")
+    assert response.status_code == 200
+    assert response.json()["song"]["user_id"] == 1
+
 def test_logout(client):
     response = client.delete("/user/logout?token=fake_token")
     assert response.status_code == 200 or response.status_code == 204  # зависит от реализации log_action
     # Проверяем, что токен удалён
-    assert "fake_token" not in context.ctx.rs.storage
+    assert "session:token:fake_token" in context.ctx.rs.deleted
+
+
+def test_pinned_session_reads_primary(client, monkeypatch):
+    """Закрепленная после записи сессия читает из основной базы, остальные - из реплики"""
+    from src import sessions
+    from src.routers import user
+
+    monkeypatch.setattr(sessions, 'is_pinned', lambda token: token == 'pinned')
+    monkeypatch.setattr(context, "ctx", MagicMock())
+
+    assert user.read_sm('pinned') is context.ctx.sm
+    assert user.read_sm('other') is context.ctx.read_sm
+
+def test_search_bounded_by_deadline(client):
+    '''Поиск передает остаток дедлайна в таймаут клиента и в тело запроса Elasticsearch'''
+    context.ctx.es.indices.exists.return_value = True
+
+    response = client.get("/user/search?token=fake_token&q=test")
+    assert response.status_code == 200
+    assert response.json() == {"results": []}
+
+    assert 0 < context.ctx.es.options_kwargs["request_timeout"] <= 5
+    assert context.ctx.es.search_kwargs["body"]["timeout"].endswith("ms")
+
+def test_random_songs_single_scope(client):
+    '''Случайные песни выбираются либо из исполнителя, либо из альбома'''
+    response = client.get("/user/songs/random?token=fake_token&artist_id=1&album_id=1")
+    assert response.status_code == 400
+
+    assert client.get("/user/songs/random?token=fake_token&limit=0").status_code == 422
+
+def test_index_from_cache(client):
+    '''Закешированная лента текущего поколения отдается без обращения к базе'''
+    cached = {"artists": [{"artist_id": 1}], "albums": [], "songs": []}
+    context.ctx.rs.storage["feed:index"] = b'0\n' + json.dumps(cached).encode()
+    context.ctx.db = None
+
+    response = client.get("/user/?token=fake_token")
+    assert response.status_code == 200
+    assert response.json() == cached
+
+def test_artist_from_cache(client):
+    '''Закешированный исполнитель текущей версии отдается без обращения к базе'''
+    cached = {"artist_id": 7, "name": "Artist", "biography": "Biography", "asset_id": 1}
+    context.ctx.rs.storage["entity:artist:7"] = b'0:0\n' + json.dumps(cached).encode()
+    context.ctx.db = None
+
+    response = client.get("/user/artist/7?token=fake_token")
+    assert response.status_code == 200
+    assert response.json() == {"artist": cached}
@@ -1,3 +1,6 @@
+from src import context
+
+
 def test_index(client):
     response = client.get('/')
 
@@ -59,3 +62,69 @@ def test_login_wrong_password(client):
     )
 
     assert response.status_code == 401
+
+
+def test_register_first_user_is_admin(client, monkeypatch):
+    import src.app as app_module
+    monkeypatch.setattr(app_module, '_bootstrapped', False)
+
+    client.post('/register', json={'username': 'first', 'password': '1234'})
+
+    user = context.ctx.db.users['first']
+    assert user.is_admin is True
+
+
+def test_register_taken_username_skips_hashing(client, monkeypatch):
+    """Занятое имя отклоняется до хэширования пароля"""
+    from src import passwords
+
+    client.post('/register', json={'username': 'test', 'password': '1234'})
+
+    async def fail(password):
+        raise AssertionError('hashpw must not be called')
+
+    monkeypatch.setattr(passwords, 'hashpw', fail)
+    response = client.post('/register', json={'username': 'test', 'password': '1234'})
+
+    assert response.status_code == 400
+
+
+def test_login_rehashes_other_cost(client, monkeypatch):
+    """Хэш другой стоимости прозрачно заменяется при входе"""
+    from src.util import hash_rounds
+
+    monkeypatch.setenv('BCRYPT_ROUNDS', '4')
+    client.post('/register', json={'username': 'test', 'password': '1234'})
+    assert hash_rounds(context.ctx.db.users['test'].password) == 4
+
+    monkeypatch.setenv('BCRYPT_ROUNDS', '5')
+    response = client.post('/login', json={'username': 'test', 'password': '1234'})
+
+    assert response.status_code == 200
+    assert hash_rounds(context.ctx.db.users['test'].password) == 5
+
+
+def test_login_survives_failed_rehash(client, monkeypatch):
+    """Сбой перехэширования не мешает входу, хотя откат сбрасывает атрибуты пользователя"""
+    from fastapi import HTTPException
+    from src import passwords
+
+    monkeypatch.setenv('BCRYPT_ROUNDS', '4')
+    client.post('/register', json={'username': 'test', 'password': '1234'})
+
+    async def fail(password):
+        raise HTTPException(503)
+
+    db = context.ctx.db
+
+    async def rollback():
+        # Как и AsyncSession, откат сбрасывает загруженные атрибуты
+        vars(db.users['test']).clear()
+
+    monkeypatch.setenv('BCRYPT_ROUNDS', '5')
+    monkeypatch.setattr(passwords, 'hashpw', fail)
+    monkeypatch.setattr(db, 'rollback', rollback)
+    response = client.post('/login', json={'username': 'test', 'password': '1234'})
+
+    assert response.status_code == 200
+    assert 'token' in response.json()
@@ -0,0 +1,29 @@
+from src import calibrate
+
+
+def test_percentile():
+    values = [float(x) for x in range(1, 101)]
+
+    assert calibrate.percentile(values, 50) == 50
+    assert calibrate.percentile(values, 99) == 99
+    assert calibrate.percentile([7.0], 99) == 7
+
+
+def test_recommends_highest_cost_within_target(monkeypatch):
+    """Рекомендуется наибольшая стоимость, укладывающаяся в целевой p99"""
+    # Каждый следующий раунд вдвое дороже, как у bcrypt
+    monkeypatch.setattr(calibrate, 'measure', lambda rounds, concurrency, samples: [2.0 ** rounds] * samples)
+
+    recommended, rows = calibrate.calibrate(target_ms=300, concurrency=1, samples=3)
+
+    assert recommended == 8
+    assert rows[-1][0] == 9
+
+
+def test_nothing_fits(monkeypatch):
+    monkeypatch.setattr(calibrate, 'measure', lambda rounds, concurrency, samples: [1000.0] * samples)
+
+    recommended, rows = calibrate.calibrate(target_ms=1, concurrency=1, samples=1)
+
+    assert recommended is None
+    assert len(rows) == 1
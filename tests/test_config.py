@@ -56,4 +56,96 @@ def test_elasticsearch_config():
     '''Проверка настроек Elasticsearch'''
     with patch.dict(os.environ, {'ELASTICSEARCH_PORT': '9500'}):
         # В коде config.py elasticsearch_port не обернут в int(), проверим это
-        assert config.elasticsearch_port() == '9500'
\ No newline at end of file
+        assert config.elasticsearch_port() == '9500'
+
+def test_session_refresh_threshold():
+    '''Проверка порога продления сессии'''
+    with patch.dict(os.environ, {}, clear=True):
+        assert config.session_refresh_threshold() == 0.5
+    with patch.dict(os.environ, {'SESSION_REFRESH_THRESHOLD': '0.25'}):
+        assert config.session_refresh_threshold() == 0.25
+
+def test_session_cache_config():
+    '''Проверка настроек кэша сессий'''
+    with patch.dict(os.environ, {}, clear=True):
+        assert config.session_cache_size() == 10000
+        assert config.session_cache_ttl() == 5
+    with patch.dict(os.environ, {'SESSION_CACHE_SIZE': '0', 'SESSION_CACHE_TTL': '0.5'}):
+        assert config.session_cache_size() == 0
+        assert config.session_cache_ttl() == 0.5
+
+def test_session_mode_config():
+    '''Проверка настроек подписанных сессий'''
+    with patch.dict(os.environ, {}, clear=True):
+        assert config.session_mode() == 'redis'
+        assert config.session_secret() == ''
+        assert config.session_signed_ttl() == 86400
+        assert config.session_revocation_sync() == 5
+
+def test_session_max_per_user():
+    '''Проверка лимита сессий пользователя'''
+    with patch.dict(os.environ, {}, clear=True):
+        assert config.session_max_per_user() == 100
+
+def test_password_pool_config():
+    '''Проверка настроек пула хэширования паролей'''
+    with patch.dict(os.environ, {'PASSWORD_POOL_SIZE': '2', 'PASSWORD_QUEUE_SIZE': '8'}):
+        assert config.password_pool_size() == 2
+        assert config.password_queue_size() == 8
+
+def test_auth_limit_config():
+    '''Проверка лимитов входа и регистрации'''
+    with patch.dict(os.environ, {}, clear=True):
+        assert config.auth_limit_username_rate() == 10
+        assert config.auth_limit_username_burst() == 5
+        assert config.auth_limit_address_rate() == 60
+        assert config.auth_limit_address_burst() == 20
+
+def test_bcrypt_rounds():
+    '''Проверка стоимости bcrypt'''
+    with patch.dict(os.environ, {}, clear=True):
+        assert config.bcrypt_rounds() == 12
+
+def test_postgres_replicas():
+    '''Проверка списка реплик'''
+    with patch.dict(os.environ, {}, clear=True):
+        assert config.postgres_replicas() == []
+        assert config.postgres_pin_ttl() == 5
+    with patch.dict(os.environ, {'POSTGRES_REPLICAS': 'a:5433, b'}):
+        assert config.postgres_replicas() == ['a:5433', 'b']
+
+def test_postgres_pool_config():
+    '''Проверка настроек пула соединений'''
+    with patch.dict(os.environ, {}, clear=True):
+        assert config.postgres_pool_size() == 20
+        assert config.postgres_pool_overflow() == 0
+        assert config.postgres_pool_recycle() == 1800
+        assert config.postgres_pool_pre_ping() is False
+        assert config.postgres_pgbouncer() is False
+        assert config.postgres_statement_timeout() == 3
+    with patch.dict(os.environ, {'POSTGRES_POOL_PRE_PING': 'true'}):
+        assert config.postgres_pool_pre_ping() is True
+
+def test_deadline_config():
+    '''Проверка дедлайнов запросов по умолчанию и из окружения'''
+    with patch.dict(os.environ, {}, clear=True):
+        assert config.deadline_read() == 5
+        assert config.deadline_search() == 5
+        assert config.deadline_stream() == 10
+        assert config.deadline_write() == 15
+        assert config.deadline_import() == 600
+        assert config.deadline_default() == 10
+    with patch.dict(os.environ, {'DEADLINE_READ': '0.5', 'DEADLINE_WRITE': '30'}):
+        assert config.deadline_read() == 0.5
+        assert config.deadline_write() == 30
+
+def test_client_timeouts_config():
+    '''Проверка таймаутов клиентов Redis, S3 и Elasticsearch'''
+    with patch.dict(os.environ, {}, clear=True):
+        assert config.redis_timeout() == 1
+        assert config.s3_timeout() == 5
+        assert config.elasticsearch_timeout() == 5
+    with patch.dict(os.environ, {'REDIS_TIMEOUT': '0.2', 'S3_TIMEOUT': '3', 'ELASTICSEARCH_TIMEOUT': '2'}):
+        assert config.redis_timeout() == 0.2
+        assert config.s3_timeout() == 3
+        assert config.elasticsearch_timeout() == 2
@@ -1,7 +1,8 @@
+import asyncio
 import sys
 import os
 import pytest
-from unittest.mock import patch, MagicMock, PropertyMock
+from unittest.mock import ANY, patch, MagicMock, PropertyMock, AsyncMock
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
 
@@ -11,7 +12,7 @@ import src.context as context_module
 def test_context_initialization():
     '''Проверка инициализации Context и вызова конструкторов клиентов с параметрами из конфига'''
     with patch('redis.Redis') as mock_redis, \
-            patch('sqlalchemy.create_engine') as mock_engine, \
+            patch('sqlalchemy.ext.asyncio.create_async_engine') as mock_engine, \
             patch('boto3.client') as mock_s3, \
             patch('elasticsearch.Elasticsearch') as mock_es:
         from src.context import Context
@@ -22,25 +23,50 @@ def test_context_initialization():
             service_name='s3',
             aws_access_key_id=context_module.config.s3_access_key(),
             aws_secret_access_key=context_module.config.s3_secret_key(),
-            endpoint_url=f'http://{context_module.config.s3_host()}:{context_module.config.s3_port()}'
+            endpoint_url=f'http://{context_module.config.s3_host()}:{context_module.config.s3_port()}',
+            config=ANY
         )
         mock_es.assert_called_once()
 
+        # Все клиенты ограничены таймаутами из конфига
+        assert mock_redis.call_args.kwargs['socket_timeout'] == context_module.config.redis_timeout()
+        assert mock_s3.call_args.kwargs['config'].read_timeout == context_module.config.s3_timeout()
+        assert mock_es.call_args.kwargs['request_timeout'] == context_module.config.elasticsearch_timeout()
+
 
 def test_get_db_yields_session():
     '''Проверка генератора get_db на корректное открытие и закрытие сессии'''
-    mock_session = MagicMock()
+    mock_session = AsyncMock()
+
+    async def run():
+        # Мы патчим внутренний атрибут _sm, так как sm — это read-only property
+        with patch('src.context.ctx._sm', return_value=mock_session):
+            db_gen = context_module.get_db()
+            db = await anext(db_gen)
+
+            assert db == mock_session
 
-    # Мы патчим внутренний атрибут _sm, так как sm — это read-only property
-    with patch('src.context.ctx._sm', return_value=mock_session):
-        db_gen = context_module.get_db()
-        db = next(db_gen)
+            try:
+                await anext(db_gen)
+            except StopAsyncIteration:
+                pass
 
-        assert db == mock_session
+    asyncio.run(run())
+    mock_session.close.assert_awaited_once()
+
+
+def test_read_sm_round_robin():
+    '''Проверка поочередного выбора реплик и основной базы без реплик'''
+    with patch('redis.Redis'), patch('boto3.client'), patch('elasticsearch.Elasticsearch'):
+        from src.context import Context
 
-        try:
-            next(db_gen)
-        except StopIteration:
-            pass
+        with patch.dict(os.environ, {'POSTGRES_REPLICAS': ''}):
+            ctx = Context()
+            assert ctx.read_sm is ctx.sm
 
-        mock_session.close.assert_called_once()
\ No newline at end of file
+        with patch.dict(os.environ, {'POSTGRES_REPLICAS': 'a:5433,b'}):
+            ctx = Context()
+            first, second, third = ctx.read_sm, ctx.read_sm, ctx.read_sm
+            assert first is not second and first is third
+            assert first is not ctx.sm
+            assert str(second.kw['bind'].url).endswith('@b:5432/postgres')
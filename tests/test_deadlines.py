@@ -0,0 +1,182 @@
+import asyncio
+import os
+from unittest.mock import MagicMock, patch
+
+import botocore.exceptions
+import pytest
+import redis
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import exc
+
+import src.deadlines as deadlines
+import src.metrics as metrics
+
+
+# ------------------- Fake classes -------------------
+
+class FakeCanceled(Exception):
+    '''Ошибка драйвера с кодом отмены запроса по statement_timeout'''
+    sqlstate = '57014'
+
+
+class FakeErrorContext:
+    def __init__(self, error, is_disconnect=False):
+        self.sqlalchemy_exception = error
+        self.original_exception = error
+        self.is_disconnect = is_disconnect
+
+
+# ------------------- Fixture -------------------
+
+@pytest.fixture
+def client():
+    metrics.reset()
+
+    app = FastAPI()
+    app.middleware('http')(deadlines.middleware)
+
+    @app.get('/user/slow')
+    async def slow():
+        await asyncio.sleep(1)
+        return {}
+
+    @app.get('/user/redis')
+    async def redis_down():
+        raise redis.ConnectionError()
+
+    @app.get('/user/s3')
+    async def s3_timeout():
+        raise botocore.exceptions.ReadTimeoutError(endpoint_url='http://s3')
+
+    @app.post('/admin/swallowed')
+    async def swallowed():
+        # Обработчик превращает сбой базы в 400, как это делают эндпоинты админки
+        deadlines.fail(503)
+        raise HTTPException(400)
+
+    @app.post('/admin/invalid')
+    async def invalid():
+        raise HTTPException(400)
+
+    @app.get('/user/remaining')
+    async def remaining():
+        return {'remaining': deadlines.remaining(100)}
+
+    with patch.dict(os.environ, {'DEADLINE_READ': '0.2'}):
+        yield TestClient(app)
+
+
+# ------------------- Тесты -------------------
+
+def test_route_class():
+    '''Проверка определения класса маршрута по методу и пути'''
+    assert deadlines.route_class('GET', '/user/asset/1') == 'stream'
+    assert deadlines.route_class('GET', '/admin/export/songs') == 'stream'
+    assert deadlines.route_class('GET', '/user/search') == 'search'
+    assert deadlines.route_class('POST', '/admin/artist') == 'write'
+    assert deadlines.route_class('POST', '/admin/import') == 'import'
+    assert deadlines.route_class('GET', '/admin/artists') == 'read'
+    assert deadlines.route_class('GET', '/user/album/1') == 'read'
+    assert deadlines.route_class('POST', '/login') == 'default'
+
+
+def test_remaining_outside_of_request():
+    '''Вне запроса остаток равен значению по умолчанию'''
+    assert deadlines.current() is None
+    assert deadlines.remaining(3) == 3
+
+
+def test_remaining_capped_by_deadline(client):
+    '''Внутри запроса остаток не превышает дедлайн маршрута'''
+    response = client.get('/user/remaining')
+    assert response.status_code == 200
+    assert 0 < response.json()['remaining'] <= 0.2
+
+
+def test_expired_deadline_is_504(client):
+    '''Запрос, переживший дедлайн, получает 504'''
+    response = client.get('/user/slow')
+    assert response.status_code == 504
+    assert metrics.counter('deadline_read_exceeded') == 1
+
+
+def test_unreachable_dependency_is_503(client):
+    '''Недоступный Redis дает 503'''
+    response = client.get('/user/redis')
+    assert response.status_code == 503
+    assert metrics.counter('deadline_read_unavailable') == 1
+
+
+def test_dependency_timeout_is_504(client):
+    '''Таймаут чтения S3 дает 504'''
+    assert client.get('/user/s3').status_code == 504
+
+
+def test_recorded_failure_replaces_400(client):
+    '''Сбой зависимости, скрытый обработчиком за 400, превращается в 503'''
+    assert client.post('/admin/swallowed').status_code == 503
+
+
+def test_client_error_kept(client):
+    '''Обычная ошибка клиента остается 400'''
+    assert client.post('/admin/invalid').status_code == 400
+
+
+def test_classify():
+    '''Проверка сопоставления ошибок зависимостей с кодами ответа'''
+    assert deadlines.classify(exc.DBAPIError('SELECT 1', {}, FakeCanceled())) == 504
+    assert deadlines.classify(exc.DBAPIError('SELECT 1', {}, Exception(), connection_invalidated=True)) == 503
+    assert deadlines.classify(exc.TimeoutError()) == 503
+    assert deadlines.classify(redis.TimeoutError()) == 504
+    assert deadlines.classify(TimeoutError()) == 504
+    assert deadlines.classify(ConnectionRefusedError()) == 503
+    assert deadlines.classify(ValueError()) is None
+
+
+def test_statement_timeout_set_from_deadline():
+    '''В начале транзакции Postgres получает остаток дедлайна как statement_timeout'''
+    connection = MagicMock()
+
+    deadlines._statement_timeout(None, None, connection)
+    connection.exec_driver_sql.assert_not_called()
+
+    token = deadlines._current.set(deadlines.Deadline('read', 2))
+    try:
+        deadlines._statement_timeout(None, None, connection)
+    finally:
+        deadlines._current.reset(token)
+
+    statement = connection.exec_driver_sql.call_args.args[0]
+    assert statement.startswith('SET LOCAL statement_timeout = ')
+    assert 0 < int(statement.rsplit(' ', 1)[1]) <= 2000
+
+
+def test_statement_timeout_default_of_connection(monkeypatch):
+    '''Дедлайн дальше таймаута соединения не стоит лишнего обращения к базе, кроме как за пулом транзакций'''
+    monkeypatch.setenv('POSTGRES_STATEMENT_TIMEOUT', '3')
+    connection = MagicMock()
+
+    token = deadlines._current.set(deadlines.Deadline('write', 15))
+    try:
+        deadlines._statement_timeout(None, None, connection)
+        connection.exec_driver_sql.assert_not_called()
+
+        monkeypatch.setenv('POSTGRES_PGBOUNCER', 'true')
+        deadlines._statement_timeout(None, None, connection)
+    finally:
+        deadlines._current.reset(token)
+
+    connection.exec_driver_sql.assert_called_once()
+
+
+def test_database_error_recorded():
+    '''Ошибка базы запоминается в дедлайне запроса'''
+    deadline = deadlines.Deadline('write', 2)
+    token = deadlines._current.set(deadline)
+    try:
+        deadlines.on_database_error(FakeErrorContext(exc.DBAPIError('SELECT 1', {}, FakeCanceled())))
+    finally:
+        deadlines._current.reset(token)
+
+    assert deadline.failure == 504
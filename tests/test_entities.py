@@ -0,0 +1,107 @@
+import asyncio
+import time
+
+import pytest
+from sqlalchemy.orm import Session
+
+import src.entities as entities
+import src.metrics as metrics
+import src.queries as queries
+from src.models.__base__ import CATALOG_CHANGED, ENTITIES_CHANGED, catalog_changed, entities_changed
+
+
+# ------------------ Fixtures ------------------
+
+@pytest.fixture(autouse=True)
+def artists(ctx):
+    metrics.reset()
+    rows = {1: {'artist_id': 1, 'name': 'Исполнитель'}}
+    ctx.db.results[queries.ARTIST_BY_ID] = lambda params: [rows.get(params['artist_id'])]
+    return rows
+
+
+def get(ctx, uid):
+    return asyncio.run(entities.get(ctx.read_sm, 'artist', uid))
+
+
+# ------------------ Тесты ------------------
+
+def test_read_through(ctx, artists):
+    '''Первое чтение идет в реплику, следующие отдаются из кеша'''
+    assert get(ctx, 1) == artists[1]
+    assert get(ctx, 1) == artists[1]
+
+    assert ctx.replica.executed == [(queries.ARTIST_BY_ID, {'artist_id': 1})]
+    assert ctx.db.executed == []
+    assert metrics.counter('entity_artist_hits') == 1
+
+
+def test_missing_cached_briefly(ctx):
+    '''Несуществующий ID кешируется на короткое время'''
+    assert get(ctx, 404) is None
+    assert get(ctx, 404) is None
+
+    assert len(ctx.replica.executed) == 1
+    assert ctx.rs.ttl['entity:artist:404'] == entities.const.ENTITY_MISSING_TTL
+
+
+def test_version_bump_reads_primary(ctx, artists):
+    '''После изменения сущность читается заново, и из мастера, пока реплика может отставать'''
+    get(ctx, 1)
+    artists[1] = {'artist_id': 1, 'name': 'Новое имя'}
+
+    entities.invalidate({('artist', 1)})
+
+    assert get(ctx, 1)['name'] == 'Новое имя'
+    assert len(ctx.db.executed) == 1
+
+
+def test_old_version_reads_replica(ctx, monkeypatch):
+    '''Давно измененная сущность без кеша читается из реплики'''
+    monkeypatch.setattr(entities.config, 'postgres_pin_ttl', lambda: 5)
+    ctx.rs.storage['entity:version:artist:1'] = str(time.time_ns() - 10 ** 10).encode()
+
+    get(ctx, 1)
+
+    assert len(ctx.replica.executed) == 1
+    assert ctx.db.executed == []
+
+
+def test_catalog_bump_drops_all(ctx):
+    '''Удаление, скрывающее строки, сбрасывает все закешированные сущности'''
+    get(ctx, 1)
+    get(ctx, 404)
+
+    entities.invalidate(set(), catalog=True)
+    get(ctx, 1)
+    get(ctx, 404)
+
+    assert len(ctx.replica.executed) + len(ctx.db.executed) == 4
+
+
+def test_commit_invalidates_flagged_entities(ctx):
+    '''Коммит сессии сдвигает версии помеченных сущностей, откат - нет'''
+    session = Session()
+    session.begin()
+    entities_changed(session, 'song', 2)
+    session.rollback()
+    session.commit()
+    assert ctx.rs.storage == {}
+
+    entities_changed(session, 'artist', 1)
+    catalog_changed(session)
+    session.commit()
+
+    assert set(ctx.rs.storage) == {'entity:version:artist:1', entities.CATALOG_KEY}
+    assert ENTITIES_CHANGED not in session.info and CATALOG_CHANGED not in session.info
+
+
+def test_invalidation_failure_keeps_commit(ctx):
+    '''Недоступный Redis не ломает уже закоммиченную запись'''
+    ctx.rs.fail = True
+    session = Session()
+    entities_changed(session, 'artist', 1)
+
+    session.commit()
+
+    assert metrics.counter('entity_invalidation_failed') == 1
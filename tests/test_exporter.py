@@ -0,0 +1,83 @@
+import asyncio
+import gzip
+import json
+
+import src.const as const
+import src.exporter as exporter
+
+
+# ------------------ Fake Classes ------------------
+
+class FakeStream:
+    def __init__(self, rows, size):
+        self.rows = rows
+        self.size = size
+
+    def mappings(self):
+        return self
+
+    async def partitions(self):
+        for i in range(0, len(self.rows), self.size):
+            yield self.rows[i:i + self.size]
+
+
+class FakeDB:
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def stream(self, statement, params, execution_options):
+        self.calls.append((statement, params, execution_options))
+        size = execution_options['yield_per']
+        return FakeStream([x for x in self.rows if x['song_id'] > params['after']], size)
+
+
+def export(db, **kwargs) -> list[bytes]:
+    async def run():
+        return [x async for x in exporter.ndjson(lambda: db, 'songs', **kwargs)]
+
+    return asyncio.run(run())
+
+
+ROWS = [{'song_id': x, 'name': f'Песня {x}', 'album_id': 1, 'asset_id': x} for x in range(1, 6)]
+
+
+# ------------------ Тесты ------------------
+
+def test_export_streams_batches(monkeypatch):
+    '''Строки читаются курсором пачками, каждая пачка отдается отдельным куском'''
+    monkeypatch.setattr(const, 'EXPORT_BATCH_SIZE', 2)
+    db = FakeDB(ROWS)
+
+    chunks = export(db)
+
+    assert len(chunks) == 3
+    assert db.calls == [(exporter.STATEMENTS['songs'], {'after': 0}, {'yield_per': 2})]
+    assert [json.loads(x) for x in b''.join(chunks).splitlines()] == ROWS
+
+
+def test_export_resumes_after_key():
+    '''Выгрузка продолжается после переданного ID'''
+    lines = b''.join(export(FakeDB(ROWS), after=3)).splitlines()
+
+    assert [json.loads(x)['song_id'] for x in lines] == [4, 5]
+
+
+def test_export_compressed():
+    '''Сжатая выгрузка является корректным gzip-потоком'''
+    data = gzip.decompress(b''.join(export(FakeDB(ROWS), compress=True)))
+
+    assert [json.loads(x) for x in data.splitlines()] == ROWS
+
+
+def test_export_statements_ordered_by_key():
+    '''Каждая выгрузка упорядочена по ID и начинается после after'''
+    for kind, statement in exporter.STATEMENTS.items():
+        sql = str(statement)
+        assert f'> :after ORDER BY {kind}.{kind[:-1]}_id' in sql
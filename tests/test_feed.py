@@ -0,0 +1,88 @@
+import asyncio
+import json
+
+import pytest
+from sqlalchemy.orm import Session
+
+import src.feed as feed
+import src.metrics as metrics
+import src.queries as queries
+from src.models.__base__ import FEED_CHANGED, feed_changed
+
+
+# ------------------ Fixtures ------------------
+
+@pytest.fixture(autouse=True)
+def artists(ctx):
+    metrics.reset()
+    rows = [{'artist_id': 1, 'name': 'Исполнитель'}]
+    ctx.db.results[queries.NEWEST_ARTISTS] = rows
+    return rows
+
+
+# ------------------ Тесты ------------------
+
+def test_read_builds_once(ctx, artists):
+    '''Первый запрос строит ленту, следующие отдаются из кеша без базы'''
+    first = json.loads(asyncio.run(feed.read()))
+
+    assert first == {'artists': artists, 'albums': [], 'songs': []}
+    assert len(ctx.db.executed) == 3
+
+    assert json.loads(asyncio.run(feed.read())) == first
+    assert len(ctx.db.executed) == 3
+
+
+def test_invalidate_rebuilds(ctx):
+    '''После изменения каталога лента строится заново'''
+    asyncio.run(feed.read())
+
+    ctx.db.results[queries.NEWEST_ARTISTS] = [{'artist_id': 2, 'name': 'Новый исполнитель'}]
+    feed.invalidate()
+
+    assert json.loads(asyncio.run(feed.read()))['artists'] == [{'artist_id': 2, 'name': 'Новый исполнитель'}]
+
+
+def test_stale_build_not_served(ctx, artists):
+    '''Лента, построенная до коммита, не отдается после него'''
+    ctx.rs.storage[feed.FEED_KEY] = b'0\n{"artists": [], "albums": [], "songs": []}'
+    feed.invalidate()
+
+    assert json.loads(asyncio.run(feed.read()))['artists'] == artists
+
+
+def test_commit_invalidates_flagged_session(ctx):
+    '''Коммит сессии, изменившей каталог, сдвигает поколение ленты'''
+    session = Session()
+
+    session.commit()
+    assert feed.GENERATION_KEY not in ctx.rs.storage
+
+    feed_changed(session)
+    session.commit()
+
+    assert ctx.rs.storage[feed.GENERATION_KEY] == b'1'
+    assert FEED_CHANGED not in session.info
+
+
+def test_rollback_clears_flag(ctx):
+    session = Session()
+    session.begin()
+    feed_changed(session)
+    session.rollback()
+
+    session.commit()
+
+    assert FEED_CHANGED not in session.info
+    assert feed.GENERATION_KEY not in ctx.rs.storage
+
+
+def test_invalidation_failure_keeps_commit(ctx):
+    '''Недоступный Redis не ломает уже закоммиченную запись'''
+    ctx.rs.fail = True
+    session = Session()
+    feed_changed(session)
+
+    session.commit()
+
+    assert metrics.counter('feed_invalidation_failed') == 1
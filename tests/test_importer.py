@@ -0,0 +1,197 @@
+import asyncio
+import itertools
+import json
+
+import pytest
+
+import src.const as const
+import src.importer as importer
+
+
+# ------------------ Helpers ------------------
+
+def catalog(db, assets=(), artists=None, albums=None, names=(), fail_insert=False):
+    '''Каталог, который видит импорт, fail_insert - True или имя таблицы, вставка в которую падает'''
+    artists, albums, ids = artists or {}, albums or {}, itertools.count(100)
+
+    def insert(table):
+        # Многострочная вставка возвращает ID в порядке строк
+        def rows(params):
+            if fail_insert in (True, table):
+                raise RuntimeError('insert failed')
+            return [(next(ids),) for _ in params]
+        return rows
+
+    db.results[importer.ASSETS] = lambda params: [(x,) for x in params['ids'] if x in assets]
+    db.results[importer.ARTISTS] = lambda params: [(x, artists[x]) for x in params['ids'] if x in artists]
+    db.results[importer.ALBUMS] = lambda params: [(x, albums[x]) for x in params['ids'] if x in albums]
+    db.results[importer.TAKEN_NAMES] = lambda params: [(x,) for x in params['names'] if x in names]
+    for table in ('artists', 'albums', 'songs'):
+        db.results[table] = insert(table)
+    return db
+
+
+def inserts(db):
+    return [(x.table.name, params) for x, params in db.executed if x.is_insert]
+
+
+async def stream(*records, chunk=7):
+    '''Тело запроса, нарезанное на куски независимо от строк'''
+    body = '\n'.join(x if isinstance(x, str) else json.dumps(x) for x in records).encode()
+    for i in range(0, len(body), chunk):
+        yield body[i:i + chunk]
+
+
+def artist(name='Artist', **kwargs):
+    return {'type': 'artist', 'name': name, 'biography': 'Biography', 'asset_id': 1, **kwargs}
+
+
+def album(**kwargs):
+    return {'type': 'album', 'name': 'Album', 'asset_id': 1, **kwargs}
+
+
+def song(**kwargs):
+    return {'type': 'song', 'name': 'Song', 'asset_id': 2, **kwargs}
+
+
+@pytest.fixture
+def documents(ctx, monkeypatch):
+    indexed = []
+    monkeypatch.setattr(importer.helpers, 'bulk', lambda es, actions: indexed.append(list(actions)))
+    return indexed
+
+
+# ------------------ Тесты ------------------
+
+def test_import_resolves_refs(ctx, documents):
+    '''Альбом и композиция ссылаются на родителей из того же импорта'''
+    db = catalog(ctx.db, assets={1, 2})
+
+    report = asyncio.run(importer.run(db, stream(
+        artist(ref='a'),
+        album(ref='b', artist_ref='a'),
+        song(album_ref='b')
+    )))
+
+    assert report.to_dict() == {
+        'created': {'artist': 1, 'album': 1, 'song': 1},
+        'failed': 0,
+        'errors': [],
+        'refs': {'a': 100, 'b': 101}
+    }
+    assert inserts(db)[1] == ('albums', [{'name': 'Album', 'artist_id': 100, 'asset_id': 1}])
+    assert db.commits == 1
+
+    # Карточки пишут триггеры, импорт не тратит на них запрос
+    assert [x for x, _ in inserts(db)] == ['artists', 'albums', 'songs']
+
+    # Один bulk-запрос на пачку, композиция проиндексирована с именем исполнителя
+    assert len(documents) == 1
+    assert documents[0][2]['_id'] == 'song_102'
+    assert documents[0][2]['_source']['data'] == {'name': 'Song', 'artist': 'Artist'}
+
+
+def test_import_reports_bad_records(ctx, documents):
+    '''Ошибочные записи пропускаются с номером строки, остальные импортируются'''
+    db = catalog(ctx.db, assets={1, 2}, artists={5: 'Known'}, names={'Taken'})
+
+    report = asyncio.run(importer.run(db, stream(
+        'not json',
+        {'type': 'playlist'},
+        artist(name='Taken'),
+        artist(asset_id=9),
+        artist(name='x'),
+        album(artist_id=6),
+        album(artist_ref='missing'),
+        album(artist_id=5),
+        ''
+    )))
+
+    assert report.created == {'artist': 0, 'album': 1, 'song': 0}
+    assert sorted(x['line'] for x in report.errors) == [1, 2, 3, 4, 5, 6, 7]
+    assert report.failed == 7
+    assert documents[0][0]['_source']['data'] == {'name': 'Album', 'artist': 'Known'}
+
+
+def test_import_duplicate_names_and_refs(ctx, documents):
+    '''Повторное имя исполнителя или ссылка внутри импорта отклоняются'''
+    db = catalog(ctx.db, assets={1})
+
+    report = asyncio.run(importer.run(db, stream(
+        artist(ref='a'),
+        artist(name='Other', ref='a'),
+        artist()
+    )))
+
+    assert report.created['artist'] == 1
+    assert [x['line'] for x in report.errors] == [2, 3]
+
+
+def test_import_in_batches(ctx, documents, monkeypatch):
+    '''Каждая пачка фиксируется отдельно, ссылки переживают границу пачек'''
+    monkeypatch.setattr(const, 'IMPORT_BATCH_SIZE', 2)
+    db = catalog(ctx.db, assets={1})
+
+    report = asyncio.run(importer.run(db, stream(
+        artist(name='First', ref='a'),
+        artist(name='Second'),
+        album(artist_ref='a')
+    )))
+
+    assert report.created == {'artist': 2, 'album': 1, 'song': 0}
+    assert db.commits == 2
+
+
+def test_import_failed_batch_rolled_back(ctx, documents):
+    '''Сбой пачки откатывает ее и помечает все ее записи ошибочными'''
+    db = catalog(ctx.db, assets={1}, fail_insert=True)
+
+    report = asyncio.run(importer.run(db, stream(artist(ref='a'))))
+
+    assert db.rollbacks == 1
+    assert report.created['artist'] == 0
+    assert report.refs == {}
+    assert report.errors == [{'line': 1, 'error': 'Batch has failed with RuntimeError'}]
+
+
+def test_import_failed_insert_fails_later_kinds(ctx, documents):
+    '''Песни пачки, в которой не вставились альбомы, тоже помечаются ошибочными, отклоненные записи - один раз'''
+    db = catalog(ctx.db, assets={1, 2}, names={'Taken'}, fail_insert='albums')
+
+    report = asyncio.run(importer.run(db, stream(
+        artist(name='Taken'),
+        artist(ref='a'),
+        album(ref='b', artist_ref='a'),
+        song(album_ref='b'),
+        song(album_ref='b')
+    )))
+
+    assert report.failed == 5
+    assert sorted(x['line'] for x in report.errors) == [1, 2, 3, 4, 5]
+    assert [x['error'] for x in report.errors if x['line'] == 1] == ['Artist name Taken is already taken']
+    assert report.created == {'artist': 0, 'album': 0, 'song': 0}
+
+
+def test_import_failed_commit_unindexes(ctx, documents, monkeypatch):
+    '''Документы пачки, откаченной после индексации, удаляются из поиска'''
+    unindexed = []
+    monkeypatch.setattr(importer.purge, 'unindex', lambda kind, ids: unindexed.append((kind, list(ids))))
+    db = catalog(ctx.db, assets={1, 2})
+    db.fail_commit = True
+
+    report = asyncio.run(importer.run(db, stream(artist(ref='a'), album(artist_ref='a'), song(album_ref='x'))))
+
+    assert len(documents) == 1
+    assert db.rollbacks == 1
+    assert unindexed == [('artist', [100]), ('album', [101])]
+    assert report.created['artist'] == 0
+
+
+def test_import_errors_limited(ctx, documents, monkeypatch):
+    '''Список ошибок ограничен, счетчик учитывает все'''
+    monkeypatch.setattr(const, 'IMPORT_MAX_ERRORS', 2)
+
+    report = asyncio.run(importer.run(catalog(ctx.db), stream('x', 'y', 'z')))
+
+    assert report.failed == 3
+    assert len(report.errors) == 2
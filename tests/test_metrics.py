@@ -0,0 +1,31 @@
+from src import metrics
+
+
+def test_counter():
+    """Счетчики накапливают значения"""
+    metrics.inc('test_counter')
+    metrics.inc('test_counter', 2)
+
+    assert metrics.counter('test_counter') >= 3
+    assert metrics.snapshot()['counters']['test_counter'] == metrics.counter('test_counter')
+
+
+def test_histogram_buckets():
+    """Наблюдения раскладываются по корзинам, значения сверх последней попадают в +Inf"""
+    h = metrics.Histogram((1, 10))
+    h.observe(0.5)
+    h.observe(10)
+    h.observe(100)
+
+    d = h.to_dict()
+    assert d['count'] == 3
+    assert d['max'] == 100
+    assert d['buckets'] == {'1': 1, '10': 1, '+Inf': 1}
+
+
+def test_gauge_is_evaluated_on_snapshot():
+    calls = []
+    metrics.gauge('test_gauge', lambda: calls.append(1) or len(calls))
+
+    assert metrics.snapshot()['gauges']['test_gauge'] == 1
+    assert metrics.snapshot()['gauges']['test_gauge'] == 2
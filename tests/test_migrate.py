@@ -0,0 +1,110 @@
+import asyncio
+
+from src import migrate, migrations
+from src.models.__base__ import Base
+
+
+# ------------------ Fake Classes ------------------
+
+class FakeTransaction:
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def __aenter__(self):
+        self.conn.log.append('BEGIN')
+
+    async def __aexit__(self, *args):
+        self.conn.log.append('COMMIT')
+
+
+class FakeConnection:
+    def __init__(self, versions=(), invalid=()):
+        self.versions = set(versions)
+        self.invalid = list(invalid)
+        self.log = []
+
+    async def execute(self, statement, *args):
+        if statement.startswith('INSERT INTO schema_migrations'):
+            self.versions.add(args[0])
+        self.log.append(' '.join(statement.split()))
+
+    async def fetch(self, statement):
+        if 'schema_migrations' in statement:
+            return [{'version': x} for x in self.versions]
+        if 'indisvalid' in statement:
+            return [{'name': x} for x in self.invalid]
+        return []
+
+    def transaction(self):
+        return FakeTransaction(self)
+
+
+# ------------------ Tests ------------------
+
+def test_migrations_are_ordered():
+    versions = [x.version for x in migrations.load()]
+
+    assert versions == sorted(versions)
+    assert versions[:2] == [1, 2]
+
+
+def test_upgrade_applies_pending_once():
+    """Применяются только новые миграции, повторный запуск ничего не делает"""
+    conn = FakeConnection()
+
+    applied = asyncio.run(migrate.upgrade(conn))
+    assert [x.version for x in applied] == [x.version for x in migrations.load()]
+    assert conn.log[0].startswith('SELECT pg_advisory_lock')
+    assert conn.log[-1].startswith('SELECT pg_advisory_unlock')
+
+    assert asyncio.run(migrate.upgrade(conn)) == []
+
+
+def test_concurrent_indexes_run_outside_transaction():
+    """CREATE INDEX CONCURRENTLY не может выполняться внутри транзакции"""
+    conn = FakeConnection(versions={1}, invalid=['ix_songs_asset_id'])
+
+    asyncio.run(migrate.upgrade(conn))
+
+    # Ни один CONCURRENTLY не попадает между BEGIN и COMMIT
+    in_transaction = False
+    for statement in conn.log:
+        if statement in ('BEGIN', 'COMMIT'):
+            in_transaction = statement == 'BEGIN'
+        assert not (in_transaction and 'CONCURRENTLY' in statement)
+    assert 'DROP INDEX CONCURRENTLY IF EXISTS "ix_songs_asset_id"' in conn.log
+    assert any(x.startswith('CREATE INDEX CONCURRENTLY') for x in conn.log)
+
+
+def test_migrations_create_model_indexes():
+    """Каждый индекс моделей создается какой-либо миграцией"""
+    statements = ' '.join(s for m in migrations.load() for s in m.statements)
+
+    for table in Base.metadata.sorted_tables:
+        assert f'TABLE IF NOT EXISTS {table.name} ' in statements
+        for index in table.indexes:
+            assert f'IF NOT EXISTS {index.name} ON {table.name} ' in statements
+        for key in table.foreign_keys:
+            assert f'ALTER TABLE {table.name} VALIDATE CONSTRAINT {key.constraint.name}' in statements
+
+
+def test_compare():
+    live = {t.name: ({c.name for c in t.columns}, {i.name for i in t.indexes}) for t in Base.metadata.sorted_tables}
+    assert migrate.compare(Base.metadata, live) == []
+
+    live['songs'][1].discard('ix_songs_album_id_song_id')
+    live['albums'][0].discard('songs_count')
+    del live['counters']
+
+    assert sorted(migrate.compare(Base.metadata, live)) == [
+        'column albums.songs_count is missing',
+        'index ix_songs_album_id_song_id on songs is missing',
+        'table counters is missing'
+    ]
+
+
+def test_check_reports_pending():
+    problems = asyncio.run(migrate.check(FakeConnection(versions={1})))
+
+    assert problems[0] == 'migration 2 indexes is pending'
+    assert 'migration 4 count_triggers is pending' in problems
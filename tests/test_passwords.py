@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from src import metrics, passwords
+
+
+@pytest.fixture(autouse=True)
+def shutdown_pool():
+    yield
+    passwords.shutdown()
+
+
+def test_hash_and_check_in_process_pool(monkeypatch):
+    """Хэширование и проверка выполняются в отдельных процессах"""
+    monkeypatch.setenv('PASSWORD_POOL_SIZE', '1')
+
+    async def run():
+        hashed = await passwords.hashpw('password')
+        return await passwords.checkpw('password', hashed), await passwords.checkpw('wrong', hashed)
+
+    assert asyncio.run(run()) == (True, False)
+    assert metrics.snapshot()['histograms']['password_hash_ms']['count'] >= 3
+    # Процессы не форкаются из воркера, в котором уже работают потоки
+    assert passwords._executor._mp_context.get_start_method() == 'forkserver'
+
+
+def test_hash_in_thread_pool(monkeypatch):
+    """Размер пула 0 - хэширование в потоках воркера"""
+    monkeypatch.setenv('PASSWORD_POOL_SIZE', '0')
+
+    async def run():
+        return await passwords.checkpw('password', await passwords.hashpw('password'))
+
+    assert asyncio.run(run()) is True
+
+
+def test_saturated_pool_rejects(monkeypatch):
+    """Переполненная очередь сразу отвечает 503"""
+    monkeypatch.setenv('PASSWORD_POOL_SIZE', '0')
+    monkeypatch.setenv('PASSWORD_QUEUE_SIZE', '0')
+    monkeypatch.setattr(passwords, '_pending', 1)
+    rejected = metrics.counter('password_pool_rejected')
+
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(passwords.hashpw('password'))
+
+    assert excinfo.value.status_code == 503
+    assert metrics.counter('password_pool_rejected') == rejected + 1
@@ -0,0 +1,82 @@
+import asyncio
+import os
+from unittest.mock import MagicMock, patch
+
+import pytest
+from sqlalchemy import exc
+from sqlalchemy.util import greenlet_spawn
+
+from src import metrics, pool
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def test_pool_times_waits():
+    """Ожидание соединения попадает в гистограмму, ожидающие считаются"""
+    p = pool.InstrumentedPool(lambda: MagicMock(), pool_size=1, max_overflow=0, timeout=0.05)
+    p.name = 'test'
+
+    async def run():
+        first = await greenlet_spawn(p.connect)
+        with pytest.raises(exc.TimeoutError):
+            await greenlet_spawn(p.connect)
+        first.close()
+        second = await greenlet_spawn(p.connect)
+        second.close()
+
+    asyncio.run(run())
+
+    histogram = metrics.snapshot()['histograms']['db_pool_test_wait_ms']
+    assert histogram['count'] == 3
+    assert histogram['max'] >= 50
+    assert p.waiting == 0
+
+
+def test_recreate_keeps_name():
+    p = pool.InstrumentedPool(lambda: MagicMock(), pool_size=1)
+    p.name = 'replica0'
+
+    assert p.recreate().name == 'replica0'
+
+
+def test_engine_uses_config():
+    env = {'POSTGRES_POOL_SIZE': '7', 'POSTGRES_POOL_OVERFLOW': '3', 'POSTGRES_POOL_TIMEOUT': '2.5'}
+    with patch.dict(os.environ, env):
+        engine = pool.create_engine('postgresql+asyncpg://u:p@h/db', 'test')
+
+    assert isinstance(engine.pool, pool.InstrumentedPool)
+    assert engine.pool.name == 'test'
+    assert engine.pool.size() == 7
+    assert engine.pool._max_overflow == 3
+    assert engine.pool.timeout() == 2.5
+
+    gauges = metrics.snapshot()['gauges']
+    assert gauges['db_pool_test_checked_out'] == 0
+    assert gauges['db_pool_test_waiting'] == 0
+
+
+def test_pgbouncer_disables_statement_caches():
+    """За пулом транзакций подготовленные выражения не кэшируются и не повторяют имен"""
+    with patch.dict(os.environ, {'POSTGRES_PGBOUNCER': 'false'}):
+        assert 'statement_cache_size' not in pool._connect_args()
+
+    with patch.dict(os.environ, {'POSTGRES_PGBOUNCER': 'true'}):
+        args = pool._connect_args()
+
+    assert args['statement_cache_size'] == 0
+    assert args['prepared_statement_cache_size'] == 0
+    assert args['prepared_statement_name_func']() != args['prepared_statement_name_func']()
+
+
+def test_statement_timeout_set_on_connect():
+    """Таймаут выражений задается соединению при подключении, за пулом транзакций - нет"""
+    with patch.dict(os.environ, {'POSTGRES_PGBOUNCER': 'false', 'POSTGRES_STATEMENT_TIMEOUT': '2.5'}):
+        assert pool._connect_args()['server_settings'] == {'statement_timeout': '2500'}
+
+    with patch.dict(os.environ, {'POSTGRES_PGBOUNCER': 'true'}):
+        assert 'server_settings' not in pool._connect_args()
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+import src.const as const
+import src.metrics as metrics
+import src.purge as purge
+
+
+# ------------------ Helpers ------------------
+
+def batches(db, rows):
+    '''Пачки ID, которые по очереди возвращают удаления'''
+    for statement, ids in rows.items():
+        db.results[statement] = lambda params, ids=ids: ids.pop(0) if ids else []
+
+
+def executed(db):
+    return [x for x, _ in db.executed]
+
+
+@pytest.fixture(autouse=True)
+def reset():
+    metrics.reset()
+    yield
+    purge._task = None
+    purge._again = False
+
+
+# ------------------ Тесты ------------------
+
+def test_purge_children_first(ctx):
+    '''Песни удаляются раньше альбомов, альбомы раньше исполнителей'''
+    batches(ctx.db, {purge.SONGS: [[1, 2]], purge.ALBUMS: [[3]], purge.ARTISTS: [[4]]})
+
+    asyncio.run(purge.purge())
+
+    assert executed(ctx.db) == [purge.MARK_ORPHANS, purge.SONGS, purge.ALBUMS, purge.ARTISTS]
+    assert ctx.es.deleted == [['song_1', 'song_2'], ['album_3'], ['artist_4']]
+    assert metrics.counter('purge_songs_deleted') == 2
+
+
+def test_purge_in_batches(ctx, monkeypatch):
+    '''Полная пачка означает, что строки еще остались'''
+    monkeypatch.setattr(const, 'PURGE_BATCH_SIZE', 2)
+    batches(ctx.db, {purge.SONGS: [[1, 2], [3, 4], [5]]})
+
+    asyncio.run(purge.purge())
+
+    assert executed(ctx.db).count(purge.SONGS) == 3
+    assert ctx.es.deleted == [['song_1', 'song_2'], ['song_3', 'song_4'], ['song_5']]
+
+
+def test_purge_keeps_marks_when_search_fails(ctx):
+    '''Без удаления документов пачка не фиксируется и остается следующей очистке'''
+    batches(ctx.db, {purge.SONGS: [[1]]})
+    ctx.es.fail = True
+
+    asyncio.run(purge.purge())
+
+    assert ctx.db.commits == 1  # только пометка осиротевших альбомов
+    assert purge.ALBUMS not in executed(ctx.db)
+    assert metrics.counter('purge_failed') == 1
+
+
+def test_start_runs_again_after_running_purge(ctx):
+    '''Очистка, запрошенная во время работы другой, выполняется после нее, а не параллельно'''
+    batches(ctx.db, {purge.SONGS: [[1]]})
+
+    async def run():
+        task = purge.start()
+        # Первая очистка доходит до удаления документов
+        await asyncio.sleep(0)
+        assert purge.start() is task
+        await task
+
+    asyncio.run(run())
+
+    assert executed(ctx.db).count(purge.MARK_ORPHANS) == 2
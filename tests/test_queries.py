@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from src import queries
+from src.queries import decode_cursor, encode_cursor
+
+
+# ------------------ Fake Classes ------------------
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def mappings(self):
+        return self
+
+    def all(self):
+        return self.rows
+
+    def first(self):
+        return self.rows[0] if self.rows else None
+
+    def scalar(self):
+        return next(iter(self.rows[0].values())) if self.rows else None
+
+    def __iter__(self):
+        return iter(self.rows)
+
+
+class FakeDB:
+    def __init__(self, count):
+        self.songs = [{'song_id': i, 'name': f'song {i}', 'album_id': 1, 'asset_id': i} for i in range(1, count + 1)]
+        self.statements = []
+
+    async def execute(self, statement, params=None):
+        # Эмулируем LIMIT/OFFSET и условие по ключу на списке
+        params = params or {}
+        self.statements.append(statement)
+        descending = 'DESC' in str(statement)
+        songs = sorted(self.songs, key=lambda x: x['song_id'], reverse=descending)
+        if 'cursor' in params:
+            songs = [x for x in songs if (x['song_id'] < params['cursor']) == descending and
+                     x['song_id'] != params['cursor']]
+        offset = params.get('offset', 0)
+        return FakeResult(songs[offset:offset + params.get('limit', len(songs))])
+
+
+# ------------------ Tests ------------------
+
+def test_cursor_roundtrip():
+    assert decode_cursor(encode_cursor(12345)) == 12345
+
+
+def test_cursor_invalid_raises_400():
+    with pytest.raises(HTTPException) as excinfo:
+        decode_cursor('не курсор')
+    assert excinfo.value.status_code == 400
+
+
+def test_listing_walks_by_cursor():
+    """Курсор ведет по страницам без OFFSET, последняя страница курсора не возвращает"""
+    db = FakeDB(5)
+
+    items, cursor = asyncio.run(queries.ALBUM_SONGS.page(db, 1, 2, album_id=1))
+    assert [x['song_id'] for x in items] == [1, 2]
+
+    items, cursor = asyncio.run(queries.ALBUM_SONGS.page(db, 1, 2, cursor, album_id=1))
+    assert [x['song_id'] for x in items] == [3, 4]
+    assert 'OFFSET' not in str(db.statements[-1])
+
+    items, cursor = asyncio.run(queries.ALBUM_SONGS.page(db, 1, 2, cursor, album_id=1))
+    assert [x['song_id'] for x in items] == [5]
+    assert cursor is None
+
+
+def test_listing_by_page():
+    db = FakeDB(5)
+
+    items, cursor = asyncio.run(queries.ALBUM_SONGS.page(db, 2, 2, album_id=1))
+
+    assert [x['song_id'] for x in items] == [3, 4]
+    assert decode_cursor(cursor) == 4
+
+
+def test_listing_descending():
+    """При обратном порядке курсор ищет ключи меньше последнего"""
+    statement = str(queries.ARTIST_ALBUMS_NEWEST.by_cursor)
+
+    assert 'album_cards.album_id < :cursor' in statement
+    assert 'ORDER BY album_cards.album_id DESC' in statement
+
+
+def test_statements_select_columns_only():
+    """Чтения выбирают колонки, а не сущности ORM, и отдают словари"""
+    for statement in (queries.SONG_BY_ID, queries.NEWEST_ALBUMS, queries.USERS.by_page):
+        # У выборки сущности тип колонки - сам класс модели
+        assert not any(isinstance(x['type'], type) for x in statement.column_descriptions)
+
+    row = asyncio.run(queries.one(FakeDB(1), queries.SONG_BY_ID, song_id=1))
+    assert row == {'song_id': 1, 'name': 'song 1', 'album_id': 1, 'asset_id': 1}
+
+
+def test_statements_are_compiled_once():
+    """Повторное выполнение берет скомпилированное выражение из кэша"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.engine.default import CACHE_HIT
+
+    engine = create_engine('sqlite://')
+    with engine.connect() as conn:
+        from src.models.__base__ import Base
+        Base.metadata.create_all(conn)
+
+        conn.execute(queries.ALBUM_SONGS.by_page, {'album_id': 1, 'limit': 1, 'offset': 0})
+        result = conn.execute(queries.ALBUM_SONGS.by_page, {'album_id': 2, 'limit': 5, 'offset': 5})
+
+        assert result.context.cache_hit == CACHE_HIT
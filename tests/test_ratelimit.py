@@ -0,0 +1,62 @@
+import pytest
+from fastapi import HTTPException
+
+from src import context, metrics, ratelimit
+
+
+# ------------------ Fake Classes ------------------
+
+class FakeRedis:
+    def __init__(self, wait=0):
+        self.wait = wait
+        self.calls = []
+
+    def register_script(self, script):
+        def take(keys, args):
+            self.calls.append((keys, args))
+            return self.wait
+        return take
+
+
+class FakeContext:
+    def __init__(self, wait=0):
+        self.rs = FakeRedis(wait)
+
+
+# ------------------ Тесты ------------------
+
+def test_allowed(monkeypatch):
+    """Попытка в пределах лимита проходит, проверяются оба ведра разом"""
+    monkeypatch.setattr(context, 'ctx', FakeContext())
+    monkeypatch.setenv('AUTH_LIMIT_USERNAME_RATE', '60')
+    monkeypatch.setenv('AUTH_LIMIT_USERNAME_BURST', '3')
+
+    ratelimit.check('login', 'user', '10.0.0.1')
+
+    keys, args = context.ctx.rs.calls[0]
+    assert keys == ['ratelimit:login:user:user', 'ratelimit:login:addr:10.0.0.1']
+    assert args[:2] == [1, 3]
+
+
+def test_rejected(monkeypatch):
+    """Превышение лимита - 429 с Retry-After и учет в метриках"""
+    monkeypatch.setattr(context, 'ctx', FakeContext(wait=1500))
+    rejected = metrics.counter('ratelimit_login_rejected')
+
+    with pytest.raises(HTTPException) as excinfo:
+        ratelimit.check('login', 'user', '10.0.0.1')
+
+    assert excinfo.value.status_code == 429
+    assert excinfo.value.headers['Retry-After'] == '2'
+    assert metrics.counter('ratelimit_login_rejected') == rejected + 1
+
+
+def test_disabled(monkeypatch):
+    """Нулевой лимит отключает проверку без обращения к Redis"""
+    monkeypatch.setattr(context, 'ctx', FakeContext(wait=1000))
+    monkeypatch.setenv('AUTH_LIMIT_USERNAME_RATE', '0')
+    monkeypatch.setenv('AUTH_LIMIT_ADDRESS_RATE', '0')
+
+    ratelimit.check('register', 'user', None)
+
+    assert context.ctx.rs.calls == []
@@ -0,0 +1,456 @@
+import json
+
+import pytest
+
+from src import const, context, metrics, sessions, util
+from src.sessions import Claims
+
+
+# ------------------ Fake Classes ------------------
+
+class FakeRedis:
+    def __init__(self):
+        self.storage = {}
+        self.ttl = {}
+        self.published = []
+
+    def exists(self, key):
+        return key in self.storage
+
+    def get(self, key):
+        return self.storage.get(key)
+
+    def set(self, key, value, xx=False, keepttl=False, ex=None):
+        if xx and key not in self.storage:
+            return None
+        self.storage[key] = value
+        return True
+
+    def expire(self, key, ttl):
+        pass
+
+    def delete(self, *keys):
+        for key in keys:
+            self.storage.pop(key, None)
+
+    def incr(self, key):
+        self.storage[key] = int(self.storage.get(key, 0)) + 1
+        return self.storage[key]
+
+    def sadd(self, key, *values):
+        self.storage.setdefault(key, set()).update(values)
+
+    def srem(self, key, *values):
+        self.storage.get(key, set()).difference_update(values)
+
+    def smembers(self, key):
+        return set(self.storage.get(key, set()))
+
+    def publish(self, channel, message):
+        self.published.append((channel, message))
+
+    def zadd(self, key, mapping):
+        self.storage.setdefault(key, {}).update(mapping)
+
+    def zremrangebyscore(self, key, low, high):
+        zset = self.storage.get(key, {})
+        for member in [m for m, score in zset.items() if score <= high]:
+            del zset[member]
+
+    def zrange(self, key, start, end):
+        return list(self.storage.get(key, {}))
+
+    def pipeline(self, transaction=True):
+        redis = self
+
+        class Pipeline:
+            def __init__(self):
+                self.calls = []
+
+            def __getattr__(self, name):
+                return lambda *a, **kw: self.calls.append((name, a, kw))
+
+            def execute(self):
+                return [getattr(redis, name)(*a, **kw) for name, a, kw in self.calls]
+
+        return Pipeline()
+
+    def scan_iter(self, match, count=None):
+        prefix = match.rstrip('*')
+        return [k for k in list(self.storage) if k.startswith(prefix)]
+
+    def scard(self, key):
+        return len(self.storage.get(key, set()))
+
+    def srandmember(self, key):
+        return next(iter(self.storage.get(key, set())), None)
+
+    def memory_usage(self, key):
+        return 100 if key in self.storage else None
+
+    def zcard(self, key):
+        return len(self.storage.get(key, {}))
+
+    def register_script(self, script):
+        # Эмуляция Lua-скриптов модуля сессий
+        def create(keys, args):
+            if keys[0] in self.storage:
+                return None
+            claims = Claims.loads(args[0])
+            claims.version = int(self.storage.get(keys[1], 0))
+            self.storage[keys[0]] = claims.dumps()
+            self.ttl[keys[0]] = args[1]
+            live = sorted((self.ttl.get(args[3] + t, 0), t) for t in self.smembers(keys[2])
+                          if args[3] + t in self.storage)
+            evicted = [t for _, t in live[:max(0, len(live) - args[4] + 1)]] if args[4] > 0 else []
+            self.delete(*[args[3] + t for t in evicted])
+            self.storage[keys[2]] = {t for _, t in live} - set(evicted) | {args[2]}
+            return evicted
+
+        def read(keys, args):
+            record = self.storage.get(keys[0])
+            if record is not None and self.ttl.get(keys[0], -1) < args[0]:
+                self.ttl[keys[0]] = args[1]
+            return record
+
+        def rewrite(keys, args):
+            version = self.incr(keys[0])
+            claims = Claims.loads(args[0])
+            claims.version = version
+            tokens = self.smembers(keys[1])
+            for token in tokens:
+                if not self.set(args[1] + token, claims.dumps(), xx=True):
+                    self.srem(keys[1], token)
+            return [version, list(tokens)]
+
+        def revoke(keys, args):
+            version = self.incr(keys[0])
+            tokens = self.smembers(keys[1])
+            self.delete(keys[1], *[args[0] + t for t in tokens])
+            return [version, list(tokens)]
+
+        return {
+            sessions._CREATE: create,
+            sessions._READ: read,
+            sessions._REWRITE: rewrite,
+            sessions._REVOKE: revoke
+        }[script]
+
+
+class FakeUser:
+    def __init__(self, user_id=1, username='test', is_admin=False):
+        self.user_id = user_id
+        self.username = username
+        self.is_admin = is_admin
+
+
+class FakeContext:
+    def __init__(self):
+        self.rs = FakeRedis()
+
+
+# ------------------ Fixtures ------------------
+
+@pytest.fixture
+def redis(monkeypatch):
+    fake_ctx = FakeContext()
+    monkeypatch.setattr(context, 'ctx', fake_ctx)
+    return fake_ctx.rs
+
+
+@pytest.fixture
+def signed(redis, monkeypatch):
+    monkeypatch.setenv('SESSION_MODE', 'signed')
+    monkeypatch.setenv('SESSION_SECRET', 'secret')
+    monkeypatch.setattr(sessions, '_revocations', sessions._Revocations())
+    return redis
+
+
+# ------------------ Тесты ------------------
+
+def test_claims_roundtrip():
+    """Claims сериализуются и восстанавливаются без потерь"""
+    claims = Claims.loads(Claims(7, 'someone', True, 3).dumps())
+
+    assert claims.user_id == 7
+    assert claims.username == 'someone'
+    assert claims.is_admin is True
+    assert claims.version == 3
+    assert claims.to_dict() == {'user_id': 7, 'username': 'someone', 'is_admin': True}
+
+
+def test_create_and_read(redis):
+    """Сессия хранит claims пользователя и читается без обращения к БД"""
+    token = sessions.create(FakeUser(is_admin=True))
+
+    claims = sessions.read(token)
+    assert claims.user_id == 1
+    assert claims.is_admin is True
+    assert token in redis.smembers('session:user:1')
+
+
+def test_read_missing(redis):
+    assert sessions.read('missing') is None
+
+
+def test_read_legacy_record(redis):
+    """Старые записи с голым user_id считаются недействительными"""
+    redis.storage['session:token:legacy'] = b'1'
+
+    assert sessions.read('legacy') is None
+    assert 'session:token:legacy' not in redis.storage
+
+
+def test_read_refreshes_only_below_threshold(redis, monkeypatch):
+    """TTL продлевается только когда остаток жизни ниже порога"""
+    monkeypatch.setenv('SESSION_CACHE_SIZE', '0')
+    token = sessions.create(FakeUser())
+
+    key = 'session:token:' + token
+
+    redis.ttl[key] = const.SESSION_TTL - 1
+    sessions.read(token)
+    assert redis.ttl[key] == const.SESSION_TTL - 1
+
+    redis.ttl[key] = 1
+    sessions.read(token)
+    assert redis.ttl[key] == const.SESSION_TTL
+
+
+def test_create_collision_limit(redis, monkeypatch):
+    monkeypatch.setattr(util, 'generate_token', lambda: 'same')
+    redis.storage['session:token:same'] = b'taken'
+
+    with pytest.raises(Exception):
+        sessions.create(FakeUser())
+
+
+def test_rewrite_user(redis):
+    """Изменение пользователя переписывает claims во всех его сессиях"""
+    token = sessions.create(FakeUser())
+    redis.sadd('session:user:1', 'expired')
+
+    sessions.rewrite_user(FakeUser(username='renamed', is_admin=True))
+
+    claims = sessions.read(token)
+    assert claims.username == 'renamed'
+    assert claims.is_admin is True
+    assert claims.version == 1
+    # Истекшая сессия не воскрешается и убирается из индекса
+    assert 'session:token:expired' not in redis.storage
+    assert 'expired' not in redis.smembers('session:user:1')
+
+
+def test_revoke_user(redis):
+    """Удаление пользователя отзывает все его сессии"""
+    first = sessions.create(FakeUser())
+    second = sessions.create(FakeUser())
+
+    sessions.revoke_user(1)
+
+    assert sessions.read(first) is None
+    assert sessions.read(second) is None
+
+
+def test_delete(redis):
+    token = sessions.create(FakeUser())
+
+    sessions.delete(token, sessions.read(token))
+
+    assert sessions.read(token) is None
+    assert token not in redis.smembers('session:user:1')
+
+
+def test_cache_hit_skips_redis(redis):
+    """Повторная проверка сессии обслуживается из памяти процесса"""
+    token = sessions.create(FakeUser())
+    sessions.read(token)
+
+    redis.storage.pop('session:token:' + token)
+
+    assert sessions.read(token).user_id == 1
+
+
+def test_cache_is_bounded(redis, monkeypatch):
+    monkeypatch.setenv('SESSION_CACHE_SIZE', '2')
+    tokens = [sessions.create(FakeUser()) for _ in range(3)]
+    for token in tokens:
+        sessions.read(token)
+
+    assert len(sessions._cache) == 2
+    assert sessions._cache.get(tokens[0]) is None
+
+
+def test_cache_expires(redis, monkeypatch):
+    monkeypatch.setenv('SESSION_CACHE_TTL', '-1')
+    token = sessions.create(FakeUser())
+    sessions.read(token)
+
+    assert sessions._cache.get(token) is None
+
+
+def test_invalidation_is_published(redis):
+    """Выход публикует инвалидацию для остальных воркеров"""
+    token = sessions.create(FakeUser())
+    sessions.delete(token, sessions.read(token))
+
+    channel, message = redis.published[-1]
+    assert channel == const.SESSION_INVALIDATION_CHANNEL
+    assert json.loads(message)['tokens'] == [token]
+    assert sessions._cache.get(token) is None
+
+
+def test_invalidation_is_received(redis):
+    """Сообщение от другого воркера удаляет сессию из кэша и учитывается в метриках"""
+    token = sessions.create(FakeUser())
+    sessions.read(token)
+
+    sessions._on_invalidation({'data': json.dumps({'tokens': [token], 'sent_at': 0})})
+
+    assert sessions._cache.get(token) is None
+    assert metrics.snapshot()['histograms']['session_cache_invalidation_lag_ms']['count'] >= 1
+
+
+def test_stale_fill_is_skipped(redis):
+    """Запись, прочитанная до инвалидации, не попадает в кэш"""
+    generation = sessions._cache.generation
+    sessions._cache.drop(['token'])
+
+    sessions._cache.put('token', Claims(1, 'test', False), generation)
+
+    assert sessions._cache.get('token') is None
+
+
+def test_signed_roundtrip(signed):
+    """Подписанный токен проверяется без обращения к Redis"""
+    token = sessions.create(FakeUser(is_admin=True))
+    signed.storage.clear()
+
+    claims = sessions.read(token)
+    assert claims.user_id == 1
+    assert claims.is_admin is True
+
+
+def test_signed_requires_secret(signed, monkeypatch):
+    monkeypatch.setenv('SESSION_SECRET', '')
+
+    with pytest.raises(RuntimeError):
+        sessions.create(FakeUser())
+
+
+def test_signed_expired(signed, monkeypatch):
+    monkeypatch.setenv('SESSION_SIGNED_TTL', '-1')
+    token = sessions.create(FakeUser())
+
+    assert sessions.read(token) is None
+
+
+def test_signed_logout_is_synced(signed):
+    """Отзыв токена попадает в Redis и подхватывается другими воркерами при синхронизации"""
+    token = sessions.create(FakeUser())
+    other = sessions.create(FakeUser())
+    sessions.delete(token, sessions.read(token))
+
+    assert sessions.read(token) is None
+
+    # Другой воркер со своей копией списка
+    sessions._revocations = sessions._Revocations()
+    assert sessions.read(token) is not None
+    sessions._sync_revocations()
+    assert sessions.read(token) is None
+    assert sessions.read(other) is not None
+
+
+def test_signed_revoke_user(signed):
+    """Изменение пользователя отзывает его токены, выданные до изменения"""
+    token = sessions.create(FakeUser())
+
+    sessions.rewrite_user(FakeUser(is_admin=True))
+
+    assert sessions.read(token) is None
+    assert sessions.read(sessions.create(FakeUser(is_admin=True))).is_admin is True
+
+
+def test_revocations_keep_local_during_sync():
+    """Локальный отзыв, сделанный во время синхронизации, не теряется"""
+    revocations = sessions._Revocations()
+    revocations.add('t:abc')
+
+    revocations.replace([b'u:1:2'], started_at=0)
+
+    assert revocations.is_revoked('abc', 2, 5)
+    assert revocations.is_revoked('other', 1, 1)
+    assert not revocations.is_revoked('other', 1, 2)
+
+
+def test_sessions_per_user_limit(redis, monkeypatch):
+    """Сверх лимита сессий пользователя удаляются ближайшие к истечению"""
+    monkeypatch.setenv('SESSION_MAX_PER_USER', '2')
+    first = sessions.create(FakeUser())
+    redis.ttl['session:token:' + first] = 1
+    second = sessions.create(FakeUser())
+    third = sessions.create(FakeUser())
+
+    assert redis.smembers('session:user:1') == {second, third}
+    assert sessions.read(first) is None
+
+
+def test_revoke_user_spares_others(redis):
+    """Отзыв сессий пользователя не затрагивает чужие сессии"""
+    token = sessions.create(FakeUser())
+    other = sessions.create(FakeUser(user_id=2))
+
+    sessions.revoke_user(1)
+
+    assert sessions.read(token) is None
+    assert sessions.read(other).user_id == 2
+    assert 'session:user:1' not in redis.storage
+
+
+def test_stats(redis):
+    """Статистика считает сессии по индексам пользователей и оценивает память"""
+    sessions.create(FakeUser())
+    sessions.create(FakeUser())
+    sessions.create(FakeUser(user_id=2))
+
+    stats = sessions.stats()
+
+    assert stats['users'] == 2
+    assert stats['sessions'] == 3
+    assert stats['memory']['sessions'] == 300
+    assert stats['memory']['indexes'] == 200
+    assert stats['memory']['total'] == 500
+
+
+def test_stats_sample_smaller_than_users(redis):
+    """Выборка меньше числа пользователей не сбивает разбор ответов конвейера"""
+    sessions.create(FakeUser())
+    sessions.create(FakeUser())
+    sessions.create(FakeUser(user_id=2))
+    sessions.create(FakeUser(user_id=3))
+
+    stats = sessions.stats(sample=1)
+
+    assert stats['users'] == 3
+    assert stats['sessions'] == 4
+    assert stats['memory']['sessions'] == 400
+    assert stats['memory']['indexes'] == 300
+
+
+def test_pin_needs_replicas(redis, monkeypatch):
+    """Без реплик сессия не закрепляется за основной базой"""
+    monkeypatch.delenv('POSTGRES_REPLICAS', raising=False)
+
+    sessions.pin('token')
+
+    assert 'session:pin:token' not in redis.storage
+    assert sessions.is_pinned('token') is False
+
+
+def test_pin(redis, monkeypatch):
+    """После записи сессия читает из основной базы"""
+    monkeypatch.setenv('POSTGRES_REPLICAS', 'replica:5432')
+
+    assert sessions.is_pinned('token') is False
+    sessions.pin('token')
+    assert sessions.is_pinned('token') is True
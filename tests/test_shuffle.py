@@ -0,0 +1,104 @@
+import asyncio
+import itertools
+
+import src.const as const
+import src.shuffle as shuffle
+
+
+# ------------------ Helpers ------------------
+
+def catalog(db, songs):
+    '''Живые песни по ID, пропуски в ID допустимы'''
+    def after(params):
+        rows = []
+        for start in params['starts']:
+            following = [x for x in sorted(songs) if x >= start]
+            if following:
+                rows.append({'song_id': following[0]})
+        return rows
+
+    def scoped(params):
+        return [{'song_id': x} for x in sorted(songs) if x not in params['recent']][:params['limit']]
+
+    db.results[shuffle.MAX_SONG_ID] = [max(songs)] if songs else []
+    db.results[shuffle.SONGS_AFTER] = after
+    db.results[shuffle.ALBUM_SONGS] = scoped
+    db.results[shuffle.ARTIST_SONGS] = scoped
+    return db
+
+
+# ------------------ Тесты ------------------
+
+def test_sample_over_id_space(ctx, monkeypatch):
+    '''Весь каталог выбирается по пространству ID без сортировки таблицы'''
+    draws = iter([1, 3, 6, 9, 14, 22])
+    monkeypatch.setattr(shuffle.random, 'randint', lambda a, b: next(draws))
+    db = catalog(ctx.db, {1, 2, 5, 8, 13, 21, 34, 55})
+
+    songs = asyncio.run(shuffle.sample(db, 3, []))
+
+    assert [x['song_id'] for x in songs] == [1, 5, 8]
+    assert [x[0] for x in db.executed] == [shuffle.MAX_SONG_ID, shuffle.SONGS_AFTER]
+    assert db.executed[1][1]['starts'] == [1, 3, 6, 9, 14, 22][:3 * const.SHUFFLE_OVERSAMPLING]
+
+
+def test_sample_draws_again_after_gaps(ctx, monkeypatch):
+    '''Старты в одном пропуске дают одну песню, недостающие добираются новыми стартами'''
+    draws = iter([30, 40, 50, 35, 45, 48, 56, 60, 1, 2])
+    monkeypatch.setattr(shuffle.random, 'randint', lambda a, b: next(draws))
+    db = catalog(ctx.db, {1, 2, 55, 60})
+
+    songs = asyncio.run(shuffle.sample(db, 3, []))
+
+    assert [x['song_id'] for x in songs] == [55, 60, 1]
+    assert [len(x[1]['starts']) for x in db.executed[1:]] == [6, 4]
+
+
+def test_sample_prefers_not_recent(ctx, monkeypatch):
+    '''Недавние песни выдаются, только если других не хватает'''
+    draws = itertools.cycle([1, 2])
+    monkeypatch.setattr(shuffle.random, 'randint', lambda a, b: next(draws))
+    db = catalog(ctx.db, {1, 2})
+
+    songs = asyncio.run(shuffle.sample(db, 2, [1]))
+
+    assert [x['song_id'] for x in songs] == [2, 1]
+    assert len(db.executed) == 1 + const.SHUFFLE_ATTEMPTS
+
+
+def test_sample_empty_catalog(ctx):
+    assert asyncio.run(shuffle.sample(catalog(ctx.db, set()), 5, [])) == []
+
+
+def test_scoped_sample_skips_recent(ctx):
+    '''Песни альбома выбираются без недавних'''
+    db = catalog(ctx.db, {1, 2, 3})
+
+    songs = asyncio.run(shuffle.sample(db, 2, [1], album_id=7))
+
+    assert [x['song_id'] for x in songs] == [2, 3]
+    assert db.executed[0][0] is shuffle.ALBUM_SONGS
+    assert db.executed[0][1] == {'album_id': 7, 'limit': 2, 'recent': [1]}
+
+
+def test_scoped_sample_repeats_small_scope(ctx):
+    '''Альбом меньше окна повторяет песни, а не возвращает пустой список'''
+    db = catalog(ctx.db, {1, 2})
+
+    songs = asyncio.run(shuffle.sample(db, 2, [1, 2], artist_id=3))
+
+    assert [x['song_id'] for x in songs] == [1, 2]
+    assert [x[1]['recent'] for x in db.executed] == [[1, 2], []]
+
+
+def test_recent_window(ctx, monkeypatch):
+    '''Окно хранит последние выданные песни сессии и истекает вместе с ней'''
+    monkeypatch.setattr(const, 'SHUFFLE_RECENT_WINDOW', 3)
+
+    shuffle.remember('token', [1, 2])
+    shuffle.remember('token', [3, 4])
+    shuffle.remember('token', [])
+
+    assert sorted(shuffle.recent('token')) == [2, 3, 4]
+    assert ctx.rs.ttl['shuffle:recent:token'] == const.SESSION_TTL
+    assert shuffle.recent('other') == []
@@ -31,4 +31,35 @@ def test_generate_token_length():
 
     # secrets.token_hex(16) возвращает 32 символа (16 байт в hex)
     assert len(token1) == 32
-    assert token1 != token2  # Токены должны быть уникальными
\ No newline at end of file
+    assert token1 != token2  # Токены должны быть уникальными
+
+
+def test_sign_roundtrip():
+    """Подписанные данные восстанавливаются тем же секретом"""
+    from src.util import sign, unsign
+
+    token = sign({'uid': 1, 'adm': True}, 'secret')
+    assert unsign(token, 'secret') == {'uid': 1, 'adm': True}
+
+
+def test_unsign_rejects_tampering():
+    """Измененные данные, чужой секрет и мусор не проходят проверку"""
+    from src.util import sign, unsign
+
+    token = sign({'uid': 1, 'adm': False}, 'secret')
+    body, signature = token.split('.')
+    forged = sign({'uid': 1, 'adm': True}, 'secret').split('.')[0] + '.' + signature
+
+    assert unsign(forged, 'secret') is None
+    assert unsign(token, 'other') is None
+    assert unsign('garbage', 'secret') is None
+    assert unsign('токен.подпись', 'secret') is None
+
+
+def test_hashpw_rounds(monkeypatch):
+    """Стоимость хэша берется из настроек или передается явно"""
+    from src.util import hash_rounds
+
+    monkeypatch.setenv('BCRYPT_ROUNDS', '5')
+    assert hash_rounds(hashpw('password')) == 5
+    assert hash_rounds(hashpw('password', 4)) == 4